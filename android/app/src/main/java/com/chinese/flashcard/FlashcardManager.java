@@ -24,11 +24,16 @@ public class FlashcardManager {
     private static final String KEY_WORDS_PER_PATCH = "words_per_patch";
     private static final String KEY_CURRENT_INDEX = "current_index";
     private static final String KEY_SHUFFLED_INDICES = "shuffled_indices";
+    private static final String KEY_SEED = "seed";
+    private static final String KEY_WORD_COUNT = "word_count";
     private static final String REVISION_FILE = "revision.txt";
 
     private Context context;
     private SharedPreferences prefs;
     private List<ChineseWord> allWords;
+    // Patch order: a seeded permutation, or the full index list saved by
+    // versions before seeds existed
+    private Permutation order;
     private List<Integer> shuffledIndices;
     private int currentIndex;
     private int hskLevel;
@@ -56,9 +61,19 @@ public class FlashcardManager {
 
     private void loadProgress() {
         currentIndex = prefs.getInt(KEY_CURRENT_INDEX, 0);
-        String indicesStr = prefs.getString(KEY_SHUFFLED_INDICES, "");
-        
+        order = null;
         shuffledIndices = new ArrayList<>();
+        
+        if (prefs.contains(KEY_SEED)) {
+            if (prefs.getInt(KEY_WORD_COUNT, 0) == allWords.size()) {
+                order = new Permutation(allWords.size(), prefs.getLong(KEY_SEED, 0));
+            } else {
+                resetProgress();
+            }
+            return;
+        }
+        
+        String indicesStr = prefs.getString(KEY_SHUFFLED_INDICES, "");
         if (!indicesStr.isEmpty()) {
             String[] parts = indicesStr.split(",");
             for (String part : parts) {
@@ -73,28 +88,30 @@ public class FlashcardManager {
     }
 
     public void saveProgress() {
-        StringBuilder indicesStr = new StringBuilder();
-        for (int i = 0; i < shuffledIndices.size(); i++) {
-            if (i > 0) indicesStr.append(",");
-            indicesStr.append(shuffledIndices.get(i));
+        SharedPreferences.Editor editor = prefs.edit().putInt(KEY_CURRENT_INDEX, currentIndex);
+        if (order != null) {
+            editor.putLong(KEY_SEED, order.getSeed())
+                .putInt(KEY_WORD_COUNT, order.size())
+                .remove(KEY_SHUFFLED_INDICES);
         }
-        
-        prefs.edit()
-            .putInt(KEY_CURRENT_INDEX, currentIndex)
-            .putString(KEY_SHUFFLED_INDICES, indicesStr.toString())
-            .apply();
+        editor.apply();
     }
 
     public void resetProgress() {
+        order = new Permutation(allWords.size(), Permutation.newSeed());
         shuffledIndices = new ArrayList<>();
-        for (int i = 0; i < allWords.size(); i++) {
-            shuffledIndices.add(i);
-        }
-        Collections.shuffle(shuffledIndices);
         currentIndex = 0;
         saveProgress();
     }
 
+    private int orderSize() {
+        return order != null ? order.size() : shuffledIndices.size();
+    }
+
+    private int wordIndexAt(int position) {
+        return order != null ? order.get(position) : shuffledIndices.get(position);
+    }
+
     private void loadWords() {
         allWords = new ArrayList<>();
         String fileName = "hsk" + hskLevel + ".csv";
@@ -129,11 +146,11 @@ public class FlashcardManager {
     public List<ChineseWord> getCurrentPatch() {
         List<ChineseWord> patch = new ArrayList<>();
         int start = currentIndex * wordsPerPatch;
-        int end = Math.min(start + wordsPerPatch, shuffledIndices.size());
+        int end = Math.min(start + wordsPerPatch, orderSize());
         
-        if (start < shuffledIndices.size()) {
+        if (start < orderSize()) {
             for (int i = start; i < end; i++) {
-                patch.add(allWords.get(shuffledIndices.get(i)));
+                patch.add(allWords.get(wordIndexAt(i)));
             }
         }
         
@@ -169,8 +186,8 @@ public class FlashcardManager {
         int start = (currentIndex - maxPatches) * wordsPerPatch;
         int end = currentIndex * wordsPerPatch;
         
-        for (int i = start; i < end && i < shuffledIndices.size(); i++) {
-            testWords.add(allWords.get(shuffledIndices.get(i)));
+        for (int i = start; i < end && i < orderSize(); i++) {
+            testWords.add(allWords.get(wordIndexAt(i)));
         }
         
         Collections.shuffle(testWords);
@@ -0,0 +1,77 @@
+package com.chinese.flashcard;
+
+import java.util.Random;
+
+/**
+ * Seeded shuffle of 0..size-1 computed on demand.
+ * Same algorithm as permutation.py, so a seed gives the same patch order
+ * on every client.
+ */
+public class Permutation {
+    private static final long MASK32 = 0xFFFFFFFFL;
+    private static final int ROUNDS = 4;
+
+    private final int size;
+    private final long seed;
+    private final int halfBits;
+    private final long halfMask;
+    private final long[] keys = new long[ROUNDS];
+
+    public Permutation(int size, long seed) {
+        this.size = size;
+        this.seed = seed & MASK32;
+        int bits = 1;
+        while ((1L << (2 * bits)) < size) {
+            bits++;
+        }
+        this.halfBits = bits;
+        this.halfMask = (1L << bits) - 1;
+        for (int r = 0; r < ROUNDS; r++) {
+            keys[r] = mix32(this.seed + r * 0x9E3779B9L);
+        }
+    }
+
+    public static long newSeed() {
+        return new Random().nextInt() & MASK32;
+    }
+
+    static long mix32(long x) {
+        x &= MASK32;
+        x ^= x >>> 16;
+        x = (x * 0x7FEB352DL) & MASK32;
+        x ^= x >>> 15;
+        x = (x * 0x846CA68BL) & MASK32;
+        x ^= x >>> 16;
+        return x;
+    }
+
+    private long encrypt(long x) {
+        long left = x >>> halfBits;
+        long right = x & halfMask;
+        for (long key : keys) {
+            long next = left ^ (mix32(right ^ key) & halfMask);
+            left = right;
+            right = next;
+        }
+        return (left << halfBits) | right;
+    }
+
+    public int get(int i) {
+        if (i < 0 || i >= size) {
+            throw new IndexOutOfBoundsException("Index: " + i + ", Size: " + size);
+        }
+        long x = encrypt(i);
+        while (x >= size) {
+            x = encrypt(x);
+        }
+        return (int) x;
+    }
+
+    public int size() {
+        return size;
+    }
+
+    public long getSeed() {
+        return seed;
+    }
+}
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Confusable-pair analysis
+Find words across all HSK levels whose pinyin differs by one tone, initial or final
+"""
+
+import argparse
+import os
+import threading
+import time
+from pathlib import Path
+
+from persistence import write_atomic
+from pinyin_syllables import FINALS, INITIALS, UNKNOWN
+from vocabulary import HSK_LEVELS, RESOURCE_DIR, hsk_file, load_vocabulary
+
+try:
+    import numpy as np
+except ImportError:  # the pure-Python search gives the same pairs, just slower
+    np = None
+
+
+TABLE_NAME = "confusables.tsv"
+
+# Initials and finals learners mix up; swapping within a group costs 1,
+# any other change costs 2, so only one-step confusions reach distance 1
+INITIAL_GROUPS = (('z', 'zh'), ('c', 'ch'), ('s', 'sh'), ('n', 'l'), ('l', 'r'),
+                  ('j', 'zh'), ('q', 'ch'), ('x', 'sh'), ('b', 'p'), ('d', 't'),
+                  ('g', 'k'), ('f', 'h'))
+FINAL_GROUPS = (('an', 'ang'), ('en', 'eng'), ('in', 'ing'), ('ian', 'iang'),
+                ('uan', 'uang'), ('un', 'ong'), ('ai', 'ei'), ('ou', 'uo'),
+                ('u', 'v'), ('ue', 've'))
+FAR = 2
+
+# Distances between pairs in the numpy search are computed for this many
+# rows against the whole group at once
+BATCH = 128
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def cost_table(names, groups):
+    """Square table: 0 on the diagonal, 1 within a group, FAR elsewhere"""
+    ids = {name: i for i, name in enumerate(names)}
+    table = [[FAR] * len(names) for _ in names]
+    for i in range(len(names)):
+        table[i][i] = 0
+    for group in groups:
+        for a in group:
+            for b in group:
+                if a != b:
+                    table[ids[a]][ids[b]] = 1
+    return table
+
+
+INITIAL_COST = cost_table(INITIALS, INITIAL_GROUPS)
+FINAL_COST = cost_table(FINALS, FINAL_GROUPS)
+TONE_COST = [[0 if a == b else 1 for b in range(5)] for a in range(5)]
+FEATURES = (('initial', INITIAL_COST), ('final', FINAL_COST), ('tone', TONE_COST))
+
+
+def load_entries(resource_dir=RESOURCE_DIR):
+    """Every distinct (chinese, pinyin) of all levels with its encoded syllables
+
+    Each entry is (chinese, pinyin, level, initials, finals, tones), the
+    last three being tuples of INITIALS/FINALS indices and tones taken from
+    the vocabulary's segmentation. Words repeated in a higher level keep
+    their lowest level; words with syllables outside the inventory are
+    left out.
+    """
+    entries = []
+    seen = set()
+    for level in HSK_LEVELS:
+        try:
+            vocab = load_vocabulary(level, resource_dir)
+        except FileNotFoundError:
+            continue
+        seg = vocab.segmentation
+        initial_ids, final_ids = seg.initial_ids, seg.final_ids
+        for i in range(len(vocab)):
+            word = vocab[i]
+            key = (word.chinese, word.pinyin)
+            start, end = seg.offsets[i], seg.offsets[i + 1]
+            if key in seen or start == end or UNKNOWN in seg.ids[start:end]:
+                continue
+            seen.add(key)
+            entries.append((word.chinese, word.pinyin, level,
+                            tuple(initial_ids[start:end]), tuple(final_ids[start:end]),
+                            tuple(seg.tones[start:end])))
+    return entries
+
+
+def describe(a, b):
+    """(kind, syllable) of the single difference between two entries"""
+    for position in range(len(a[3])):
+        for f, (kind, _) in enumerate(FEATURES):
+            if a[3 + f][position] != b[3 + f][position]:
+                return kind, position
+    return None, -1
+
+
+def pairs_python(entries):
+    """Index pairs at distance 1, found by bucketing instead of comparing all pairs
+
+    Two entries at distance 1 differ in exactly one feature of one syllable,
+    so they share exactly one key made of all their features with that one
+    left out.
+    """
+    buckets = {}
+    for n, entry in enumerate(entries):
+        length = len(entry[3])
+        for position in range(length):
+            for f in range(len(FEATURES)):
+                key = (length, position, f) + tuple(
+                    value if (g, p) != (f, position) else None
+                    for g in range(len(FEATURES)) for p, value in enumerate(entry[3 + g]))
+                buckets.setdefault(key, []).append(n)
+
+    pairs = []
+    for (_, position, f, *_), members in buckets.items():
+        if len(members) < 2:
+            continue
+        cost = FEATURES[f][1]
+        for x in range(len(members)):
+            a = entries[members[x]][3 + f][position]
+            for y in range(x + 1, len(members)):
+                if cost[a][entries[members[y]][3 + f][position]] == 1:
+                    pairs.append((members[x], members[y]))
+    return pairs
+
+
+def pairs_numpy(entries):
+    """Index pairs at distance 1, computed as batched pairwise distances"""
+    initial_cost = np.array(INITIAL_COST, dtype=np.uint8)
+    final_cost = np.array(FINAL_COST, dtype=np.uint8)
+    tone_cost = np.array(TONE_COST, dtype=np.uint8)
+
+    groups = {}
+    for n, entry in enumerate(entries):
+        groups.setdefault(len(entry[3]), []).append(n)
+
+    pairs = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        index = np.array(members)
+        initials = np.array([entries[n][3] for n in members], dtype=np.intp)
+        finals = np.array([entries[n][4] for n in members], dtype=np.intp)
+        tones = np.array([entries[n][5] for n in members], dtype=np.intp)
+        for start in range(0, len(members), BATCH):
+            rows = slice(start, start + BATCH)
+            # (batch, group, syllables) costs, summed over the syllables
+            distance = (initial_cost[initials[rows, None, :], initials[None, :, :]]
+                        + final_cost[finals[rows, None, :], finals[None, :, :]]
+                        + tone_cost[tones[rows, None, :], tones[None, :, :]]).sum(axis=2, dtype=np.int32)
+            a, b = np.nonzero(distance == 1)
+            a += start
+            keep = b > a
+            pairs.extend(zip(index[a[keep]].tolist(), index[b[keep]].tolist()))
+    return pairs
+
+
+def find_pairs(entries, use_numpy=None):
+    """Confusable pairs of entries as sorted (i, j) index tuples, i < j"""
+    if use_numpy is None:
+        use_numpy = np is not None
+    pairs = pairs_numpy(entries) if use_numpy else pairs_python(entries)
+    return sorted((min(a, b), max(a, b)) for a, b in pairs)
+
+
+def table_file(resource_dir=RESOURCE_DIR):
+    """Path of the persisted confusable-pairs table"""
+    return Path(resource_dir) / TABLE_NAME
+
+
+def sources(resource_dir=RESOURCE_DIR):
+    """Signature of the CSVs the table is built from"""
+    parts = []
+    for level in HSK_LEVELS:
+        try:
+            st = os.stat(hsk_file(level, resource_dir))
+        except OSError:
+            continue
+        parts.append(f"hsk{level}:{st.st_size}:{st.st_mtime_ns}")
+    return ' '.join(parts)
+
+
+def write_table(entries, pairs, resource_dir=RESOURCE_DIR):
+    """Persist pairs as TSV, headed by the signature of the source CSVs"""
+    lines = [f"# {sources(resource_dir)}\n"]
+    for i, j in pairs:
+        a, b = entries[i], entries[j]
+        kind, position = describe(a, b)
+        lines.append(f"{a[0]}\t{a[1]}\t{a[2]}\t{b[0]}\t{b[1]}\t{b[2]}\t{kind}\t{position}\n")
+    write_atomic(table_file(resource_dir), ''.join(lines), fsync=False)
+
+
+def build_table(resource_dir=RESOURCE_DIR, use_numpy=None):
+    """Analyse all levels and write the table; returns the number of pairs"""
+    entries = load_entries(resource_dir)
+    pairs = find_pairs(entries, use_numpy)
+    write_table(entries, pairs, resource_dir)
+    return len(pairs)
+
+
+class ConfusableTable:
+    """Confusable partners of each word, read from the persisted table"""
+
+    def __init__(self, path):
+        self.partners_of = {}
+        self.pairs = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                ca, pa, la, cb, pb, lb, kind, position = line.rstrip('\n').split('\t')
+                self.partners_of.setdefault(ca, []).append(
+                    {'chinese': cb, 'pinyin': pb, 'level': int(lb), 'kind': kind})
+                self.partners_of.setdefault(cb, []).append(
+                    {'chinese': ca, 'pinyin': pa, 'level': int(la), 'kind': kind})
+                self.pairs += 1
+
+    def partners(self, word):
+        """Words that can be mistaken for this one"""
+        return self.partners_of.get(word['chinese'], [])
+
+    def drill_words(self, words):
+        """The words of a deck that have at least one confusable partner"""
+        return [word for word in words if word['chinese'] in self.partners_of]
+
+    def distractors(self, fallback=None):
+        """A SessionEngine distractors source offering the partners first
+
+        Partners with the same pinyin are offered once; when a word has
+        fewer partners than needed, fallback(word, count, rng) fills in.
+        """
+        def choose(word, count, rng):
+            options, seen = [], {word['pinyin']}
+            partners = list(self.partners(word))
+            rng.shuffle(partners)
+            for partner in partners:
+                if partner['pinyin'] not in seen:
+                    options.append(partner)
+                    seen.add(partner['pinyin'])
+                    if len(options) == count:
+                        return options
+            if fallback is not None:
+                for extra in fallback(word, count, rng):
+                    if extra['pinyin'] not in seen and len(options) < count:
+                        options.append(extra)
+                        seen.add(extra['pinyin'])
+            return options
+        return choose
+
+
+def is_current(resource_dir=RESOURCE_DIR):
+    """True if the table exists and was built from the CSVs as they are now"""
+    try:
+        with open(table_file(resource_dir), 'r', encoding='utf-8') as f:
+            header = f.readline()
+    except OSError:
+        return False
+    return header.rstrip('\n') == f"# {sources(resource_dir)}"
+
+
+def load_table(resource_dir=RESOURCE_DIR):
+    """Return the shared ConfusableTable, building the file when missing or stale"""
+    key = str(resource_dir)
+    table = _cache.get(key)
+    if table is not None:
+        return table
+
+    with _cache_lock:
+        table = _cache.get(key)
+        if table is None:
+            if not is_current(resource_dir):
+                build_table(resource_dir)
+            table = ConfusableTable(table_file(resource_dir))
+            _cache[key] = table
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find confusable word pairs across all HSK levels")
+    parser.add_argument('--engine', choices=('auto', 'numpy', 'python'), default='auto',
+                        help="distance computation (default: numpy when installed)")
+    parser.add_argument('--show', type=int, default=10, metavar='N',
+                        help="print N example pairs of each kind")
+    args = parser.parse_args()
+
+    if args.engine == 'numpy' and np is None:
+        print("Error: numpy is not installed")
+        return 1
+    use_numpy = None if args.engine == 'auto' else args.engine == 'numpy'
+
+    start = time.perf_counter()
+    entries = load_entries()
+    loaded = time.perf_counter()
+    pairs = find_pairs(entries, use_numpy)
+    found = time.perf_counter()
+    write_table(entries, pairs)
+    engine = 'numpy' if (np is not None if use_numpy is None else use_numpy) else 'python'
+    print(f"{len(entries)} words, {len(pairs)} confusable pairs "
+          f"(load {loaded - start:.2f}s, {engine} search {found - loaded:.2f}s)")
+    print(f"Table written to {table_file()}")
+
+    by_kind = {}
+    for i, j in pairs:
+        kind, _ = describe(entries[i], entries[j])
+        by_kind.setdefault(kind, []).append((i, j))
+    for kind, kind_pairs in sorted(by_kind.items()):
+        print(f"\n{kind}: {len(kind_pairs)} pairs")
+        for i, j in kind_pairs[:args.show]:
+            a, b = entries[i], entries[j]
+            print(f"  {a[0]} {a[1]} (HSK{a[2]})  ~  {b[0]} {b[1]} (HSK{b[2]})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Deck export
+Stream HSK decks, a learner's patches or revision words to Anki (.apkg), TSV/CSV or JSON lines
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from itertools import chain, islice
+from pathlib import Path
+
+from interchange import read_json
+from permutation import progress_order
+from persistence import file_lock
+from profiles import Profile
+from review_journal import ReviewJournal
+from revision_set import parse_revision_line
+from sentence_index import load_sentences, parse_example
+from vocabulary import HSK_LEVELS, load_vocabulary
+from word_ids import ids_digest, word_id
+from word_index import load_word_index
+
+
+WORD_FIELDS = ('chinese', 'pinyin', 'meaning', 'han_viet', 'nghia_tieng_viet', 'cach_dung')
+EXAMPLE_FIELDS = ('sentence', 'romanization', 'translation')
+COLUMNS = WORD_FIELDS + EXAMPLE_FIELDS + ('deck',)
+PROGRESS_COLUMNS = ('reviews', 'correct', 'streak', 'last_review')
+FORMATS = {'.apkg': 'apkg', '.tsv': 'tsv', '.txt': 'tsv', '.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+BATCH_SIZE = 1000
+
+
+# Cards of every source are dicts with the COLUMNS (plus PROGRESS_COLUMNS
+# for a learner's words), a stable word 'id' and a list of 'tags'. Sources are
+# generators, so a whole export holds one batch of cards at a time.
+
+def card(word, wid, deck, tags, example=None, stats=None):
+    """One exported card; example is a parsed (sentence, romanization, translation, ...) row"""
+    if example is None:
+        example = parse_example(word.get('cach_dung', ''), word['chinese'])
+    item = {field: word.get(field, '') for field in WORD_FIELDS}
+    item.update(zip(EXAMPLE_FIELDS, example))
+    item['deck'] = deck
+    item['id'] = wid
+    item['tags'] = tags
+    if stats is not None:
+        item['reviews'] = stats.get('reviews', 0)
+        item['correct'] = stats.get('correct', 0)
+        item['streak'] = stats.get('streak', 0)
+        last = stats.get('last_review') or 0
+        item['last_review'] = datetime.fromtimestamp(last).isoformat(timespec='seconds') if last else ''
+    return item
+
+
+def level_cards(level, sentences=True):
+    """Every word of an HSK level"""
+    vocab = load_vocabulary(level)
+    index = load_sentences(level) if sentences else None
+    deck = f"HSK {level}"
+    tags = [f"hsk{level}"]
+    for i, wid in enumerate(vocab.word_ids):
+        example = index.rows[i] if index is not None else ('', '', '')
+        yield card(vocab[i], wid, deck, tags, example)
+
+
+def all_level_cards(sentences=True):
+    """Each word of HSK 1-6 once, in the lowest level that has it"""
+    for level, word, wid in load_word_index().combined():
+        example = load_sentences(level).rows[word.index] if sentences else ('', '', '')
+        yield card(word, wid, f"HSK {level}", [f"hsk{level}"], example)
+
+
+def parse_patches(text):
+    """'3' or '2-5' as a 1-based inclusive (first, last) pair"""
+    first, _, last = text.partition('-')
+    first, last = int(first), int(last or first)
+    if first < 1 or last < first:
+        raise ValueError(f"Invalid patch range: {text!r}")
+    return first, last
+
+
+def profile_order(profile):
+    """(config, progress, words, order) of a profile's current deck, read without changing it"""
+    config = {"hsk_level": 1, "words_per_patch": 10}
+    config.update(read_json(profile.config_file, create_lock=False) or {})
+    progress = read_json(profile.progress_file, create_lock=False) or {}
+    level = config['hsk_level']
+    vocab = load_vocabulary(level)
+    ids = vocab.word_ids
+    # A deck edited since the learner last opened it is remapped by the app,
+    # never here: the export must not write to the profile
+    digest = progress.get('words_digest')
+    order = None
+    if digest is None or (digest == ids_digest(ids) and progress.get('level') == level):
+        order = progress_order(progress, len(vocab))
+    if order is None:
+        raise ValueError(f"Progress of profile '{profile.display_name}' does not match the HSK {level} deck; "
+                         "open it in the app once to update it")
+    return config, progress, vocab, order
+
+
+def patch_cards(profile, stats, patches=None, sentences=True):
+    """The words of a range of a learner's patches (default: up to the current one)"""
+    config, progress, vocab, order = profile_order(profile)
+    level, per_patch = config['hsk_level'], config['words_per_patch']
+    first, last = patches or (1, progress.get('current_index', 0) + 1)
+    index = load_sentences(level) if sentences else None
+    ids = vocab.word_ids
+    deck = f"{profile.display_name}::HSK {level} patches {first}-{last}"
+    end = min(last * per_patch, len(order))
+    for position in range((first - 1) * per_patch, end):
+        i = order[position]
+        word = vocab[i]
+        tags = [f"hsk{level}", profile.display_name, f"patch{position // per_patch + 1}"]
+        example = index.rows[i] if index is not None else ('', '', '')
+        yield card(word, ids[i], deck, tags, example, stats.get(word.chinese, {}))
+
+
+def revision_cards(profile, stats, archive=False, sentences=True):
+    """A learner's revision words, or the mastered words evicted to the archive"""
+    path = profile.revision_archive_file if archive else profile.revision_file
+    name = 'Archive' if archive else 'Revision'
+    deck = f"{profile.display_name}::{name}"
+    tags = [name.lower(), profile.display_name]
+    words = load_word_index()
+    with file_lock(path, shared=True, create=False):
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                word = parse_revision_line(line)
+                if word is None:
+                    continue
+                # The line only names the form; the index tells which sense
+                # (and so which word ID and levels) it is
+                entry = words.resolve(word)
+                if entry is None:
+                    wid, levels = word_id(word['chinese']), []
+                else:
+                    wid, levels = words.word_id(entry), [f"hsk{words.levels(entry)[0]}"]
+                example = None if sentences else ('', '', '')
+                yield card(word, wid, deck, tags + levels, example,
+                           stats.get(word['chinese'], {}))
+
+
+def batches(items, size=BATCH_SIZE):
+    """Lists of up to `size` items"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_rows(items, f, fmt, columns):
+    """Write cards as TSV, CSV or JSON lines; return the count"""
+    count = 0
+    if fmt == 'jsonl':
+        for item in items:
+            f.write(json.dumps({column: item.get(column, '') for column in columns}, ensure_ascii=False) + '\n')
+            count += 1
+        return count
+    writer = csv.writer(f, delimiter='\t' if fmt == 'tsv' else ',', lineterminator='\n')
+    writer.writerow(columns)
+    for batch in batches(items):
+        writer.writerows([[item.get(column, '') for column in columns] for item in batch])
+        count += len(batch)
+    return count
+
+
+# Anki collection (schema 11, which every Anki version imports). Only the
+# tables and columns Anki reads from a package are filled in.
+ANKI_SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null, usn integer not null,
+    ls integer not null, conf text not null, models text not null, decks text not null,
+    dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null, flds text not null,
+    sfld integer not null, csum integer not null, flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null, type integer not null,
+    queue integer not null, due integer not null, ivl integer not null, factor integer not null,
+    reps integer not null, lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null, factor integer not null,
+    time integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+ANKI_FIELDS = ('Chinese', 'Pinyin', 'Meaning', 'Han Viet', 'Nghia', 'Usage', 'Sentence', 'Romanization',
+               'Translation')
+ANKI_TEMPLATES = (
+    ('Recognition',
+     '<div class="hanzi">{{Chinese}}</div>',
+     '{{FrontSide}}<hr id="answer"><div class="pinyin">{{Pinyin}}</div>{{Meaning}}<br>{{Nghia}}'
+     '{{#Han Viet}}<br>{{Han Viet}}{{/Han Viet}}'
+     '{{#Sentence}}<p>{{Sentence}}<br><small>{{Romanization}}<br>{{Translation}}</small></p>{{/Sentence}}'),
+    ('Recall',
+     '{{Meaning}}<br>{{Nghia}}',
+     '{{FrontSide}}<hr id="answer"><div class="hanzi">{{Chinese}}</div><div class="pinyin">{{Pinyin}}</div>'),
+)
+ANKI_CSS = (".card { font-family: sans-serif; font-size: 20px; text-align: center; }\n"
+            ".hanzi { font-size: 48px; }\n.pinyin { color: #555; }\n")
+
+
+def stable_id(text):
+    """Positive 52-bit ID derived from a name, so re-imports update instead of duplicating"""
+    return word_id(text) >> 12
+
+
+def anki_model(model_id, deck_id, now):
+    return {
+        "id": model_id, "name": "HSK Flashcard", "type": 0, "mod": now, "usn": -1, "sortf": 0,
+        "did": deck_id, "tags": [], "vers": [], "css": ANKI_CSS,
+        "latexPre": "\\documentclass[12pt]{article}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "flds": [{"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial",
+                  "size": 20, "media": []} for i, name in enumerate(ANKI_FIELDS)],
+        "tmpls": [{"name": name, "ord": i, "qfmt": front, "afmt": back, "did": None,
+                   "bqfmt": "", "bafmt": ""} for i, (name, front, back) in enumerate(ANKI_TEMPLATES)],
+        "req": [[0, "any", [0]], [1, "any", [2]]]
+    }
+
+
+def anki_deck(deck_id, name, now):
+    return {
+        "id": deck_id, "name": name, "mod": now, "usn": -1, "desc": "", "dyn": 0, "conf": 1,
+        "collapsed": False, "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0]
+    }
+
+
+ANKI_DECK_CONFIG = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+    "replayq": True, "dyn": False,
+    "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7],
+            "order": 1, "perDay": 20, "separate": True},
+    "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500,
+            "minSpace": 1, "perDay": 200},
+    "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0}
+}
+
+
+def write_collection(items, path, root):
+    """Fill a new Anki collection with cards (one note, two cards each); return the count
+
+    Notes and cards go in with executemany, a batch at a time, inside one
+    transaction with the journal off: the file is a scratch copy.
+    """
+    now = int(time.time())
+    base = now * 1000
+    model_id = stable_id("HSK Flashcard model")
+    decks = {}
+    db = sqlite3.connect(path)
+    try:
+        db.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + ANKI_SCHEMA)
+        count = 0
+        for batch in batches(items):
+            notes = []
+            cards = []
+            for item in batch:
+                name = f"{root}::{item['deck']}"
+                deck_id = decks.get(name)
+                if deck_id is None:
+                    deck_id = decks[name] = stable_id(f"deck {name}")
+                note_id = base + count
+                fields = [item[field] for field in WORD_FIELDS + EXAMPLE_FIELDS]
+                checksum = int(hashlib.sha1(item['chinese'].encode('utf-8')).hexdigest()[:8], 16)
+                guid = format(stable_id(f"{name}\x1f{item['id']:x}"), 'x')
+                tags = ' ' + ' '.join(tag.replace(' ', '_') for tag in item['tags']) + ' '
+                notes.append((note_id, guid, model_id, now, -1, tags, '\x1f'.join(fields),
+                              item['chinese'], checksum, 0, ''))
+                for ord_ in range(len(ANKI_TEMPLATES)):
+                    cards.append((base + 2 * count + ord_, note_id, deck_id, ord_, now, -1,
+                                  0, 0, count + 1, 0, 0, 0, 0, 0, 0, 0, 0, ''))
+                count += 1
+            db.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", notes)
+            db.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", cards)
+
+        # The collection row goes last, once every deck used is known
+        first_deck = next(iter(decks.values()), 1)
+        deck_json = {"1": anki_deck(1, "Default", now)}
+        deck_json.update({str(deck_id): anki_deck(deck_id, name, now) for name, deck_id in decks.items()})
+        conf = {"nextPos": count + 1, "estTimes": True, "activeDecks": [1], "sortType": "noteFld",
+                "timeLim": 0, "sortBackwards": False, "addToCur": True, "curDeck": 1,
+                "newBury": True, "newSpread": 0, "dueCounts": True, "curModel": str(model_id),
+                "collapseTime": 1200}
+        db.execute("INSERT INTO col VALUES (1,?,?,?,11,0,0,0,?,?,?,?,'{}')", (
+            now - now % 86400, base, base, json.dumps(conf),
+            json.dumps({str(model_id): anki_model(model_id, first_deck, now)}),
+            json.dumps(deck_json), json.dumps({"1": ANKI_DECK_CONFIG})))
+        db.commit()
+    finally:
+        db.close()
+    return count
+
+
+def write_apkg(items, path, root):
+    """Write cards to an Anki package (a zip of the collection and an empty media map)"""
+    with tempfile.TemporaryDirectory(dir=Path(path).parent) as tmp:
+        collection = Path(tmp) / "collection.anki2"
+        count = write_collection(items, collection, root)
+        package = Path(tmp) / "package.apkg"
+        with zipfile.ZipFile(package, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(collection, "collection.anki2")
+            z.writestr("media", "{}")
+        os.replace(package, path)
+    return count
+
+
+def export(items, path, fmt, columns, root="HSK"):
+    """Stream cards to path ('-' is stdout for the text formats); return the count"""
+    if fmt == 'apkg':
+        return write_apkg(items, path, root)
+    if path == '-':
+        return write_rows(items, sys.stdout, fmt, columns)
+    path = Path(path)
+    tmp_file = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+            count = write_rows(items, f, fmt, columns)
+        os.replace(tmp_file, path)
+    except BaseException:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        raise
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export HSK decks or learners' words to Anki, TSV/CSV or JSON lines")
+    parser.add_argument('output', help="output file (.apkg, .tsv, .csv or .jsonl; '-' writes to stdout)")
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                        help="output format (default: from the file extension)")
+    parser.add_argument('--level', type=int, action='append', choices=list(HSK_LEVELS),
+                        help="export an HSK level's deck (repeatable)")
+    parser.add_argument('--all-levels', action='store_true', help="export every word of HSK 1-6 once")
+    parser.add_argument('--profile', action='append',
+                        help="learner profile for --patches/--revision/--archive (repeatable; default: the shared default profile)")
+    parser.add_argument('--patches', nargs='?', const='', metavar='FIRST[-LAST]',
+                        help="export a range of the learners' patches (default: up to the current one)")
+    parser.add_argument('--revision', action='store_true', help="export the learners' revision words")
+    parser.add_argument('--archive', action='store_true', help="export the learners' archived (mastered) words")
+    parser.add_argument('--no-sentences', action='store_true', help="leave out the parsed example sentences")
+    parser.add_argument('--deck', default="HSK", help="parent deck name in Anki (default: HSK)")
+    args = parser.parse_args()
+
+    fmt = args.format or FORMATS.get(Path(args.output).suffix.lower())
+    if fmt is None:
+        print("Error: cannot tell the format from the file name; use --format")
+        return 1
+    if fmt == 'apkg' and args.output == '-':
+        print("Error: an Anki package cannot be written to stdout")
+        return 1
+    learner = args.patches is not None or args.revision or args.archive
+    if not (args.level or args.all_levels or learner):
+        print("Error: nothing to export; give --level, --all-levels, --patches, --revision or --archive")
+        return 1
+
+    sentences = not args.no_sentences
+    sources = []
+    try:
+        patches = parse_patches(args.patches) if args.patches else None
+        if args.all_levels:
+            sources.append(all_level_cards(sentences))
+        for level in args.level or ():
+            sources.append(level_cards(level, sentences))
+        if learner:
+            for name in args.profile or [None]:
+                profile = Profile(name)
+                if not profile.directory.is_dir():
+                    raise ValueError(f"No such profile: {profile.display_name}")
+                # Read-only: opening a ReviewJournal would lock and re-save its index
+                stats = ReviewJournal.read_stats(profile.journal_file)
+                if args.patches is not None:
+                    sources.append(patch_cards(profile, stats, patches, sentences))
+                if args.revision:
+                    sources.append(revision_cards(profile, stats, False, sentences))
+                if args.archive:
+                    sources.append(revision_cards(profile, stats, True, sentences))
+
+        columns = COLUMNS + (PROGRESS_COLUMNS if learner else ())
+        start = time.perf_counter()
+        count = export(chain.from_iterable(sources), args.output, fmt, columns, args.deck)
+        elapsed = time.perf_counter() - start
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.output != '-':
+        size = os.path.getsize(args.output)
+        print(f"Exported {count} words to {args.output} ({fmt}, {size / 1024:.1f} KiB) in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+"""
+Multiple-choice distractors
+Per-deck similarity index, built once from the compiled vocabulary and cached on disk
+"""
+
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+from persistence import write_atomic
+from pinyin_syllables import SYLLABLE_LIST, UNKNOWN
+from vocabulary import RESOURCE_DIR, hsk_file, load_vocabulary
+
+
+# Distractors kept per word, best first
+PER_WORD = 8
+NONE = 0xFFFF
+
+# Similarity weights
+SAME_LETTERS = 8        # same pinyin apart from tones (shì / shí)
+SHARED_CHAR = 4         # per character in common
+SHARED_SYLLABLE = 2     # per toneless syllable in common
+SHARED_MEANING = 1      # per meaning word in common
+SAME_LENGTH = 1         # same number of syllables
+
+# Features shared by more words than this say little and would make the
+# build quadratic, so they are skipped
+MAX_POSTING = 300
+
+MEANING_STOPWORDS = frozenset("""
+sth sb the and for with from into onto that this one's oneself used also
+not etc idiom lit fig abbr see variant
+""".split())
+MEANING_NOISE = re.compile(r"CL:\S*|\[[^\]]*\]|\([^)]*\)")
+MEANING_WORD = re.compile(r"[a-z]{3,}")
+
+# Cache layout (little-endian): header, then count * PER_WORD uint16 word
+# indices (NONE pads rows with fewer candidates)
+MAGIC = b'HSKD'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHIqq')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def distractor_file(csv_path):
+    """Return the path of the cached distractor index for a CSV file"""
+    return Path(csv_path).with_suffix(".distractors")
+
+
+def meaning_words(meaning):
+    """Content words of an English gloss, without classifiers and pinyin"""
+    text = MEANING_NOISE.sub(' ', meaning.lower())
+    return {w for w in MEANING_WORD.findall(text) if w not in MEANING_STOPWORDS}
+
+
+def word_features(vocab, i):
+    """Feature keys of word i; the key type is part of the tuple"""
+    word = vocab[i]
+    seg = vocab.segmentation
+    ids = seg.ids[seg.offsets[i]:seg.offsets[i + 1]]
+    syllables = [SYLLABLE_LIST[s] for s in ids if s != UNKNOWN]
+    features = {('letters', ''.join(syllables))}
+    features.update(('char', c) for c in word.chinese)
+    features.update(('syllable', s) for s in syllables)
+    features.update(('meaning', w) for w in meaning_words(word['meaning']))
+    return features, len(ids)
+
+
+WEIGHTS = {'letters': SAME_LETTERS, 'char': SHARED_CHAR,
+           'syllable': SHARED_SYLLABLE, 'meaning': SHARED_MEANING}
+
+
+def build_index(vocab):
+    """Return the PER_WORD best distractors of every word as a flat array
+
+    Candidates come from inverted postings (words sharing a character,
+    toneless syllable or meaning word), so the cost follows the overlap
+    between words rather than the square of the deck size. Words whose
+    pinyin or characters equal the target's are never offered: they would
+    be a second right answer.
+    """
+    count = len(vocab)
+    features = []
+    lengths = []
+    postings = {}
+    for i in range(count):
+        keys, length = word_features(vocab, i)
+        features.append(keys)
+        lengths.append(length)
+        for key in keys:
+            postings.setdefault(key, []).append(i)
+
+    pinyins = [vocab[i].pinyin for i in range(count)]
+    chineses = [vocab[i].chinese for i in range(count)]
+    rows = array('H', [NONE] * (count * PER_WORD))
+    for i in range(count):
+        scores = {}
+        for key in features[i]:
+            posting = postings[key]
+            if len(posting) > MAX_POSTING:
+                continue
+            weight = WEIGHTS[key[0]]
+            for j in posting:
+                scores[j] = scores.get(j, 0) + weight
+        ranked = sorted(
+            (j for j in scores
+             if pinyins[j] != pinyins[i] and chineses[j] != chineses[i]),
+            key=lambda j: (-(scores[j] + (SAME_LENGTH if lengths[j] == lengths[i] else 0)), j))
+        # Pad thin rows with neighbours of the same length so every word has choices
+        if len(ranked) < PER_WORD:
+            seen = set(ranked)
+            for step in range(1, count):
+                j = (i + step * 97) % count
+                if (j not in seen and lengths[j] == lengths[i]
+                        and pinyins[j] != pinyins[i] and chineses[j] != chineses[i]):
+                    ranked.append(j)
+                    seen.add(j)
+                    if len(ranked) == PER_WORD:
+                        break
+        for slot, j in enumerate(ranked[:PER_WORD]):
+            rows[i * PER_WORD + slot] = j
+    return rows
+
+
+class DistractorIndex:
+    """Precomputed distractors for one deck; lookups are O(1)"""
+
+    def __init__(self, vocab, rows):
+        self.vocab = vocab
+        self.rows = rows
+        self.positions = None
+
+    def position(self, word):
+        """Index of a word in the deck, or None if it is not part of it"""
+        if getattr(word, 'vocab', None) is self.vocab:
+            return word.index
+        if self.positions is None:
+            self.positions = {self.vocab[i].chinese: i for i in range(len(self.vocab))}
+        return self.positions.get(word['chinese'])
+
+    def candidates(self, word):
+        """Precomputed distractor indices of a word, best first"""
+        i = self.position(word)
+        if i is None:
+            return []
+        row = self.rows[i * PER_WORD:(i + 1) * PER_WORD]
+        return [j for j in row if j != NONE]
+
+    def choose(self, word, count, rng):
+        """Return `count` distractor words for a word
+
+        Draws from the best 2 * count candidates so repeated questions vary;
+        words outside the deck (e.g. revision words from another level) get
+        random deck words instead.
+        """
+        pool = self.candidates(word)[:2 * count]
+        if len(pool) >= count:
+            picked = rng.sample(pool, count)
+        else:
+            picked = list(pool)
+            size = len(self.vocab)
+            for _ in range(size):
+                if len(picked) >= count:
+                    break
+                j = rng.randrange(size)
+                other = self.vocab[j]
+                if (j not in picked and other.pinyin != word['pinyin']
+                        and other.chinese != word['chinese']):
+                    picked.append(j)
+        return [self.vocab[j] for j in picked]
+
+
+def is_current(path, csv_path):
+    """True if a cached index exists and was built from the CSV as it is now"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        st = os.stat(csv_path)
+    except OSError:
+        return False
+    if len(header) != HEADER.size:
+        return False
+    magic, version, per_word, _, size, mtime_ns = HEADER.unpack(header)
+    return (magic == MAGIC and version == FORMAT_VERSION and per_word == PER_WORD
+            and size == st.st_size and mtime_ns == st.st_mtime_ns)
+
+
+def open_index(csv_path, vocab):
+    """Read the cached index for a deck, (re)building it when missing or stale"""
+    path = distractor_file(csv_path)
+    if is_current(path, csv_path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        _, _, _, count, _, _ = HEADER.unpack_from(data, 0)
+        if count == len(vocab) and len(data) == HEADER.size + 2 * count * PER_WORD:
+            rows = array('H')
+            rows.frombytes(data[HEADER.size:])
+            if sys.byteorder == 'big':
+                rows.byteswap()
+            return DistractorIndex(vocab, rows)
+
+    rows = build_index(vocab)
+    st = os.stat(csv_path)
+    stored = array('H', rows)
+    if sys.byteorder == 'big':
+        stored.byteswap()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, PER_WORD, len(vocab), st.st_size, st.st_mtime_ns)
+    try:
+        write_atomic(path, header + stored.tobytes(), fsync=False)
+    except OSError:
+        # Read-only install: the index just lives for this process
+        pass
+    return DistractorIndex(vocab, rows)
+
+
+def load_distractors(level, resource_dir=RESOURCE_DIR):
+    """Return the shared DistractorIndex of an HSK level"""
+    path = hsk_file(level, resource_dir)
+    key = str(path)
+    index = _cache.get(key)
+    if index is not None:
+        return index
+
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is None:
+            index = open_index(path, load_vocabulary(level, resource_dir))
+            _cache[key] = index
+    return index
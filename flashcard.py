@@ -4,12 +4,27 @@ Chinese Flashcard Learning System
 Learn Chinese vocabulary using HSK levels with flashcard method
 """
 
-import csv
-import random
+import time
+
+# Taken before the other imports so --timing can include them
+STARTED = time.perf_counter()
+
+import argparse
 import json
 import os
+import sys
 from pathlib import Path
 
+from learning_stats import LearningStats
+from permutation import new_progress, position_lookup, progress_order
+from persistence import ChangeTracker, DebouncedWriter, file_lock
+from profiles import Profile, list_profiles
+from review_journal import ReviewJournal
+from revision_set import DEFAULT_CAPACITY, DEFAULT_POLICY, POLICIES, RevisionStore
+from session_engine import CLOZE, MULTIPLE_CHOICE, QUESTION_STYLES, SessionEngine
+from vocabulary import hsk_file, load_vocabulary
+from word_ids import record_ids, sync_progress
+
 
 # ANSI color codes
 class Colors:
@@ -22,127 +37,210 @@ class Colors:
 
 
 class ChineseFlashcard:
-    def __init__(self):
+    def __init__(self, profile=None):
         self.resource_dir = Path(__file__).parent / "resource"
-        self.config_file = Path(__file__).parent / "config.json"
-        self.progress_file = Path(__file__).parent / "progress.json"
-        self.revision_file = Path(__file__).parent / "revision.txt"
+        # Config/progress saves are coalesced and written off the main thread;
+        # the tracker tells our own writes apart from another instance's
+        self.tracker = ChangeTracker()
+        self.writer = DebouncedWriter(tracker=self.tracker)
+        # (imported, loaded) perf_counter times when --timing asked for a report
+        self.startup = None
+        self.use_profile(profile or Profile())
+    
+    def use_profile(self, profile):
+        """Point the app at a profile's state files and load them"""
+        self.profile = profile
+        self.profile.ensure_directory()
+        self.config_file = profile.config_file
+        self.progress_file = profile.progress_file
+        self.revision_file = profile.revision_file
+        self.journal_file = profile.journal_file
+        self.stats_file = profile.stats_file
         
         # Default configuration
         self.config = {
             "hsk_level": 1,
-            "words_per_patch": 10
+            "words_per_patch": 10,
+            "question_style": "typed",
+            "revision_capacity": DEFAULT_CAPACITY,
+            "revision_policy": DEFAULT_POLICY
         }
         
         # Progress tracking
         self.progress = {
             "current_index": 0,
-            "shuffled_indices": []
+            "seed": None,
+            "word_count": 0
         }
         
         self.words = []
+        self.order = []
+        self.position = position_lookup(self.order)
+        self.journal = ReviewJournal(self.journal_file)
+        self.stats = LearningStats(self.stats_file)
         self.load_config()
+        self.revision = self.open_revision()
         self.load_progress()
         self.load_words()
     
+    def switch_profile(self, name):
+        """Save the current learner's state and switch to another profile"""
+        profile = Profile(name)
+        self.flush_state()
+        self.use_profile(profile)
+    
     def load_config(self):
         """Load configuration from file"""
-        if self.config_file.exists():
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                self.config.update(json.load(f))
+        with file_lock(self.config_file, shared=True):
+            if self.config_file.exists():
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    self.config.update(json.load(f))
+            self.tracker.mark(self.config_file)
     
     def save_config(self):
         """Save configuration to file"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=2)
+        self.writer.schedule(self.config_file, json.dumps(self.config, indent=2))
     
     def load_progress(self):
         """Load progress from file"""
-        if self.progress_file.exists():
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                self.progress.update(json.load(f))
+        with file_lock(self.progress_file, shared=True):
+            if self.progress_file.exists():
+                with open(self.progress_file, 'r', encoding='utf-8') as f:
+                    self.progress.update(json.load(f))
+            self.tracker.mark(self.progress_file)
     
     def save_progress(self):
         """Save progress to file"""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress, f, indent=2)
+        self.writer.schedule(self.progress_file, json.dumps(self.progress, indent=2))
     
     def load_words(self):
         """Load words from HSK CSV file"""
-        hsk_file = self.resource_dir / f"hsk{self.config['hsk_level']}.csv"
-        
-        if not hsk_file.exists():
-            print(f"Error: {hsk_file} not found!")
+        try:
+            # Parsed once per process and shared by every profile
+            self.words = load_vocabulary(self.config['hsk_level'], self.resource_dir)
+        except FileNotFoundError:
+            print(f"Error: {hsk_file(self.config['hsk_level'], self.resource_dir)} not found!")
             return
         
-        self.words = []
-        with open(hsk_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Handle different column name formats (case-insensitive)
-                row_lower = {k.lower(): v for k, v in row.items()}
-                
-                self.words.append({
-                    'chinese': row.get('Chinese') or row.get('chinese', ''),
-                    'pinyin': row.get('Pinyin') or row.get('pinyin', ''),
-                    'meaning': row.get('Meaning_English') or row.get('meaning', ''),
-                    'han_viet': row.get('Han_Viet') or row.get('han_viet', ''),
-                    'nghia_tieng_viet': row.get('Nghia_Tieng_Viet') or row.get('nghia_tieng_viet', ''),
-                    'cach_dung': row.get('Cach_dung_trong_cau') or row.get('cach_dung_trong_cau', '')
-                })
-        
-        # Initialize shuffled indices if not exists or if word count changed
-        if not self.progress['shuffled_indices'] or len(self.progress['shuffled_indices']) != len(self.words):
-            self.progress['shuffled_indices'] = list(range(len(self.words)))
-            random.shuffle(self.progress['shuffled_indices'])
-            self.progress['current_index'] = 0
+        self.sync_order()
+    
+    def refresh_state(self):
+        """Pick up config and progress saved by another instance of this profile
+
+        Skipped while we have unsaved changes of our own, which win.
+        """
+        if self.writer.has_pending():
+            return
+        level = self.config['hsk_level']
+        if self.tracker.changed(self.config_file):
+            self.load_config()
+        progress_changed = self.tracker.changed(self.progress_file)
+        if progress_changed:
+            self.load_progress()
+        if self.config['hsk_level'] != level:
+            self.load_words()
+        elif progress_changed:
+            self.sync_order()
+    
+    def sync_order(self):
+        """Rebuild the patch order from progress, remapping it if the CSV changed
+
+        Only progress that cannot be carried over is reshuffled.
+        """
+        self.order, changed = sync_progress(self.progress, self.config['hsk_level'],
+                                            self.words.word_ids, self.profile.word_ids_file)
+        if self.order is None:
+            self.reset_progress()
+            return
+        self.position = position_lookup(self.order)
+        if changed:
             self.save_progress()
     
+    def reset_progress(self):
+        """Pick a new seed and start again from the first patch"""
+        self.progress = new_progress(len(self.words))
+        record_ids(self.progress, self.config['hsk_level'], self.words.word_ids,
+                   self.profile.word_ids_file)
+        self.order = progress_order(self.progress, len(self.words))
+        self.position = position_lookup(self.order)
+        self.save_progress()
+    
+    def word_position(self, word):
+        """Position of a word in the shuffled order (None if not in this level)"""
+        index = self.words.find(word['chinese']) if self.words else None
+        return None if index is None else self.position(index)
+    
+    def record_answer(self, word, mode, correct, latency=None, now=None):
+        """Log an answer to the review journal and statistics (now: its time, default the clock)"""
+        self.journal.record(word, mode, correct, latency, now)
+        self.revision.record(word, correct, latency, now)
+        
+        position = self.word_position(word)
+        if position is None:
+            self.stats.record(word, mode, correct, now=now)
+        else:
+            patch = position // self.config['words_per_patch']
+            self.stats.record(word, mode, correct, self.config['hsk_level'], patch, now)
+    
+    def flush_state(self):
+        """Persist buffered journal events, statistics and pending saves"""
+        self.journal.flush()
+        self.stats.save()
+        self.writer.flush()
+    
+    def close(self):
+        """Flush everything and stop the background writer"""
+        self.flush_state()
+        self.writer.close()
+    
+    # The pinyin matcher and the per-level indexes are imported on first
+    # use rather than at startup: the main menu needs none of them
+    
     def normalize_pinyin(self, pinyin):
         """Normalize pinyin for comparison (remove spaces, lowercase)"""
-        return pinyin.lower().replace(' ', '').replace(',', '')
+        import pinyin_utils
+        return pinyin_utils.normalize_pinyin(pinyin)
     
     def convert_tone_marks(self, pinyin):
         """Convert tone marks to numbers for display"""
-        tone_map = {
-            'ā': 'a1', 'á': 'a2', 'ǎ': 'a3', 'à': 'a4',
-            'ē': 'e1', 'é': 'e2', 'ě': 'e3', 'è': 'e4',
-            'ī': 'i1', 'í': 'i2', 'ǐ': 'i3', 'ì': 'i4',
-            'ō': 'o1', 'ó': 'o2', 'ǒ': 'o3', 'ò': 'o4',
-            'ū': 'u1', 'ú': 'u2', 'ǔ': 'u3', 'ù': 'u4',
-            'ǖ': 'ü1', 'ǘ': 'ü2', 'ǚ': 'ü3', 'ǜ': 'ü4',
-            'ü': 'v', 'ń': 'n2', 'ň': 'n3', 'ǹ': 'n4'
-        }
-        
-        result = pinyin
-        for mark, num in tone_map.items():
-            result = result.replace(mark, num)
-        return result
+        import pinyin_utils
+        return pinyin_utils.convert_tone_marks(pinyin)
     
     def check_pinyin_answer(self, user_input, correct_pinyin):
         """Check if user's pinyin input is correct"""
-        # Convert correct pinyin tone marks to numbers, then normalize
-        correct_with_numbers = self.convert_tone_marks(correct_pinyin)
-        
-        # Normalize both inputs
-        user_normalized = self.normalize_pinyin(user_input)
-        correct_normalized = self.normalize_pinyin(correct_with_numbers)
-        
-        return user_normalized == correct_normalized
+        import pinyin_utils
+        return pinyin_utils.check_pinyin(user_input, correct_pinyin)
+    
+    def question_setup(self, question_types=None):
+        """Question types (and their distractors or graders) for a session, per the config"""
+        style = self.config.get('question_style')
+        if style == 'choice':
+            from distractors import load_distractors
+            index = load_distractors(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [MULTIPLE_CHOICE], 'distractors': index.choose}
+        if style in ('english', 'vietnamese'):
+            from gloss_index import load_gloss_index
+            index = load_gloss_index(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [f'chinese_to_{style}'], 'graders': index.graders()}
+        if style == 'cloze':
+            from sentence_index import load_sentences
+            index = load_sentences(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [CLOZE], 'cloze': index.cloze}
+        return {'question_types': question_types} if question_types else {}
     
     def get_current_patch(self):
         """Get current patch of words based on current index"""
         words_per_patch = self.config['words_per_patch']
         current_idx = self.progress['current_index']
-        shuffled_indices = self.progress['shuffled_indices']
+        order = self.order
         
         start = current_idx * words_per_patch
-        end = min(start + words_per_patch, len(shuffled_indices))
+        end = min(start + words_per_patch, len(order))
         
-        if start >= len(shuffled_indices):
+        if start >= len(order):
             return []
         
-        patch_indices = shuffled_indices[start:end]
+        patch_indices = order[start:end]
         return [self.words[i] for i in patch_indices]
     
     def get_previous_patch(self):
@@ -152,71 +250,93 @@ class ChineseFlashcard:
         
         words_per_patch = self.config['words_per_patch']
         prev_idx = self.progress['current_index'] - 1
-        shuffled_indices = self.progress['shuffled_indices']
+        order = self.order
         
         start = prev_idx * words_per_patch
-        end = min(start + words_per_patch, len(shuffled_indices))
+        end = min(start + words_per_patch, len(order))
         
-        patch_indices = shuffled_indices[start:end]
+        patch_indices = order[start:end]
         return [self.words[i] for i in patch_indices]
     
-    def save_word_to_revision(self, word):
-        """Save a word to revision.txt file"""
-        # Read existing revision words to avoid duplicates
-        existing_words = set()
-        if self.revision_file.exists():
-            with open(self.revision_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split('|')
-                    if len(parts) >= 2:
-                        existing_words.add(parts[0])  # Chinese character
-        
-        # Only add if not already in revision
-        if word['chinese'] not in existing_words:
-            with open(self.revision_file, 'a', encoding='utf-8') as f:
-                # Format: Chinese|Pinyin|Meaning|Han_Viet|Nghia_Tieng_Viet|Cach_dung
-                f.write(f"{word['chinese']}|{word['pinyin']}|{word['meaning']}|{word.get('han_viet', '')}|{word.get('nghia_tieng_viet', '')}|{word.get('cach_dung', '')}\n")
+    def open_revision(self):
+        """Revision list bounded by the configured capacity and eviction policy"""
+        policy = self.config.get('revision_policy')
+        return RevisionStore(self.revision_file, self.profile.revision_archive_file,
+                             self.config.get('revision_capacity', DEFAULT_CAPACITY),
+                             policy if policy in POLICIES else DEFAULT_POLICY,
+                             stats=self.journal.word_stats)
     
     def load_revision_words(self):
-        """Load words from revision.txt file"""
-        if not self.revision_file.exists():
-            return []
-        
-        revision_words = []
-        with open(self.revision_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) >= 3:
-                    revision_words.append({
-                        'chinese': parts[0],
-                        'pinyin': parts[1],
-                        'meaning': parts[2],
-                        'han_viet': parts[3] if len(parts) > 3 else '',
-                        'nghia_tieng_viet': parts[4] if len(parts) > 4 else '',
-                        'cach_dung': parts[5] if len(parts) > 5 else ''
-                    })
-        
-        return revision_words
+        """Load words from revision.txt"""
+        return self.revision.words()
+    
+    def save_word_to_revision(self, word):
+        """Save a word to revision.txt, archiving the words it pushes out"""
+        return self.revision.add(word)
     
     def remove_word_from_revision(self, word):
-        """Remove a word from revision.txt file"""
-        if not self.revision_file.exists():
-            return
-        
-        # Read all words except the one to remove
-        remaining_words = []
-        with open(self.revision_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) >= 1 and parts[0] != word['chinese']:
-                    remaining_words.append(line)
+        """Remove a word from revision.txt"""
+        self.revision.remove(word)
+    
+    def print_word_details(self, word, question_type):
+        """Print the parts of a word that were not shown in the question"""
+        if question_type in ('meaning_to_pinyin', CLOZE):
+            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
+        if question_type != 'meaning_to_pinyin':
+            print(f"Meaning: {word['meaning']}")
+        if word.get('han_viet'):
+            print(f"Hán Việt: {word['han_viet']}")
+        if word.get('nghia_tieng_viet'):
+            print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
+        if word.get('cach_dung'):
+            print(f"Cách dùng: {word['cach_dung']}")
+    
+    def ask_question(self, engine, prompt, correct_note="", wrong_note=None):
+        """Show one prompt from the engine, read the answer and print feedback"""
+        word = prompt['word']
+        if prompt['question_type'] == 'meaning_to_pinyin':
+            print(f"Meaning: {word['meaning']}")
+        elif prompt['question_type'] == CLOZE:
+            print(f"Sentence: {Colors.BOLD}{Colors.CYAN}{prompt['question']}{Colors.RESET}")
+            print(f"Translation: {prompt['hint']}")
+        else:
+            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
         
-        # Write back the remaining words
-        with open(self.revision_file, 'w', encoding='utf-8') as f:
-            f.writelines(remaining_words)
+        options = prompt.get('options')
+        if options:
+            for number, option in enumerate(options, 1):
+                print(f"  {number}. {option['pinyin']}")
+        
+        engine.mark_shown()
+        if options:
+            user_input = input(f"Choose 1-{len(options)}: ").strip()
+        elif prompt['question_type'] == 'chinese_to_english':
+            user_input = input("Type the English meaning: ").strip()
+        elif prompt['question_type'] == 'chinese_to_vietnamese':
+            user_input = input("Type the Vietnamese meaning: ").strip()
+        elif prompt['question_type'] == CLOZE:
+            user_input = input("Type the pinyin of the missing word: ").strip()
+        else:
+            user_input = input("Type the pinyin (tone numbers or tone marks): ").strip()
+        result = engine.answer(user_input)
+        
+        if prompt['question_type'] == 'chinese_to_vietnamese':
+            expected = word['nghia_tieng_viet']
+        elif prompt['question_type'] == 'chinese_to_english':
+            expected = word['meaning']
+        else:
+            expected = self.convert_tone_marks(word['pinyin'])
+        if result['correct']:
+            print(f"{Colors.GREEN}✓ Correct!{correct_note}{Colors.RESET}")
+        else:
+            print(f"{Colors.RED}✗ Incorrect. Correct answer: {expected}{Colors.RESET}")
+            if wrong_note:
+                print(wrong_note)
+        self.print_word_details(word, prompt['question_type'])
+        return result
     
-    def flashcard_session(self, words):
-        """Run a flashcard learning session with endless shuffle"""
+    def flashcard_session(self, words, mode='learn', setup=None):
+        """Run an endless flashcard session with adaptive card sampling"""
         if not words:
             print("No words in this patch!")
             return
@@ -226,78 +346,44 @@ class ChineseFlashcard:
         print(f"{'='*60}")
         print("Press Ctrl+C to exit the session\n")
         
-        word_count = 0
+        engine = SessionEngine(words, self.check_pinyin_answer, mode=mode, endless=True,
+                               stats=self.journal.all_stats(), on_answer=self.record_answer,
+                               **(self.question_setup() if setup is None else setup))
         try:
             while True:
-                # Shuffle words for each round
-                shuffled_words = words.copy()
-                random.shuffle(shuffled_words)
+                # Engine draws the next card, favouring words that need practice
+                prompt = engine.next_prompt()
                 
-                for word in shuffled_words:
-                    word_count += 1
-                    # Randomly choose question type
-                    question_type = random.choice(['chinese_to_pinyin', 'meaning_to_pinyin'])
-                    
-                    print(f"\nWord #{word_count}")
-                    print("-" * 40)
-                    
-                    if question_type == 'chinese_to_pinyin':
-                        print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
-                        user_input = input("Type the pinyin (use 1234 for tones): ").strip()
-                        
-                        correct = self.check_pinyin_answer(user_input, word['pinyin'])
-                        
-                        if correct:
-                            print(f"{Colors.GREEN}✓ Correct!{Colors.RESET}")
-                            print(f"Meaning: {word['meaning']}")
-                            if word.get('han_viet'):
-                                print(f"Hán Việt: {word['han_viet']}")
-                            if word.get('nghia_tieng_viet'):
-                                print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                            if word.get('cach_dung'):
-                                print(f"Cách dùng: {word['cach_dung']}")
-                        else:
-                            print(f"{Colors.RED}✗ Incorrect. Correct answer: {self.convert_tone_marks(word['pinyin'])}{Colors.RESET}")
-                            print(f"Meaning: {word['meaning']}")
-                            if word.get('han_viet'):
-                                print(f"Hán Việt: {word['han_viet']}")
-                            if word.get('nghia_tieng_viet'):
-                                print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                            if word.get('cach_dung'):
-                                print(f"Cách dùng: {word['cach_dung']}")
-                    
-                    else:  # meaning_to_pinyin
-                        print(f"Meaning: {word['meaning']}")
-                        user_input = input("Type the pinyin (use 1234 for tones): ").strip()
-                        
-                        correct = self.check_pinyin_answer(user_input, word['pinyin'])
-                        
-                        if correct:
-                            print(f"{Colors.GREEN}✓ Correct!{Colors.RESET}")
-                            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
-                            if word.get('han_viet'):
-                                print(f"Hán Việt: {word['han_viet']}")
-                            if word.get('nghia_tieng_viet'):
-                                print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                            if word.get('cach_dung'):
-                                print(f"Cách dùng: {word['cach_dung']}")
-                        else:
-                            print(f"{Colors.RED}✗ Incorrect. Correct answer: {self.convert_tone_marks(word['pinyin'])}{Colors.RESET}")
-                            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
-                            if word.get('han_viet'):
-                                print(f"Hán Việt: {word['han_viet']}")
-                            if word.get('nghia_tieng_viet'):
-                                print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                            if word.get('cach_dung'):
-                                print(f"Cách dùng: {word['cach_dung']}")
-                    
-                    input("\nPress Enter to continue...")
+                print(f"\nWord #{prompt['number']}")
+                print("-" * 40)
+                
+                self.ask_question(engine, prompt)
+                input("\nPress Enter to continue...")
         
         except KeyboardInterrupt:
+            self.flush_state()
             print(f"\n\n{'='*60}")
-            print(f"Session ended! You practiced {word_count} word(s).")
+            print(f"Session ended! You practiced {engine.answered} word(s).")
+            for line in engine.tracker.summary_lines():
+                print(line)
             print(f"{'='*60}\n")
     
+    def confusables_session(self):
+        """Drill this level's words that have near-homophones, picking among them"""
+        from confusables import load_table
+        from distractors import load_distractors
+        
+        table = load_table(self.resource_dir)
+        words = table.drill_words(self.words)
+        if not words:
+            print("\nNo confusable words at this HSK level.")
+            return
+        
+        index = load_distractors(self.config['hsk_level'], self.resource_dir)
+        self.flashcard_session(words, mode='confusables',
+                               setup={'question_types': [MULTIPLE_CHOICE],
+                                      'distractors': table.distractors(index.choose)})
+    
     def test_session(self, num_previous_patches):
         """Test previous patches of words"""
         if self.progress['current_index'] == 0:
@@ -311,60 +397,43 @@ class ChineseFlashcard:
         max_patches = min(num_previous_patches, current_idx)
         
         # Get words from previous patches
-        shuffled_indices = self.progress['shuffled_indices']
+        order = self.order
         start = (current_idx - max_patches) * words_per_patch
         end = current_idx * words_per_patch
         
-        test_indices = shuffled_indices[start:end]
+        test_indices = order[start:end]
         test_words = [self.words[i] for i in test_indices]
         
-        # Shuffle test words
-        random.shuffle(test_words)
+        # Engine shuffles test words and always asks Chinese -> pinyin
+        engine = SessionEngine(test_words, self.check_pinyin_answer, mode='test',
+                               on_answer=self.record_answer,
+                               **self.question_setup(['chinese_to_pinyin']))
         
         print(f"\n{'='*60}")
         print(f"Test Session - {len(test_words)} words from {max_patches} previous patch(es)")
         print(f"{'='*60}\n")
         
-        correct_count = 0
-        
-        for i, word in enumerate(test_words, 1):
-            print(f"\nQuestion {i}/{len(test_words)}")
-            print("-" * 40)
-            
-            # Always show Chinese character in test
-            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
-            user_input = input("Type the pinyin (use 1234 for tones): ").strip()
+        while True:
+            prompt = engine.next_prompt()
+            if prompt is None:
+                break
             
-            correct = self.check_pinyin_answer(user_input, word['pinyin'])
+            print(f"\nQuestion {prompt['number']}/{prompt['total']}")
+            print("-" * 40)
             
-            if correct:
-                print(f"{Colors.GREEN}✓ Correct!{Colors.RESET}")
-                print(f"Meaning: {word['meaning']}")
-                if word.get('han_viet'):
-                    print(f"Hán Việt: {word['han_viet']}")
-                if word.get('nghia_tieng_viet'):
-                    print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                if word.get('cach_dung'):
-                    print(f"Cách dùng: {word['cach_dung']}")
-                correct_count += 1
-            else:
-                print(f"{Colors.RED}✗ Incorrect. Correct answer: {self.convert_tone_marks(word['pinyin'])}{Colors.RESET}")
-                print(f"Meaning: {word['meaning']}")
-                if word.get('han_viet'):
-                    print(f"Hán Việt: {word['han_viet']}")
-                if word.get('nghia_tieng_viet'):
-                    print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                if word.get('cach_dung'):
-                    print(f"Cách dùng: {word['cach_dung']}")
+            result = self.ask_question(engine, prompt)
+            if not result['correct']:
                 # Save wrong word to revision
-                self.save_word_to_revision(word)
+                self.save_word_to_revision(result['word'])
         
-        # Calculate score
-        score = (correct_count / len(test_words)) * 100
+        self.flush_state()
+        summary = engine.summary()
         
         print(f"\n{'='*60}")
         print(f"Test Complete!")
-        print(f"Score: {correct_count}/{len(test_words)} ({score:.1f}%)")
+        print(f"Score: {summary['correct']}/{len(test_words)} ({summary['score']:.1f}%)")
+        for line in engine.tracker.summary_lines():
+            print(line)
         print(f"{'='*60}\n")
     
     def revision_test_session(self):
@@ -375,62 +444,44 @@ class ChineseFlashcard:
             print("\nNo words in revision! Your revision list is empty.")
             return
         
-        # Shuffle revision words
-        random.shuffle(revision_words)
+        # Engine shuffles revision words and always asks Chinese -> pinyin
+        engine = SessionEngine(revision_words, self.check_pinyin_answer, mode='revision_test',
+                               on_answer=self.record_answer,
+                               **self.question_setup(['chinese_to_pinyin']))
         
         print(f"\n{'='*60}")
         print(f"Revision Test Session - {len(revision_words)} words")
         print(f"{'='*60}\n")
         print("Correct answers will be removed from revision list.\n")
         
-        correct_count = 0
-        words_to_remove = []
-        
-        for i, word in enumerate(revision_words, 1):
-            print(f"\nQuestion {i}/{len(revision_words)}")
-            print("-" * 40)
-            
-            # Always show Chinese character in test
-            print(f"Chinese: {Colors.BOLD}{Colors.CYAN}{word['chinese']}{Colors.RESET}")
-            user_input = input("Type the pinyin (use 1234 for tones): ").strip()
+        while True:
+            prompt = engine.next_prompt()
+            if prompt is None:
+                break
             
-            correct = self.check_pinyin_answer(user_input, word['pinyin'])
+            print(f"\nQuestion {prompt['number']}/{prompt['total']}")
+            print("-" * 40)
             
-            if correct:
-                print(f"{Colors.GREEN}✓ Correct! This word will be removed from revision.{Colors.RESET}")
-                print(f"Meaning: {word['meaning']}")
-                if word.get('han_viet'):
-                    print(f"Hán Việt: {word['han_viet']}")
-                if word.get('nghia_tieng_viet'):
-                    print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                if word.get('cach_dung'):
-                    print(f"Cách dùng: {word['cach_dung']}")
-                correct_count += 1
-                words_to_remove.append(word)
-            else:
-                print(f"{Colors.RED}✗ Incorrect. Correct answer: {self.convert_tone_marks(word['pinyin'])}{Colors.RESET}")
-                print(f"This word will remain in your revision list.")
-                print(f"Meaning: {word['meaning']}")
-                if word.get('han_viet'):
-                    print(f"Hán Việt: {word['han_viet']}")
-                if word.get('nghia_tieng_viet'):
-                    print(f"Nghĩa Tiếng Việt: {word['nghia_tieng_viet']}")
-                if word.get('cach_dung'):
-                    print(f"Cách dùng: {word['cach_dung']}")
+            self.ask_question(engine, prompt,
+                              correct_note=" This word will be removed from revision.",
+                              wrong_note="This word will remain in your revision list.")
+        
+        self.flush_state()
+        summary = engine.summary()
         
         # Remove correct words from revision
-        for word in words_to_remove:
+        for word in summary['correct_words']:
             self.remove_word_from_revision(word)
         
-        # Calculate score
-        score = (correct_count / len(revision_words)) * 100
-        remaining = len(revision_words) - correct_count
+        remaining = len(revision_words) - summary['correct']
         
         print(f"\n{'='*60}")
         print(f"Revision Test Complete!")
-        print(f"Score: {correct_count}/{len(revision_words)} ({score:.1f}%)")
-        print(f"Words removed from revision: {correct_count}")
+        print(f"Score: {summary['correct']}/{len(revision_words)} ({summary['score']:.1f}%)")
+        print(f"Words removed from revision: {summary['correct']}")
         print(f"Words remaining in revision: {remaining}")
+        for line in engine.tracker.summary_lines():
+            print(line)
         print(f"{'='*60}\n")
     
     def show_config_menu(self):
@@ -441,11 +492,14 @@ class ChineseFlashcard:
             print(f"{'='*60}")
             print(f"1. HSK Level: {self.config['hsk_level']}")
             print(f"2. Words per patch: {self.config['words_per_patch']}")
-            print("3. Reset progress (reshuffle and start from beginning)")
-            print("4. Back to main menu")
+            style = QUESTION_STYLES.get(self.config.get('question_style'), QUESTION_STYLES['typed'])
+            print(f"3. Question style: {style}")
+            print("4. Reset progress (reshuffle and start from beginning)")
+            print(f"5. Switch profile (current: {self.profile.display_name})")
+            print("6. Back to main menu")
             print(f"{'='*60}")
             
-            choice = input("\nSelect option (1-4): ").strip()
+            choice = input("\nSelect option (1-6): ").strip()
             
             if choice == '1':
                 try:
@@ -475,22 +529,55 @@ class ChineseFlashcard:
                     print("Invalid input. Please enter a number.")
             
             elif choice == '3':
+                styles = list(QUESTION_STYLES)
+                for number, style in enumerate(styles, 1):
+                    print(f"  {number}. {QUESTION_STYLES[style]}")
+                try:
+                    picked = int(input(f"Choose a question style (1-{len(styles)}): "))
+                    if 1 <= picked <= len(styles):
+                        self.config['question_style'] = styles[picked - 1]
+                        self.save_config()
+                        print(f"Question style set to {QUESTION_STYLES[styles[picked - 1]]}")
+                    else:
+                        print(f"Please enter a number between 1 and {len(styles)}.")
+                except ValueError:
+                    print("Invalid input. Please enter a number.")
+            
+            elif choice == '4':
                 confirm = input("Are you sure you want to reset progress? (yes/no): ").strip().lower()
                 if confirm == 'yes':
-                    self.progress['shuffled_indices'] = list(range(len(self.words)))
-                    random.shuffle(self.progress['shuffled_indices'])
-                    self.progress['current_index'] = 0
-                    self.save_progress()
+                    self.reset_progress()
                     print("Progress has been reset!")
             
-            elif choice == '4':
+            elif choice == '5':
+                existing = list_profiles()
+                if existing:
+                    print(f"Existing profiles: {', '.join(existing)}")
+                name = input("Enter profile name (blank for default): ").strip()
+                try:
+                    self.switch_profile(name or None)
+                    print(f"Switched to profile: {self.profile.display_name}")
+                except ValueError as e:
+                    print(f"{e}. Use letters, digits, '.', '_' or '-'.")
+            
+            elif choice == '6':
                 break
             else:
-                print("Invalid choice. Please select 1-4.")
+                print("Invalid choice. Please select 1-6.")
+    
+    def show_stats(self):
+        """Show the statistics dashboard"""
+        print(f"\n{'='*60}")
+        print("Statistics")
+        print(f"{'='*60}")
+        for line in self.stats.report_lines():
+            print(line)
+        print(f"{'='*60}")
     
     def show_main_menu(self):
         """Show main menu"""
         while True:
+            self.refresh_state()
             current_patch = self.progress['current_index'] + 1
             total_patches = (len(self.words) + self.config['words_per_patch'] - 1) // self.config['words_per_patch']
             revision_count = len(self.load_revision_words())
@@ -498,6 +585,7 @@ class ChineseFlashcard:
             print(f"\n{'='*60}")
             print("Chinese Flashcard Learning System")
             print(f"{'='*60}")
+            print(f"Profile: {self.profile.display_name}")
             print(f"HSK Level: {self.config['hsk_level']} | Words per patch: {self.config['words_per_patch']}")
             print(f"Current patch: {current_patch}/{total_patches}")
             print(f"Total words: {len(self.words)} | Revision words: {revision_count}")
@@ -509,10 +597,14 @@ class ChineseFlashcard:
             print("5. Start with Revision - Practice revision words")
             print("6. Test Revision - Test and remove mastered words")
             print("7. Config - Configuration settings")
-            print("8. Exit")
+            print("8. Statistics - View your learning statistics")
+            print("9. Confusables - Drill words that sound alike")
+            print("10. Exit")
             print(f"{'='*60}")
+            if self.startup:
+                self.report_startup()
             
-            choice = input("\nSelect option (1-8): ").strip()
+            choice = input("\nSelect option (1-10): ").strip()
             
             if choice == '1':
                 words = self.get_current_patch()
@@ -556,7 +648,7 @@ class ChineseFlashcard:
             elif choice == '5':
                 revision_words = self.load_revision_words()
                 if revision_words:
-                    self.flashcard_session(revision_words)
+                    self.flashcard_session(revision_words, mode='revision')
                 else:
                     print("\nNo words in revision! Your revision list is empty.")
             
@@ -567,11 +659,27 @@ class ChineseFlashcard:
                 self.show_config_menu()
             
             elif choice == '8':
+                self.show_stats()
+            
+            elif choice == '9':
+                self.confusables_session()
+            
+            elif choice == '10':
+                self.flush_state()
                 print("\nGoodbye! Keep learning! 加油!")
                 break
             
             else:
-                print("Invalid choice. Please select 1-8.")
+                print("Invalid choice. Please select 1-10.")
+    
+    def report_startup(self):
+        """Print how long it took to reach the first prompt (once, on stderr)"""
+        imported, loaded = self.startup
+        ready = time.perf_counter()
+        print(f"Startup: imports {(imported - STARTED) * 1000:.1f}ms, "
+              f"state {(loaded - imported) * 1000:.1f}ms, "
+              f"first prompt after {(ready - STARTED) * 1000:.1f}ms", file=sys.stderr)
+        self.startup = None
     
     def run(self):
         """Run the flashcard application"""
@@ -579,8 +687,8 @@ class ChineseFlashcard:
         print("Welcome to Chinese Flashcard Learning System!")
         print("="*60)
         print("\nTips:")
-        print("- Use numbers 1, 2, 3, 4 for tones in pinyin")
-        print("  Example: ni3hao3 for 你好")
+        print("- Use numbers 1, 2, 3, 4 for tones in pinyin (5 or nothing for neutral),")
+        print("  or type tone marks. Example: ni3hao3 or nǐhǎo for 你好")
         print("- You can omit spaces in pinyin input")
         print("="*60)
         
@@ -588,8 +696,27 @@ class ChineseFlashcard:
 
 
 def main():
-    app = ChineseFlashcard()
-    app.run()
+    parser = argparse.ArgumentParser(description="Chinese Flashcard Learning System")
+    parser.add_argument('--profile', help="learner profile to use (stored in profiles/<name>/)")
+    parser.add_argument('--timing', action='store_true',
+                        help="report the time to the first prompt on stderr")
+    args = parser.parse_args()
+    
+    try:
+        profile = Profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    imported = time.perf_counter()
+    app = ChineseFlashcard(profile)
+    if args.timing:
+        app.startup = (imported, time.perf_counter())
+    try:
+        app.run()
+    except KeyboardInterrupt:
+        print("\n\nGoodbye! Keep learning! 加油!")
+    finally:
+        app.close()
 
 
 if __name__ == "__main__":
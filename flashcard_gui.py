@@ -4,93 +4,215 @@ Chinese Flashcard Learning System - GUI Version
 Learn Chinese vocabulary using HSK levels with a beautiful tkinter interface
 """
 
+import time
+
+# Taken before the other imports so --timing can include them
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, font
-import csv
-import random
+import argparse
 import json
 import os
+import sys
 from pathlib import Path
 
+from learning_stats import LearningStats
+from permutation import new_progress, position_lookup, progress_order
+from persistence import ChangeTracker, DebouncedWriter, file_lock
+from profiles import Profile, list_profiles
+from review_journal import ReviewJournal
+from revision_set import DEFAULT_CAPACITY, DEFAULT_POLICY, POLICIES, RevisionStore
+from session_engine import CLOZE, MEANING_TYPES, MULTIPLE_CHOICE, QUESTION_STYLES, QUESTION_TYPES, SessionEngine
+from vocabulary import hsk_file, load_vocabulary
+from word_ids import record_ids, sync_progress
+
 
 class ChineseFlashcardGUI:
-    def __init__(self):
+    def __init__(self, profile=None):
         self.root = tk.Tk()
         self.root.title("Chinese Flashcard Learning System")
         self.root.geometry("800x600")
         self.root.configure(bg="#F5F5F5")
         
-        # Paths
         self.resource_dir = Path(__file__).parent / "resource"
-        self.config_file = Path(__file__).parent / "config.json"
-        self.progress_file = Path(__file__).parent / "progress.json"
-        self.revision_file = Path(__file__).parent / "revision.txt"
+        # Config/progress saves are coalesced and written off the main thread;
+        # the tracker tells our own writes apart from another instance's
+        self.tracker = ChangeTracker()
+        self.writer = DebouncedWriter(tracker=self.tracker)
+        # (imported, window created) perf_counter times when --timing asked for a report
+        self.startup = None
+        self.loaded = False
+        self.profile = profile or Profile()
+        
+        # Show the window straight away; the profile is loaded and the main
+        # menu built by the event loop's first callback
+        tk.Label(self.root, text="Loading...", font=("Arial", 14),
+                 fg="#666666", bg="#F5F5F5").pack(expand=True)
+        self.root.after_idle(self.start)
+    
+    def start(self):
+        """Load the profile and build the main menu"""
+        self.use_profile(self.profile)
+        self.loaded = True
+        self.create_main_menu()
+        if self.startup:
+            self.root.update_idletasks()
+            self.report_startup()
+    
+    def report_startup(self):
+        """Print how long it took to show the main menu (once, on stderr)"""
+        imported, created = self.startup
+        ready = time.perf_counter()
+        print(f"Startup: imports {(imported - STARTED) * 1000:.1f}ms, "
+              f"window {(created - imported) * 1000:.1f}ms, "
+              f"first prompt after {(ready - STARTED) * 1000:.1f}ms", file=sys.stderr)
+        self.startup = None
+    
+    def use_profile(self, profile):
+        """Point the app at a profile's state files and load them"""
+        # Paths
+        self.profile = profile
+        self.profile.ensure_directory()
+        self.config_file = profile.config_file
+        self.progress_file = profile.progress_file
+        self.revision_file = profile.revision_file
+        self.journal_file = profile.journal_file
+        self.stats_file = profile.stats_file
         
         # Configuration
-        self.config = {"hsk_level": 1, "words_per_patch": 10}
-        self.progress = {"current_index": 0, "shuffled_indices": []}
+        self.config = {"hsk_level": 1, "words_per_patch": 10, "question_style": "typed",
+                       "revision_capacity": DEFAULT_CAPACITY, "revision_policy": DEFAULT_POLICY}
+        self.progress = {"current_index": 0, "seed": None, "word_count": 0}
         self.words = []
+        self.order = []
+        self.position = position_lookup(self.order)
+        self.journal = ReviewJournal(self.journal_file)
+        self.stats = LearningStats(self.stats_file)
         
         # Load data
         self.load_config()
+        self.revision = self.open_revision()
         self.load_progress()
         self.load_words()
-        
-        # Create main menu
+    
+    def switch_profile(self, name):
+        """Save the current learner's state and switch to another profile"""
+        profile = Profile(name)
+        self.flush_state()
+        self.use_profile(profile)
         self.create_main_menu()
-        
+    
     def load_config(self):
         """Load configuration from file"""
-        if self.config_file.exists():
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                self.config.update(json.load(f))
+        with file_lock(self.config_file, shared=True):
+            if self.config_file.exists():
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    self.config.update(json.load(f))
+            self.tracker.mark(self.config_file)
     
     def save_config(self):
         """Save configuration to file"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=2)
+        self.writer.schedule(self.config_file, json.dumps(self.config, indent=2))
     
     def load_progress(self):
         """Load progress from file"""
-        if self.progress_file.exists():
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                self.progress.update(json.load(f))
+        with file_lock(self.progress_file, shared=True):
+            if self.progress_file.exists():
+                with open(self.progress_file, 'r', encoding='utf-8') as f:
+                    self.progress.update(json.load(f))
+            self.tracker.mark(self.progress_file)
     
     def save_progress(self):
         """Save progress to file"""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress, f, indent=2)
+        self.writer.schedule(self.progress_file, json.dumps(self.progress, indent=2))
     
     def load_words(self):
         """Load words from HSK CSV file"""
-        hsk_file = self.resource_dir / f"hsk{self.config['hsk_level']}.csv"
-        
-        if not hsk_file.exists():
-            messagebox.showerror("Error", f"File {hsk_file} not found!")
+        try:
+            # Parsed once per process and shared by every profile
+            self.words = load_vocabulary(self.config['hsk_level'], self.resource_dir)
+        except FileNotFoundError:
+            messagebox.showerror("Error", f"File {hsk_file(self.config['hsk_level'], self.resource_dir)} not found!")
             return
         
-        self.words = []
-        with open(hsk_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                self.words.append({
-                    'chinese': row.get('Chinese', ''),
-                    'pinyin': row.get('Pinyin', ''),
-                    'meaning': row.get('Meaning_English', ''),
-                    'han_viet': row.get('Han_Viet', ''),
-                    'nghia_tieng_viet': row.get('Nghia_Tieng_Viet', ''),
-                    'cach_dung': row.get('Cach_dung_trong_cau', '')
-                })
-        
-        # Initialize shuffled indices
-        if not self.progress['shuffled_indices'] or len(self.progress['shuffled_indices']) != len(self.words):
-            self.progress['shuffled_indices'] = list(range(len(self.words)))
-            random.shuffle(self.progress['shuffled_indices'])
-            self.progress['current_index'] = 0
+        self.sync_order()
+    
+    def refresh_state(self):
+        """Pick up config and progress saved by another instance of this profile
+
+        Skipped while we have unsaved changes of our own, which win.
+        """
+        if self.writer.has_pending():
+            return
+        level = self.config['hsk_level']
+        if self.tracker.changed(self.config_file):
+            self.load_config()
+        progress_changed = self.tracker.changed(self.progress_file)
+        if progress_changed:
+            self.load_progress()
+        if self.config['hsk_level'] != level:
+            self.load_words()
+        elif progress_changed:
+            self.sync_order()
+    
+    def sync_order(self):
+        """Rebuild the patch order from progress, remapping it if the CSV changed
+
+        Only progress that cannot be carried over is reshuffled.
+        """
+        self.order, changed = sync_progress(self.progress, self.config['hsk_level'],
+                                            self.words.word_ids, self.profile.word_ids_file)
+        if self.order is None:
+            self.reset_progress()
+            return
+        self.position = position_lookup(self.order)
+        if changed:
             self.save_progress()
     
+    def reset_progress(self):
+        """Pick a new seed and start again from the first patch"""
+        self.progress = new_progress(len(self.words))
+        record_ids(self.progress, self.config['hsk_level'], self.words.word_ids,
+                   self.profile.word_ids_file)
+        self.order = progress_order(self.progress, len(self.words))
+        self.position = position_lookup(self.order)
+        self.save_progress()
+    
+    def word_position(self, word):
+        """Position of a word in the shuffled order (None if not in this level)"""
+        index = self.words.find(word['chinese']) if self.words else None
+        return None if index is None else self.position(index)
+    
+    def record_answer(self, word, mode, correct, latency=None):
+        """Log an answer to the review journal and statistics"""
+        self.journal.record(word, mode, correct, latency)
+        self.revision.record(word, correct, latency)
+        
+        position = self.word_position(word)
+        if position is None:
+            self.stats.record(word, mode, correct)
+        else:
+            patch = position // self.config['words_per_patch']
+            self.stats.record(word, mode, correct, self.config['hsk_level'], patch)
+    
+    def flush_state(self):
+        """Persist buffered journal events, statistics and pending saves"""
+        if not self.loaded:
+            return
+        self.journal.flush()
+        self.stats.save()
+        self.writer.flush()
+    
+    def close(self):
+        """Flush everything and stop the background writer"""
+        self.flush_state()
+        self.writer.close()
+    
     def create_main_menu(self):
         """Create the main menu interface"""
+        self.refresh_state()
+        
         # Clear window
         for widget in self.root.winfo_children():
             widget.destroy()
@@ -115,7 +237,8 @@ class ChineseFlashcardGUI:
         total_patches = (len(self.words) + self.config['words_per_patch'] - 1) // self.config['words_per_patch']
         revision_count = len(self.load_revision_words())
         
-        info_text = f"HSK Level: {self.config['hsk_level']} | Words per patch: {self.config['words_per_patch']}\n"
+        info_text = f"Profile: {self.profile.display_name}\n"
+        info_text += f"HSK Level: {self.config['hsk_level']} | Words per patch: {self.config['words_per_patch']}\n"
         info_text += f"Current Patch: {current_patch}/{total_patches}\n"
         info_text += f"Total Words: {len(self.words)} | Revision: {revision_count}"
         
@@ -175,6 +298,11 @@ class ChineseFlashcardGUI:
                                       height=2, command=self.start_test_revision)
         btn_test_revision.pack(fill=tk.X, pady=5)
         
+        btn_confusables = tk.Button(button_frame, text="🎯 Confusables Drill", 
+                                    font=("Arial", 14), bg="#795548", fg="white", 
+                                    height=2, command=self.start_confusables)
+        btn_confusables.pack(fill=tk.X, pady=5)
+        
         # Settings section
         settings_label = tk.Label(button_frame, text="Settings", 
                                  font=("Arial", 14, "bold"), fg="#666666", bg="#F5F5F5")
@@ -185,24 +313,52 @@ class ChineseFlashcardGUI:
                               height=2, command=self.open_config)
         btn_config.pack(fill=tk.X, pady=5)
         
+        btn_stats = tk.Button(button_frame, text="📊 Statistics", 
+                             font=("Arial", 14), bg="#3F51B5", fg="white", 
+                             height=2, command=self.open_stats)
+        btn_stats.pack(fill=tk.X, pady=5)
+        
+        btn_profile = tk.Button(button_frame, text=f"👤 Profile: {self.profile.display_name}", 
+                               font=("Arial", 14), bg="#009688", fg="white", 
+                               height=2, command=self.open_profiles)
+        btn_profile.pack(fill=tk.X, pady=5)
+        
         btn_exit = tk.Button(button_frame, text="🚪 Exit", 
                             font=("Arial", 14), bg="#757575", fg="white", 
-                            height=2, command=self.root.quit)
+                            height=2, command=self.quit)
         btn_exit.pack(fill=tk.X, pady=5)
     
+    def question_setup(self, question_types=None):
+        """Question types (and their distractors or graders) for a session, per the config"""
+        # The per-level indexes are imported on first use, off the startup path
+        style = self.config.get('question_style')
+        if style == 'choice':
+            from distractors import load_distractors
+            index = load_distractors(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [MULTIPLE_CHOICE], 'distractors': index.choose}
+        if style in ('english', 'vietnamese'):
+            from gloss_index import load_gloss_index
+            index = load_gloss_index(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [f'chinese_to_{style}'], 'graders': index.graders()}
+        if style == 'cloze':
+            from sentence_index import load_sentences
+            index = load_sentences(self.config['hsk_level'], self.resource_dir)
+            return {'question_types': [CLOZE], 'cloze': index.cloze}
+        return {'question_types': question_types} if question_types else {}
+    
     def get_current_patch(self):
         """Get current patch of words"""
         words_per_patch = self.config['words_per_patch']
         current_idx = self.progress['current_index']
-        shuffled_indices = self.progress['shuffled_indices']
+        order = self.order
         
         start = current_idx * words_per_patch
-        end = min(start + words_per_patch, len(shuffled_indices))
+        end = min(start + words_per_patch, len(order))
         
-        if start >= len(shuffled_indices):
+        if start >= len(order):
             return []
         
-        return [self.words[i] for i in shuffled_indices[start:end]]
+        return [self.words[i] for i in order[start:end]]
     
     def move_next(self):
         """Move to next patch"""
@@ -245,6 +401,22 @@ class ChineseFlashcardGUI:
         
         FlashcardWindow(self.root, words, self, is_test=False, is_revision=True)
     
+    def start_confusables(self):
+        """Drill this level's words that have near-homophones, picking among them"""
+        from confusables import load_table
+        from distractors import load_distractors
+        
+        table = load_table(self.resource_dir)
+        words = table.drill_words(self.words)
+        if not words:
+            messagebox.showinfo("Info", "No confusable words at this HSK level.")
+            return
+        
+        index = load_distractors(self.config['hsk_level'], self.resource_dir)
+        FlashcardWindow(self.root, words, self, mode='confusables',
+                        setup={'question_types': [MULTIPLE_CHOICE],
+                               'distractors': table.distractors(index.choose)})
+    
     def start_test(self):
         """Start test for previous patches"""
         if self.progress['current_index'] == 0:
@@ -266,73 +438,85 @@ class ChineseFlashcardGUI:
         """Open configuration window"""
         ConfigWindow(self.root, self)
     
+    def open_stats(self):
+        """Open statistics window"""
+        StatsWindow(self.root, self)
+    
+    def open_profiles(self):
+        """Open profile picker"""
+        ProfileWindow(self.root, self)
+    
+    def open_revision(self):
+        """Revision list bounded by the configured capacity and eviction policy"""
+        policy = self.config.get('revision_policy')
+        return RevisionStore(self.revision_file, self.profile.revision_archive_file,
+                             self.config.get('revision_capacity', DEFAULT_CAPACITY),
+                             policy if policy in POLICIES else DEFAULT_POLICY,
+                             stats=self.journal.word_stats)
+    
     def load_revision_words(self):
         """Load words from revision.txt"""
-        if not self.revision_file.exists():
-            return []
-        
-        revision_words = []
-        with open(self.revision_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) >= 3:
-                    revision_words.append({
-                        'chinese': parts[0],
-                        'pinyin': parts[1],
-                        'meaning': parts[2],
-                        'han_viet': parts[3] if len(parts) > 3 else '',
-                        'nghia_tieng_viet': parts[4] if len(parts) > 4 else '',
-                        'cach_dung': parts[5] if len(parts) > 5 else ''
-                    })
-        
-        return revision_words
+        return self.revision.words()
     
     def save_word_to_revision(self, word):
-        """Save a word to revision.txt"""
-        existing_words = set()
-        if self.revision_file.exists():
-            with open(self.revision_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split('|')
-                    if len(parts) >= 2:
-                        existing_words.add(parts[0])
-        
-        if word['chinese'] not in existing_words:
-            with open(self.revision_file, 'a', encoding='utf-8') as f:
-                f.write(f"{word['chinese']}|{word['pinyin']}|{word['meaning']}|"
-                       f"{word.get('han_viet', '')}|{word.get('nghia_tieng_viet', '')}|"
-                       f"{word.get('cach_dung', '')}\n")
+        """Save a word to revision.txt, archiving the words it pushes out"""
+        return self.revision.add(word)
     
     def remove_word_from_revision(self, word):
         """Remove a word from revision.txt"""
-        if not self.revision_file.exists():
-            return
-        
-        remaining_words = []
-        with open(self.revision_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) >= 1 and parts[0] != word['chinese']:
-                    remaining_words.append(line)
-        
-        with open(self.revision_file, 'w', encoding='utf-8') as f:
-            f.writelines(remaining_words)
+        self.revision.remove(word)
+    
+    def quit(self):
+        """Flush pending state and close the application"""
+        self.flush_state()
+        self.root.quit()
     
     def run(self):
         """Run the application"""
-        self.root.mainloop()
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
+        try:
+            self.root.mainloop()
+        finally:
+            # Also reached on Ctrl+C in the launching terminal
+            self.close()
 
 
 class FlashcardWindow:
-    def __init__(self, parent, words, app, is_test=False, is_revision=False):
+    # Cards rendered ahead of the one on screen
+    PREFETCH = 5
+    CORRECT_STYLE = {'text': "✓ Correct!", 'fg': "#4CAF50", 'bg': "#E8F5E9"}
+    WRONG_STYLE = {'text': "✗ Incorrect", 'fg': "#F44336", 'bg': "#FFEBEE"}
+    
+    def __init__(self, parent, words, app, is_test=False, is_revision=False, mode=None, setup=None):
         self.app = app
-        self.words = words.copy()
-        random.shuffle(self.words)
+        self.words = words
         self.is_test = is_test
         self.is_revision = is_revision
-        self.current_index = 0
-        self.correct_count = 0
-        self.wrong_words = []
+        if mode is None and is_test:
+            mode = 'revision_test' if is_revision else 'test'
+        elif mode is None:
+            mode = 'revision' if is_revision else 'learn'
+        if setup is None:
+            setup = app.question_setup(['chinese_to_pinyin'] if is_test else QUESTION_TYPES)
+        
+        # Tests walk the shuffled words once; learning is endless and adaptive
+        self.engine = SessionEngine(words, self.check_pinyin, mode=mode, endless=not is_test,
+                                    stats=app.journal.all_stats(), on_answer=app.record_answer,
+                                    **setup)
+        self.multiple_choice = MULTIPLE_CHOICE in self.engine.question_types
+        self.meaning_answers = any(t in MEANING_TYPES for t in self.engine.question_types)
+        self.cloze_questions = CLOZE in self.engine.question_types
+        self.payloads = {}
+        self.answered = False
+        self.match_state = None
+        self.typed = ''
+        self.shown_statuses = None
+        # Live per-syllable feedback under the answer box; the matcher is
+        # imported with the first session, not at startup
+        import pinyin_matcher
+        self.syllable_marks = {pinyin_matcher.PENDING: "·", pinyin_matcher.TYPING: "…",
+                               pinyin_matcher.OK: "✓", pinyin_matcher.TONE: "♪", pinyin_matcher.WRONG: "✗"}
+        self.syllable_colors = {pinyin_matcher.WRONG: "#F44336", pinyin_matcher.TONE: "#FF9800"}
         
         # Create window
         self.window = tk.Toplevel(parent)
@@ -354,43 +538,84 @@ class FlashcardWindow:
                                        bg="white", fg="#2196F3", pady=10)
         self.progress_label.pack()
         
-        # Question area
+        # Question area: the question and answer panels are stacked in one
+        # grid cell, so revealing the answer is a single tkraise()
         question_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
         question_frame.pack(pady=10, padx=20, fill=tk.BOTH, expand=True)
         
-        self.question_type_label = tk.Label(question_frame, text="", 
+        card_stack = tk.Frame(question_frame, bg="white")
+        card_stack.pack(fill=tk.BOTH, expand=True)
+        card_stack.grid_rowconfigure(0, weight=1)
+        card_stack.grid_columnconfigure(0, weight=1)
+        
+        self.question_panel = tk.Frame(card_stack, bg="white")
+        self.question_panel.grid(row=0, column=0, sticky="nsew")
+        self.answer_panel = tk.Frame(card_stack, bg="white")
+        self.answer_panel.grid(row=0, column=0, sticky="nsew")
+        
+        self.question_type_label = tk.Label(self.question_panel, text="", 
                                             font=("Arial", 14), 
-                                            bg="white", fg="#666666", pady=10)
+                                            bg="white", fg="#666666", pady=10, wraplength=600)
         self.question_type_label.pack()
         
-        self.question_label = tk.Label(question_frame, text="", 
+        self.question_label = tk.Label(self.question_panel, text="", 
                                        font=("Arial", 36, "bold"), 
                                        bg="white", fg="#00BCD4", pady=20, wraplength=600,
                                        justify=tk.LEFT)
         self.question_label.pack()
         
-        # Additional labels for colored answer display
-        self.chinese_label = tk.Label(question_frame, text="", 
+        # Options of multiple-choice questions; clicking one answers with its number
+        self.choice_buttons = []
+        if self.multiple_choice:
+            choice_frame = tk.Frame(self.question_panel, bg="white")
+            choice_frame.pack(pady=5)
+            for number in range(1, self.engine.choices + 1):
+                btn = tk.Button(choice_frame, text="", font=("Arial", 16), width=22,
+                                bg="#E3F2FD", command=lambda n=number: self.choose(n))
+                btn.pack(pady=3)
+                self.choice_buttons.append(btn)
+        
+        # Colored answer display, filled in while the question is shown
+        tk.Label(self.answer_panel, text="Answer:", 
+                font=("Arial", 14), bg="white", fg="#666666", pady=10).pack()
+        
+        self.chinese_label = tk.Label(self.answer_panel, text="", 
                                      font=("Arial", 36, "bold"), 
                                      bg="white", fg="#FF5722", pady=5)
+        self.chinese_label.pack()
         
-        self.pinyin_label = tk.Label(question_frame, text="", 
+        self.pinyin_label = tk.Label(self.answer_panel, text="", 
                                     font=("Arial", 24, "bold"), 
                                     bg="white", fg="#2196F3", pady=5)
+        self.pinyin_label.pack()
         
-        self.meaning_label = tk.Label(question_frame, text="", 
+        self.meaning_label = tk.Label(self.answer_panel, text="", 
                                      font=("Arial", 20), 
                                      bg="white", fg="#4CAF50", pady=5)
+        self.meaning_label.pack()
         
-        self.hanviet_label = tk.Label(question_frame, text="", 
+        self.hanviet_label = tk.Label(self.answer_panel, text="", 
                                      font=("Arial", 18), 
                                      bg="white", fg="#9C27B0", pady=5)
         
-        self.vietnamese_label = tk.Label(question_frame, text="", 
+        self.vietnamese_label = tk.Label(self.answer_panel, text="", 
                                         font=("Arial", 18), 
                                         bg="white", fg="#FF9800", pady=5)
+        self.optional_shown = {self.hanviet_label: False, self.vietnamese_label: False}
         
-        hint_label = tk.Label(question_frame, text="Type the pinyin (use 1234 for tones)", 
+        self.feedback_label = tk.Label(self.answer_panel, text="", 
+                                       font=("Arial", 14, "bold"), pady=10)
+        self.feedback_label.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        if self.multiple_choice:
+            hint = "Click the right pinyin or type its number"
+        elif self.meaning_answers:
+            hint = "Type the meaning (accents are optional, small typos are forgiven)"
+        elif self.cloze_questions:
+            hint = "Type the pinyin of the missing word (tone numbers or tone marks)"
+        else:
+            hint = "Type the pinyin (tone numbers or tone marks; ♪ = check the tone)"
+        hint_label = tk.Label(question_frame, text=hint, 
                              font=("Arial", 10), bg="white", fg="#999999")
         hint_label.pack()
         
@@ -398,178 +623,244 @@ class FlashcardWindow:
         answer_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
         answer_frame.pack(pady=10, padx=20, fill=tk.X)
         
-        self.answer_entry = tk.Entry(answer_frame, font=("Arial", 16), 
+        self.answer_var = tk.StringVar()
+        self.answer_entry = tk.Entry(answer_frame, font=("Arial", 16), textvariable=self.answer_var,
                                      justify=tk.CENTER, bd=2, relief=tk.GROOVE)
-        self.answer_entry.pack(pady=15, padx=20, fill=tk.X)
-        self.answer_entry.bind('<Return>', lambda e: self.check_answer())
+        self.answer_entry.pack(pady=(15, 0), padx=20, fill=tk.X)
         self.answer_entry.focus()
         
-        # Feedback area
-        self.feedback_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
-        self.feedback_label = tk.Label(self.feedback_frame, text="", 
-                                       font=("Arial", 14, "bold"), pady=10)
-        self.feedback_label.pack()
+        self.match_label = tk.Label(answer_frame, text="", font=("Arial", 14), 
+                                    bg="white", fg="#999999", pady=5)
+        self.match_label.pack()
+        
+        # Every edit (typing, backspace, paste) updates the syllable feedback
+        self.answer_var.trace_add('write', lambda *args: self.on_typed())
         
-        # Buttons
+        # Enter submits, then moves on; the entry's key events reach this binding too
+        self.window.bind('<Return>', lambda e: self.on_return())
+        
+        # Buttons, stacked like the panels
         button_frame = tk.Frame(self.window, bg="#F5F5F5")
         button_frame.pack(pady=10, padx=20, fill=tk.X)
-        
-        self.submit_btn = tk.Button(button_frame, text="Submit", 
-                                    font=("Arial", 12), bg="#4CAF50", fg="white", 
-                                    height=2, command=self.check_answer)
-        self.submit_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+        button_frame.grid_columnconfigure(0, weight=1)
         
         self.next_btn = tk.Button(button_frame, text="Next", 
                                   font=("Arial", 12), bg="#2196F3", fg="white", 
                                   height=2, command=self.next_word)
+        self.next_btn.grid(row=0, column=0, sticky="ew")
         
         self.finish_btn = tk.Button(button_frame, text="Finish", 
                                     font=("Arial", 12), bg="#9C27B0", fg="white", 
                                     height=2, command=self.finish_session)
+        self.finish_btn.grid(row=0, column=0, sticky="ew")
+        
+        self.submit_btn = tk.Button(button_frame, text="Submit", 
+                                    font=("Arial", 12), bg="#4CAF50", fg="white", 
+                                    height=2, command=self.check_answer)
+        self.submit_btn.grid(row=0, column=0, sticky="ew")
+    
+    def render_card(self, word):
+        """Precompute everything the answer panel shows for a word"""
+        import pinyin_matcher
+        from pinyin_syllables import word_syllables
+        return {
+            'chinese': word['chinese'],
+            'pinyin': self.convert_tone_marks(word['pinyin']),
+            'meaning': word['meaning'],
+            'han_viet': f"Hán Việt: {word['han_viet']}" if word.get('han_viet') else '',
+            'nghia_tieng_viet': word.get('nghia_tieng_viet', ''),
+            'matcher': pinyin_matcher.compile_matcher(word['pinyin'], word_syllables(word))
+        }
+    
+    def card_payload(self, word):
+        """Return the rendered card for a word, rendering it on a cache miss"""
+        payload = self.payloads.get(word['chinese'])
+        if payload is None:
+            payload = self.payloads[word['chinese']] = self.render_card(word)
+        return payload
+    
+    def prefetch(self):
+        """Render the next cards while the learner is typing"""
+        for word in self.engine.upcoming(self.PREFETCH):
+            self.card_payload(word)
+    
+    def set_optional(self, label, text):
+        """Fill an optional answer line, repacking only when it appears or disappears"""
+        label.config(text=text)
+        if bool(text) != self.optional_shown[label]:
+            if text:
+                label.pack(before=self.feedback_label)
+            else:
+                label.pack_forget()
+            self.optional_shown[label] = bool(text)
     
     def show_word(self):
         """Show current word"""
-        if self.current_index >= len(self.words):
-            if not self.is_test:
-                # Endless mode - reshuffle
-                random.shuffle(self.words)
-                self.current_index = 0
-                messagebox.showinfo("Round Complete", "Starting new round...")
-            else:
-                self.finish_session()
-                return
+        prompt = self.engine.next_prompt()
+        if prompt is None:
+            self.finish_session()
+            return
         
-        word = self.words[self.current_index]
+        word = prompt['word']
         self.current_word = word
+        self.answered = False
         
         # Update progress
-        self.progress_label.config(text=f"{'Question' if self.is_test else 'Word'} {self.current_index + 1}/{len(self.words)}")
+        if self.is_test:
+            progress_text = f"Question {prompt['number']}/{prompt['total']}"
+        else:
+            progress_text = f"Word {prompt['number']} ({len(self.words)} in deck)"
+        self.progress_label.config(text=progress_text)
         
         # Show question
-        if self.is_test or random.random() < 0.5:
-            self.show_chinese = True
-            self.question_type_label.config(text="Chinese:")
-            self.question_label.config(text=word['chinese'])
-        else:
-            self.show_chinese = False
+        if prompt['question_type'] == 'meaning_to_pinyin':
             self.question_type_label.config(text="Meaning:")
-            self.question_label.config(text=word['meaning'])
+        elif prompt['question_type'] == CLOZE:
+            self.question_type_label.config(text=f"Fill the gap: {prompt['hint']}")
+        else:
+            self.question_type_label.config(text="Chinese:")
+        self.question_label.config(text=prompt['question'])
+        for btn, option in zip(self.choice_buttons, prompt.get('options', ())):
+            btn.config(text=option['pinyin'])
+        
+        # Fill the hidden answer panel now, so check_answer only has to raise it
+        payload = self.card_payload(word)
+        self.chinese_label.config(text=payload['chinese'])
+        self.pinyin_label.config(text=payload['pinyin'])
+        self.meaning_label.config(text=payload['meaning'])
+        self.set_optional(self.hanviet_label, payload['han_viet'])
+        self.set_optional(self.vietnamese_label, payload['nghia_tieng_viet'])
+        self.question_panel.tkraise()
         
         # Reset UI
         self.answer_entry.config(state=tk.NORMAL)
         self.answer_entry.delete(0, tk.END)
-        self.answer_entry.insert(0, "")
-        self.feedback_frame.pack_forget()
-        self.submit_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-        self.next_btn.pack_forget()
-        self.finish_btn.pack_forget()
+        self.typed = ''
+        if self.multiple_choice or prompt['question_type'] in MEANING_TYPES:
+            self.match_state = None
+        else:
+            self.match_state = payload['matcher'].start()
+            self.show_statuses()
+        self.submit_btn.tkraise()
+        self.after_answer_btn = self.finish_btn if self.engine.is_last() else self.next_btn
         self.answer_entry.focus()
         
-        # Hide colored answer labels and show question label
-        self.chinese_label.pack_forget()
-        self.pinyin_label.pack_forget()
-        self.meaning_label.pack_forget()
-        self.hanviet_label.pack_forget()
-        self.vietnamese_label.pack_forget()
-        self.question_label.pack()
-        
-        # Rebind Enter key to submit answer
-        self.window.unbind('<Return>')
-        self.answer_entry.bind('<Return>', lambda e: self.check_answer())
+        # Start timing once the new card is on screen, then render ahead
+        self.window.after_idle(self.engine.mark_shown)
+        self.window.after_idle(self.prefetch)
+    
+    def on_typed(self):
+        """Follow the entry's text through the answer's matcher
+        
+        Appending or deleting at the end costs O(1) per character; other
+        edits rewind the state to the common prefix and replay from there.
+        """
+        state = self.match_state
+        if state is None:
+            return
+        text = self.answer_var.get()
+        typed = self.typed
+        if text.startswith(typed):
+            common = len(typed)
+        elif typed.startswith(text):
+            common = len(text)
+        else:
+            common = 0
+            for a, b in zip(text, typed):
+                if a != b:
+                    break
+                common += 1
+        while len(state) > common:
+            state.pop()
+        for ch in text[common:]:
+            state.push(ch)
+        self.typed = text
+        self.show_statuses()
+    
+    def show_statuses(self):
+        """Redraw the syllable feedback line if it changed"""
+        # The raw status keeps a finished-but-untoned syllable as "typing",
+        # so the tone is not flagged before the learner has had a chance to type it
+        statuses = tuple(self.match_state.status)
+        if statuses == self.shown_statuses:
+            return
+        self.shown_statuses = statuses
+        color = "#4CAF50" if self.match_state.correct() else "#999999"
+        for status, status_color in self.syllable_colors.items():
+            if status in statuses:
+                color = status_color
+                break
+        self.match_label.config(text=" ".join(self.syllable_marks[s] for s in statuses), fg=color)
+    
+    def choose(self, number):
+        """Answer a multiple-choice question with an option's number"""
+        if self.answered:
+            return
+        self.answer_var.set(str(number))
+        self.check_answer()
+    
+    def on_return(self):
+        """Enter key: submit the answer, or move on once it is graded"""
+        if not self.answered:
+            self.check_answer()
+        elif self.after_answer_btn is self.finish_btn:
+            self.finish_session()
+        else:
+            self.next_word()
     
     def check_answer(self):
         """Check user's answer"""
+        if self.answered:
+            return
         user_answer = self.answer_entry.get().strip()
         if not user_answer:
             messagebox.showwarning("Warning", "Please enter an answer")
             return
         
-        word = self.current_word
-        correct = self.check_pinyin(user_answer, word['pinyin'])
+        correct = self.engine.answer(user_answer)['correct']
+        self.answered = True
         
-        # Update UI
+        # Everything was rendered in show_word: restyle the feedback and
+        # raise the prepared panel and button in one layout pass
         self.answer_entry.config(state=tk.DISABLED)
-        self.submit_btn.pack_forget()
-        self.feedback_frame.pack(pady=10, padx=20, fill=tk.X)
-        
-        # Hide single question label and show colored multi-line answer
-        self.question_label.pack_forget()
-        self.question_type_label.config(text="Answer:")
-        
-        # Show answer with different colors for each line
-        self.chinese_label.config(text=word['chinese'])
-        self.chinese_label.pack()
-        
-        self.pinyin_label.config(text=self.convert_tone_marks(word['pinyin']))
-        self.pinyin_label.pack()
-        
-        self.meaning_label.config(text=word['meaning'])
-        self.meaning_label.pack()
-        
-        if word.get('han_viet'):
-            self.hanviet_label.config(text=f"Hán Việt: {word['han_viet']}")
-            self.hanviet_label.pack()
-        else:
-            self.hanviet_label.pack_forget()
-        
-        if word.get('nghia_tieng_viet'):
-            self.vietnamese_label.config(text=word['nghia_tieng_viet'])
-            self.vietnamese_label.pack()
-        else:
-            self.vietnamese_label.pack_forget()
-        
-        # Show feedback
-        if correct:
-            self.feedback_label.config(text="✓ Correct!", fg="#4CAF50", bg="#E8F5E9")
-            self.feedback_frame.config(bg="#E8F5E9")
-            self.correct_count += 1
-        else:
-            self.feedback_label.config(text="✗ Incorrect", fg="#F44336", bg="#FFEBEE")
-            self.feedback_frame.config(bg="#FFEBEE")
-            
-            if self.is_test:
-                self.wrong_words.append(word)
-        
-        # Show next/finish button
-        if self.current_index < len(self.words) - 1 or not self.is_test:
-            self.next_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
-            # Bind Enter key to next word
-            self.answer_entry.unbind('<Return>')
-            self.window.bind('<Return>', lambda e: self.next_word())
-        else:
-            self.finish_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
-            # Bind Enter key to finish
-            self.answer_entry.unbind('<Return>')
-            self.window.bind('<Return>', lambda e: self.finish_session())
+        self.feedback_label.config(**(self.CORRECT_STYLE if correct else self.WRONG_STYLE))
+        self.answer_panel.tkraise()
+        self.after_answer_btn.tkraise()
     
     def next_word(self):
         """Move to next word"""
-        self.current_index += 1
         self.show_word()
     
     def finish_session(self):
         """Finish the session"""
+        self.app.flush_state()
+        
         if self.is_test:
+            summary = self.engine.summary()
+            
             # Save wrong words to revision
             if not self.is_revision:
-                for word in self.wrong_words:
+                for word in summary['wrong_words']:
                     self.app.save_word_to_revision(word)
             else:
                 # Remove correct words from revision
-                for word in self.words:
-                    if word not in self.wrong_words:
-                        self.app.remove_word_from_revision(word)
+                for word in summary['correct_words']:
+                    self.app.remove_word_from_revision(word)
             
             # Show results
-            score = (self.correct_count / len(self.words)) * 100 if self.words else 0
-            result_msg = f"Score: {self.correct_count}/{len(self.words)} ({score:.1f}%)\n\n"
+            score = (summary['correct'] / len(self.words)) * 100 if self.words else 0
+            result_msg = f"Score: {summary['correct']}/{len(self.words)} ({score:.1f}%)\n\n"
             
             if self.is_revision:
-                remaining = len(self.words) - self.correct_count
-                result_msg += f"Words removed from revision: {self.correct_count}\n"
+                remaining = len(self.words) - summary['correct']
+                result_msg += f"Words removed from revision: {summary['correct']}\n"
                 result_msg += f"Words remaining in revision: {remaining}"
             else:
-                result_msg += f"Wrong words saved to revision: {len(self.wrong_words)}"
+                result_msg += f"Wrong words saved to revision: {len(summary['wrong_words'])}"
+            
+            latency_lines = self.engine.tracker.summary_lines(slowest=3)
+            if latency_lines:
+                result_msg += "\n\n" + "\n".join(latency_lines)
             
             messagebox.showinfo("Test Complete!", result_msg)
         
@@ -579,42 +870,14 @@ class FlashcardWindow:
     @staticmethod
     def check_pinyin(user_input, correct_pinyin):
         """Check if pinyin is correct"""
-        tone_map = {
-            'ā': 'a1', 'á': 'a2', 'ǎ': 'a3', 'à': 'a4',
-            'ē': 'e1', 'é': 'e2', 'ě': 'e3', 'è': 'e4',
-            'ī': 'i1', 'í': 'i2', 'ǐ': 'i3', 'ì': 'i4',
-            'ō': 'o1', 'ó': 'o2', 'ǒ': 'o3', 'ò': 'o4',
-            'ū': 'u1', 'ú': 'u2', 'ǔ': 'u3', 'ù': 'u4',
-            'ǖ': 'ü1', 'ǘ': 'ü2', 'ǚ': 'ü3', 'ǜ': 'ü4',
-            'ü': 'v', 'ń': 'n2', 'ň': 'n3', 'ǹ': 'n4'
-        }
-        
-        correct_normalized = correct_pinyin.lower()
-        for mark, num in tone_map.items():
-            correct_normalized = correct_normalized.replace(mark, num)
-        
-        user_normalized = user_input.lower().replace(' ', '').replace(',', '').replace('ü', 'v')
-        correct_normalized = correct_normalized.replace(' ', '').replace(',', '')
-        
-        return user_normalized == correct_normalized
+        import pinyin_utils
+        return pinyin_utils.check_pinyin(user_input, correct_pinyin)
     
     @staticmethod
     def convert_tone_marks(pinyin):
         """Convert tone marks to numbers"""
-        tone_map = {
-            'ā': 'a1', 'á': 'a2', 'ǎ': 'a3', 'à': 'a4',
-            'ē': 'e1', 'é': 'e2', 'ě': 'e3', 'è': 'e4',
-            'ī': 'i1', 'í': 'i2', 'ǐ': 'i3', 'ì': 'i4',
-            'ō': 'o1', 'ó': 'o2', 'ǒ': 'o3', 'ò': 'o4',
-            'ū': 'u1', 'ú': 'u2', 'ǔ': 'u3', 'ù': 'u4',
-            'ǖ': 'ü1', 'ǘ': 'ü2', 'ǚ': 'ü3', 'ǜ': 'ü4',
-            'ü': 'v', 'ń': 'n2', 'ň': 'n3', 'ǹ': 'n4'
-        }
-        
-        result = pinyin
-        for mark, num in tone_map.items():
-            result = result.replace(mark, num)
-        return result
+        import pinyin_utils
+        return pinyin_utils.convert_tone_marks(pinyin)
 
 
 class TestSetupDialog:
@@ -659,13 +922,13 @@ class TestSetupDialog:
         """Get test words from previous patches"""
         words_per_patch = self.app.config['words_per_patch']
         current_idx = self.app.progress['current_index']
-        shuffled_indices = self.app.progress['shuffled_indices']
+        order = self.app.order
         
         max_patches = min(num_patches, current_idx)
         start = (current_idx - max_patches) * words_per_patch
         end = current_idx * words_per_patch
         
-        test_indices = shuffled_indices[start:end]
+        test_indices = order[start:end]
         return [self.app.words[i] for i in test_indices]
 
 
@@ -674,7 +937,7 @@ class ConfigWindow:
         self.app = app
         self.window = tk.Toplevel(parent)
         self.window.title("Configuration")
-        self.window.geometry("500x400")
+        self.window.geometry("500x580")
         self.window.configure(bg="#F5F5F5")
         
         title = tk.Label(self.window, text="Configuration", 
@@ -709,6 +972,20 @@ class ConfigWindow:
         self.words_entry.insert(0, str(app.config['words_per_patch']))
         self.words_entry.pack(pady=10, padx=10, fill=tk.X)
         
+        # Question style
+        style_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
+        style_frame.pack(pady=10, padx=40, fill=tk.X)
+        
+        tk.Label(style_frame, text="Question Style", font=("Arial", 14, "bold"), 
+                bg="white", pady=10).pack(anchor=tk.W, padx=10)
+        
+        style = QUESTION_STYLES.get(app.config.get('question_style'), QUESTION_STYLES['typed'])
+        self.style_var = tk.StringVar(value=style)
+        style_combo = ttk.Combobox(style_frame, textvariable=self.style_var, 
+                                  values=list(QUESTION_STYLES.values()), state='readonly', 
+                                  font=("Arial", 12))
+        style_combo.pack(pady=10, padx=10, fill=tk.X)
+        
         # Reset progress
         reset_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
         reset_frame.pack(pady=10, padx=40, fill=tk.X)
@@ -731,10 +1008,7 @@ class ConfigWindow:
     def reset_progress(self):
         """Reset progress"""
         if messagebox.askyesno("Confirm", "Are you sure you want to reset progress? This will reshuffle all words and start from the beginning."):
-            self.app.progress['shuffled_indices'] = list(range(len(self.app.words)))
-            random.shuffle(self.app.progress['shuffled_indices'])
-            self.app.progress['current_index'] = 0
-            self.app.save_progress()
+            self.app.reset_progress()
             messagebox.showinfo("Success", "Progress has been reset!")
     
     def save_config(self):
@@ -750,6 +1024,8 @@ class ConfigWindow:
             old_hsk = self.app.config['hsk_level']
             self.app.config['hsk_level'] = new_hsk
             self.app.config['words_per_patch'] = new_words
+            self.app.config['question_style'] = next(
+                key for key, label in QUESTION_STYLES.items() if label == self.style_var.get())
             self.app.save_config()
             
             if new_hsk != old_hsk:
@@ -764,8 +1040,105 @@ class ConfigWindow:
             messagebox.showerror("Error", "Please enter a valid number for words per patch")
 
 
+class StatsWindow:
+    def __init__(self, parent, app):
+        self.app = app
+        self.window = tk.Toplevel(parent)
+        self.window.title("Statistics")
+        self.window.geometry("500x600")
+        self.window.configure(bg="#F5F5F5")
+        
+        title = tk.Label(self.window, text="Statistics", 
+                        font=("Arial", 20, "bold"), fg="#2196F3", bg="#F5F5F5")
+        title.pack(pady=20)
+        
+        stats_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
+        stats_frame.pack(pady=10, padx=40, fill=tk.BOTH, expand=True)
+        
+        stats_label = tk.Label(stats_frame, text="\n".join(app.stats.report_lines()), 
+                              font=("Arial", 12), bg="white", fg="#333333", 
+                              justify=tk.LEFT, anchor=tk.NW, pady=10, padx=10)
+        stats_label.pack(fill=tk.BOTH, expand=True)
+        
+        btn_close = tk.Button(self.window, text="Close", 
+                             font=("Arial", 14), bg="#757575", fg="white", 
+                             height=2, command=self.window.destroy)
+        btn_close.pack(pady=20, padx=40, fill=tk.X)
+
+
+class ProfileWindow:
+    def __init__(self, parent, app):
+        self.app = app
+        self.window = tk.Toplevel(parent)
+        self.window.title("Profiles")
+        self.window.geometry("400x450")
+        self.window.configure(bg="#F5F5F5")
+        
+        title = tk.Label(self.window, text="Profiles", 
+                        font=("Arial", 20, "bold"), fg="#2196F3", bg="#F5F5F5")
+        title.pack(pady=20)
+        
+        # Existing profiles
+        list_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
+        list_frame.pack(pady=10, padx=40, fill=tk.BOTH, expand=True)
+        
+        tk.Label(list_frame, text="Select a profile", font=("Arial", 14, "bold"), 
+                bg="white", pady=10).pack(anchor=tk.W, padx=10)
+        
+        self.names = [None] + list_profiles()
+        self.listbox = tk.Listbox(list_frame, font=("Arial", 12), height=8)
+        for name in self.names:
+            self.listbox.insert(tk.END, name or "default")
+        current = self.names.index(app.profile.name) if app.profile.name in self.names else 0
+        self.listbox.selection_set(current)
+        self.listbox.pack(pady=(0, 10), padx=10, fill=tk.BOTH, expand=True)
+        self.listbox.bind('<Double-Button-1>', lambda e: self.switch_selected())
+        
+        # New profile
+        new_frame = tk.Frame(self.window, bg="white", relief=tk.RAISED, bd=2)
+        new_frame.pack(pady=10, padx=40, fill=tk.X)
+        
+        tk.Label(new_frame, text="Or create a new profile", font=("Arial", 10), 
+                bg="white", fg="#666666").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        self.new_entry = tk.Entry(new_frame, font=("Arial", 12))
+        self.new_entry.pack(pady=10, padx=10, fill=tk.X)
+        
+        btn_switch = tk.Button(self.window, text="Switch Profile", 
+                              font=("Arial", 14), bg="#4CAF50", fg="white", 
+                              height=2, command=self.switch_selected)
+        btn_switch.pack(pady=20, padx=40, fill=tk.X)
+    
+    def switch_selected(self):
+        """Switch to the typed or selected profile"""
+        name = self.new_entry.get().strip()
+        if not name:
+            selection = self.listbox.curselection()
+            name = self.names[selection[0]] if selection else None
+        
+        try:
+            self.app.switch_profile(name)
+        except ValueError:
+            messagebox.showerror("Error", "Profile names may only use letters, digits, '.', '_' or '-'")
+            return
+        self.window.destroy()
+
+
 def main():
-    app = ChineseFlashcardGUI()
+    parser = argparse.ArgumentParser(description="Chinese Flashcard Learning System - GUI")
+    parser.add_argument('--profile', help="learner profile to use (stored in profiles/<name>/)")
+    parser.add_argument('--timing', action='store_true',
+                        help="report the time to the main menu on stderr")
+    args = parser.parse_args()
+    
+    try:
+        profile = Profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    imported = time.perf_counter()
+    app = ChineseFlashcardGUI(profile)
+    if args.timing:
+        app.startup = (imported, time.perf_counter())
     app.run()
 
 
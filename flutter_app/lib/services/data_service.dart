@@ -3,9 +3,15 @@ import 'package:flutter/services.dart';
 import 'package:csv/csv.dart';
 import 'package:shared_preferences/shared_preferences.dart';
 import '../models/chinese_word.dart';
+import 'permutation.dart';
 
 class DataService {
   static List<ChineseWord> _words = [];
+  // Patch order: a seeded permutation, or the full index list saved by
+  // versions before seeds existed
+  static Permutation? _order;
+  static int? _seed;
+  static int _wordCount = 0;
   static List<int> _shuffledIndices = [];
   static int _currentIndex = 0;
   static int _hskLevel = 1;
@@ -18,8 +24,10 @@ class DataService {
     _wordsPerPatch = prefs.getInt('words_per_patch') ?? 10;
     _currentIndex = prefs.getInt('current_index') ?? 0;
     
+    _seed = prefs.getInt('seed');
+    _wordCount = prefs.getInt('word_count') ?? 0;
     final indicesJson = prefs.getString('shuffled_indices');
-    if (indicesJson != null) {
+    if (_seed == null && indicesJson != null) {
       _shuffledIndices = List<int>.from(json.decode(indicesJson));
     }
     
@@ -34,7 +42,13 @@ class DataService {
     await prefs.setInt('hsk_level', _hskLevel);
     await prefs.setInt('words_per_patch', _wordsPerPatch);
     await prefs.setInt('current_index', _currentIndex);
-    await prefs.setString('shuffled_indices', json.encode(_shuffledIndices));
+    if (_seed != null) {
+      await prefs.setInt('seed', _seed!);
+      await prefs.setInt('word_count', _wordCount);
+      await prefs.remove('shuffled_indices');
+    } else {
+      await prefs.remove('seed');
+    }
     await prefs.setString('revision_words', json.encode(_revisionWords.toList()));
   }
 
@@ -66,22 +80,25 @@ class DataService {
     
     print('DEBUG: Total words loaded: ${_words.length}');
     
-    if (_shuffledIndices.isEmpty || _shuffledIndices.length != _words.length) {
-      _shuffledIndices = List<int>.generate(_words.length, (i) => i);
-      _shuffledIndices.shuffle();
-      _currentIndex = 0;
-      await saveConfig();
+    if (_seed != null && _wordCount == _words.length) {
+      _order = Permutation(_wordCount, _seed!);
+    } else if (_seed != null || _shuffledIndices.length != _words.length) {
+      await resetProgress();
     }
   }
 
+  static int get _orderLength => _order?.size ?? _shuffledIndices.length;
+
+  static List<int> _orderSlice(int start, int end) =>
+      _order?.sublist(start, end) ?? _shuffledIndices.sublist(start, end);
+
   static List<ChineseWord> getCurrentPatch() {
     final start = _currentIndex * _wordsPerPatch;
-    final end = (start + _wordsPerPatch).clamp(0, _shuffledIndices.length);
+    final end = (start + _wordsPerPatch).clamp(0, _orderLength);
     
-    if (start >= _shuffledIndices.length) return [];
+    if (start >= _orderLength) return [];
     
-    return _shuffledIndices
-        .sublist(start, end)
+    return _orderSlice(start, end)
         .map((i) => _words[i])
         .toList();
   }
@@ -108,11 +125,10 @@ class DataService {
     for (int i = 1; i <= patchesBack; i++) {
       final patchIndex = _currentIndex - i;
       final start = patchIndex * _wordsPerPatch;
-      final end = (start + _wordsPerPatch).clamp(0, _shuffledIndices.length);
+      final end = (start + _wordsPerPatch).clamp(0, _orderLength);
       
-      if (start < _shuffledIndices.length) {
-        final patchWords = _shuffledIndices
-            .sublist(start, end)
+      if (start < _orderLength) {
+        final patchWords = _orderSlice(start, end)
             .map((i) => _words[i])
             .toList();
         allWords.addAll(patchWords);
@@ -131,6 +147,8 @@ class DataService {
   static Future<void> setHskLevel(int level) async {
     _hskLevel = level;
     _currentIndex = 0;
+    _seed = null;
+    _order = null;
     _shuffledIndices.clear();
     await saveConfig();
     await loadWords();
@@ -142,8 +160,10 @@ class DataService {
   }
 
   static Future<void> resetProgress() async {
-    _shuffledIndices = List<int>.generate(_words.length, (i) => i);
-    _shuffledIndices.shuffle();
+    _seed = Permutation.newSeed();
+    _wordCount = _words.length;
+    _order = Permutation(_wordCount, _seed!);
+    _shuffledIndices = [];
     _currentIndex = 0;
     await saveConfig();
   }
@@ -0,0 +1,69 @@
+import 'dart:math';
+
+/// Seeded shuffle of 0..size-1 computed on demand.
+///
+/// Same algorithm as permutation.py, so a seed gives the same patch order
+/// on every client. Multiplications are split into 16-bit halves so the
+/// results stay exact when compiled to JavaScript.
+class Permutation {
+  static const int _mask32 = 0xFFFFFFFF;
+  static const int _rounds = 4;
+
+  final int size;
+  final int seed;
+  late final int _halfBits;
+  late final int _halfMask;
+  late final List<int> _keys;
+
+  Permutation(this.size, int seed) : seed = seed & _mask32 {
+    var bits = 1;
+    while ((1 << (2 * bits)) < size) {
+      bits++;
+    }
+    _halfBits = bits;
+    _halfMask = (1 << bits) - 1;
+    _keys = List<int>.generate(_rounds, (r) => mix32(this.seed + r * 0x9E3779B9));
+  }
+
+  static int newSeed() => Random().nextInt(0x100000000);
+
+  static int _mul32(int a, int b) {
+    final high = ((a * (b >> 16)) & 0xFFFF) << 16;
+    return (high + a * (b & 0xFFFF)) & _mask32;
+  }
+
+  static int mix32(int x) {
+    x &= _mask32;
+    x ^= x >> 16;
+    x = _mul32(x, 0x7FEB352D);
+    x ^= x >> 15;
+    x = _mul32(x, 0x846CA68B);
+    x ^= x >> 16;
+    return x;
+  }
+
+  int _encrypt(int x) {
+    var left = x >> _halfBits;
+    var right = x & _halfMask;
+    for (final key in _keys) {
+      final next = left ^ (mix32(right ^ key) & _halfMask);
+      left = right;
+      right = next;
+    }
+    return (left << _halfBits) | right;
+  }
+
+  int operator [](int i) {
+    if (i < 0 || i >= size) {
+      throw RangeError.index(i, this, 'index', null, size);
+    }
+    var x = _encrypt(i);
+    while (x >= size) {
+      x = _encrypt(x);
+    }
+    return x;
+  }
+
+  List<int> sublist(int start, int end) =>
+      [for (var i = start; i < end; i++) this[i]];
+}
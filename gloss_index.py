@@ -0,0 +1,214 @@
+"""
+Meaning answers
+Grade English and Vietnamese meanings against a diacritic-folded index of each word's glosses
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+from persistence import write_atomic
+from vocabulary import RESOURCE_DIR, hsk_file, load_vocabulary
+
+
+FORMAT_VERSION = 1
+LANGUAGES = {'english': 'meaning', 'vietnamese': 'nghia_tieng_viet'}
+
+GLOSS_SEPARATORS = re.compile(r"[;/]")
+PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+TOKEN = re.compile(r"[a-z0-9']+")
+# Placeholder and filler words that a learner may leave out or spell out
+IGNORED = frozenset("""
+to a an the sth sb something someone somebody one's oneself etc lit fig
+""".split())
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def gloss_file(csv_path):
+    """Return the path of the cached gloss index for a CSV file"""
+    return Path(csv_path).with_suffix(".glosses")
+
+
+def fold(text):
+    """Lowercase and strip diacritics: 'Đối mặt' -> 'doi mat'"""
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def canonical(text):
+    """Folded content words of a gloss or answer, space-joined"""
+    return ' '.join(t for t in TOKEN.findall(fold(text)) if t not in IGNORED)
+
+
+def gloss_keys(field):
+    """Accepted answer keys for one meaning field
+
+    The field is split on ';' and '/'; each gloss is accepted with and
+    without its parenthesised parts, classifier notes are dropped.
+    """
+    keys = set()
+    for gloss in GLOSS_SEPARATORS.split(field):
+        gloss = gloss.strip()
+        if not gloss or gloss.startswith('CL:'):
+            continue
+        for variant in (gloss, PARENTHESES.sub(' ', gloss)):
+            key = canonical(variant)
+            if key:
+                keys.add(key)
+    return keys
+
+
+def max_edits(key):
+    """Typos tolerated for an answer of this length"""
+    if len(key) <= 3:
+        return 0
+    if len(key) <= 7:
+        return 1
+    return 2
+
+
+def within_distance(a, b, limit):
+    """True if the edit distance between a and b is at most limit
+
+    Only a diagonal band of width 2 * limit + 1 is computed and the
+    search stops as soon as a whole row exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0:
+        return a == b
+    far = limit + 1
+    previous = [j if j <= limit else far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [far] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        best = current[0]
+        ca = a[i - 1]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < far else far
+            if cost < best:
+                best = cost
+        if best > limit:
+            return False
+        previous = current
+    return previous[len(b)] <= limit
+
+
+class GlossIndex:
+    """Answer keys of every word in a deck, per language
+
+    Keys come from the cached index file (see open_index), one row of
+    key sets per word in deck order; words outside the deck (revision
+    words from another level) are indexed on first use.
+    """
+
+    def __init__(self, vocab, rows):
+        self.keys = {}
+        for i, row in enumerate(rows):
+            self.keys[vocab[i].chinese] = dict(zip(LANGUAGES, row))
+
+    def index(self, word):
+        entry = self.keys[word['chinese']] = {
+            language: frozenset(gloss_keys(word.get(field) or ''))
+            for language, field in LANGUAGES.items()
+        }
+        return entry
+
+    def accepted(self, word, language):
+        """The answer keys of a word in a language"""
+        entry = self.keys.get(word['chinese'])
+        if entry is None:
+            entry = self.index(word)
+        return entry[language]
+
+    def check(self, user_input, word, language):
+        """True if the answer names one of the word's glosses, allowing small typos"""
+        answer = canonical(user_input)
+        if not answer:
+            return False
+        keys = self.accepted(word, language)
+        if answer in keys:
+            return True
+        limit = max_edits(answer)
+        return limit > 0 and any(within_distance(answer, key, limit) for key in keys)
+
+    def graders(self):
+        """SessionEngine graders for the chinese_to_<language> question types"""
+        return {f"chinese_to_{language}": (lambda user_input, word, language=language:
+                                           self.check(user_input, word, language))
+                for language in LANGUAGES}
+
+
+def build_rows(vocab):
+    """The answer keys of every word, per language"""
+    return [tuple(frozenset(gloss_keys(vocab[i][field] or '')) for field in LANGUAGES.values())
+            for i in range(len(vocab))]
+
+
+def signature(csv_path):
+    """Header line tying a cached index to the CSV as it is now"""
+    st = os.stat(csv_path)
+    return f"# {FORMAT_VERSION} {st.st_size} {st.st_mtime_ns}"
+
+
+def read_rows(path, csv_path, count):
+    """Rows from a cached index file, or None if it is missing or stale"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.readline().rstrip('\n') != signature(csv_path):
+                return None
+            rows = []
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != len(LANGUAGES):
+                    return None
+                rows.append(tuple(frozenset(field.split('|')) if field else frozenset() for field in fields))
+    except (OSError, ValueError):
+        return None
+    return rows if len(rows) == count else None
+
+
+def open_index(csv_path, vocab):
+    """Read the cached gloss index for a deck, (re)building it when missing or stale"""
+    path = gloss_file(csv_path)
+    rows = read_rows(path, csv_path, len(vocab))
+    if rows is None:
+        rows = build_rows(vocab)
+        # Keys are canonical(): tokens of [a-z0-9'] joined by spaces, so
+        # '|' and tabs cannot occur in them
+        lines = [signature(csv_path) + '\n']
+        lines.extend('\t'.join('|'.join(sorted(keys)) for keys in row) + '\n' for row in rows)
+        try:
+            write_atomic(path, ''.join(lines), fsync=False)
+        except OSError:
+            # Read-only install: the index just lives for this process
+            pass
+    return GlossIndex(vocab, rows)
+
+
+def load_gloss_index(level, resource_dir=RESOURCE_DIR):
+    """Return the shared GlossIndex of an HSK level"""
+    path = hsk_file(level, resource_dir)
+    key = str(path)
+    index = _cache.get(key)
+    if index is not None:
+        return index
+
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is None:
+            index = open_index(path, load_vocabulary(level, resource_dir))
+            _cache[key] = index
+    return index
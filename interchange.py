@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Learner state interchange
+Stream a profile's config, progress, revision list, statistics and review history to one checksummed file and back
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+
+from persistence import file_lock, write_atomic, write_locked
+from profiles import Profile
+from review_journal import ReviewJournal
+
+
+# File layout (all integers are unsigned LEB128 varints unless noted):
+#
+#   'HSKX' version
+#   record*            kind (1 byte), payload length, payload
+#   END record         payload: CRC32 (4 bytes, big-endian) of every byte
+#                      before the END record, revision count, review count
+#
+# CONFIG, PROGRESS and STATS payloads are compact UTF-8 JSON. STRING defines
+# the next entry of a string table (ids count up from 0) used by REVIEWS.
+# REVISION holds six length-prefixed UTF-8 fields in REVISION_FIELDS order.
+# REVIEWS holds an event count, then per event: zigzag delta of the
+# timestamp in milliseconds (from the previous event, starting at 0), word
+# string id, mode string id, a flags byte (1 = correct, 2 = has latency)
+# and, if flagged, the latency in units of 0.1 ms. Readers skip record
+# kinds they do not know, so later versions can add records.
+MAGIC = b'HSKX'
+VERSION = 1
+END, CONFIG, PROGRESS, STATS, STRING, REVISION, REVIEWS = range(7)
+JSON_RECORDS = {CONFIG: 'config', PROGRESS: 'progress', STATS: 'stats'}
+REVISION_FIELDS = ('chinese', 'pinyin', 'meaning', 'han_viet', 'nghia_tieng_viet', 'cach_dung')
+EVENTS_PER_RECORD = 4096
+
+
+def put_varint(buf, n):
+    """Append an unsigned varint to a bytearray"""
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def get_varint(data, pos):
+    """Decode an unsigned varint at pos; return (value, next position)"""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+_small_varints = []
+
+
+def small_varints():
+    """Encoded varints for 0..65535, built on first use"""
+    if not _small_varints:
+        for n in range(1 << 16):
+            buf = bytearray()
+            put_varint(buf, n)
+            _small_varints.append(bytes(buf))
+    return _small_varints
+
+
+def put_string(buf, text):
+    """Append a length-prefixed UTF-8 string"""
+    data = text.encode('utf-8')
+    put_varint(buf, len(data))
+    buf += data
+
+
+def get_string(data, pos):
+    """Decode a length-prefixed UTF-8 string at pos"""
+    length, pos = get_varint(data, pos)
+    return data[pos:pos + length].decode('utf-8'), pos + length
+
+
+class Writer:
+    """Streams records to a binary file object, keeping a running CRC32"""
+
+    def __init__(self, f):
+        self.f = f
+        self.crc = 0
+        self.strings = {}
+        self.string_refs = {}
+        self.last_ts = 0
+        self.revision_count = 0
+        self.review_count = 0
+        header = bytearray(MAGIC)
+        put_varint(header, VERSION)
+        self.write_raw(bytes(header))
+
+    def write_raw(self, data):
+        self.f.write(data)
+        self.crc = zlib.crc32(data, self.crc)
+
+    def record(self, kind, payload):
+        head = bytearray([kind])
+        put_varint(head, len(payload))
+        self.write_raw(bytes(head))
+        self.write_raw(bytes(payload))
+
+    def json_record(self, kind, value):
+        self.record(kind, json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def string_id(self, text):
+        """Return the table id of a string, defining it on first use"""
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            self.record(STRING, text.encode('utf-8'))
+        return sid
+
+    def string_ref(self, text):
+        """Return the encoded varint id of a string"""
+        ref = bytearray()
+        put_varint(ref, self.string_id(text))
+        ref = self.string_refs[text] = bytes(ref)
+        return ref
+
+    def revision(self, word):
+        buf = bytearray()
+        for field in REVISION_FIELDS:
+            put_string(buf, word.get(field, ''))
+        self.record(REVISION, buf)
+        self.revision_count += 1
+
+    def reviews(self, events):
+        """Write one REVIEWS record for a batch of journal events"""
+        # Hot loop: small varints and string ids come from lookup tables
+        table = small_varints()
+        limit = len(table)
+        refs = self.string_refs
+        buf = bytearray()
+        put_varint(buf, len(events))
+        last_ts = self.last_ts
+        for event in events:
+            ts = round(event['ts'] * 1000)
+            delta = ts - last_ts
+            last_ts = ts
+            delta = (delta << 1) ^ (delta >> 63)
+            if delta < limit:
+                buf += table[delta]
+            else:
+                put_varint(buf, delta)
+            buf += refs.get(event['word']) or self.string_ref(event['word'])
+            buf += refs.get(event['mode']) or self.string_ref(event['mode'])
+            latency = event.get('latency')
+            if latency is None:
+                buf.append(1 if event['correct'] else 0)
+            else:
+                buf.append(3 if event['correct'] else 2)
+                units = max(0, round(latency * 10000))
+                if units < limit:
+                    buf += table[units]
+                else:
+                    put_varint(buf, units)
+        self.last_ts = last_ts
+        self.record(REVIEWS, buf)
+        self.review_count += len(events)
+
+    def close(self):
+        """Write the END record (the checksum covers everything before it)"""
+        buf = bytearray(struct.pack('>I', self.crc))
+        put_varint(buf, self.revision_count)
+        put_varint(buf, self.review_count)
+        self.record(END, buf)
+
+
+def read_varint_from(f):
+    """Read an unsigned varint from a file; return (value, raw bytes)"""
+    raw = bytearray()
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Truncated interchange file")
+        raw += byte
+        if byte[0] < 0x80:
+            return get_varint(raw, 0)[0], bytes(raw)
+
+
+def read_records(f):
+    """Yield (kind, payload) records, verifying the checksum at the END record
+
+    Nothing read before the END record may be trusted until the generator
+    finishes without raising ValueError.
+    """
+    header = f.read(len(MAGIC))
+    if header != MAGIC:
+        raise ValueError("Not a flashcard interchange file")
+    version, raw = read_varint_from(f)
+    if version > VERSION:
+        raise ValueError(f"Unsupported interchange version {version}")
+    crc = zlib.crc32(raw, zlib.crc32(header))
+
+    while True:
+        kind = f.read(1)
+        if not kind:
+            raise ValueError("Truncated interchange file (no end record)")
+        length, raw = read_varint_from(f)
+        payload = f.read(length)
+        if len(payload) != length:
+            raise ValueError("Truncated interchange file")
+        if kind[0] == END:
+            if len(payload) < 4 or struct.unpack('>I', payload[:4])[0] != crc:
+                raise ValueError("Checksum mismatch: the file is corrupt")
+            yield END, payload
+            return
+        crc = zlib.crc32(payload, zlib.crc32(raw, zlib.crc32(kind, crc)))
+        yield kind[0], payload
+
+
+def read_items(f):
+    """Decode records into ('config' | 'progress' | 'stats', dict),
+    ('revision', word), ('reviews', [event, ...]) and finally ('end', counts)
+
+    Records are decoded before the END checksum is reached, so a payload
+    that does not decode raises ValueError as a checksum mismatch would.
+    """
+    try:
+        yield from decode_items(read_records(f))
+    except (IndexError, struct.error) as e:
+        raise ValueError("Corrupt interchange file: a record does not decode") from e
+
+
+def decode_items(records):
+    """Decode (kind, payload) records for read_items"""
+    strings = []
+    last_ts = 0
+    for kind, payload in records:
+        if kind == STRING:
+            strings.append(payload.decode('utf-8'))
+        elif kind in JSON_RECORDS:
+            yield JSON_RECORDS[kind], json.loads(payload)
+        elif kind == REVISION:
+            word = {}
+            pos = 0
+            for field in REVISION_FIELDS:
+                word[field], pos = get_string(payload, pos)
+            yield 'revision', word
+        elif kind == REVIEWS:
+            count, pos = get_varint(payload, 0)
+            events = []
+            # Hot loop: single-byte varints are decoded inline
+            for _ in range(count):
+                delta = payload[pos]
+                if delta < 0x80:
+                    pos += 1
+                else:
+                    delta, pos = get_varint(payload, pos)
+                last_ts += (delta >> 1) ^ -(delta & 1)
+                word_id = payload[pos]
+                if word_id < 0x80:
+                    pos += 1
+                else:
+                    word_id, pos = get_varint(payload, pos)
+                mode_id = payload[pos]
+                if mode_id < 0x80:
+                    pos += 1
+                else:
+                    mode_id, pos = get_varint(payload, pos)
+                flags = payload[pos]
+                pos += 1
+                latency = None
+                if flags & 2:
+                    units, pos = get_varint(payload, pos)
+                    latency = units / 10000
+                events.append({
+                    "ts": last_ts / 1000,
+                    "word": strings[word_id],
+                    "mode": strings[mode_id],
+                    "correct": bool(flags & 1),
+                    "latency": latency
+                })
+            yield 'reviews', events
+        elif kind == END:
+            revisions, pos = get_varint(payload, 4)
+            reviews, pos = get_varint(payload, pos)
+            yield 'end', {"revision": revisions, "reviews": reviews}
+
+
+def read_json(path, create_lock=True):
+    """Return a JSON state file's contents, or None if it does not exist"""
+    with file_lock(path, shared=True, create=create_lock):
+        if not Path(path).exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def read_revision(path):
+    """Return the words of a revision.txt file"""
+    words = []
+    with file_lock(path, shared=True):
+        if not Path(path).exists():
+            return words
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('|')
+                if len(parts) >= 3:
+                    parts += [''] * (len(REVISION_FIELDS) - len(parts))
+                    words.append(dict(zip(REVISION_FIELDS, parts)))
+    return words
+
+
+def export_profile(profile, path):
+    """Write a profile's whole state to an interchange file; return the counts"""
+    path = Path(path)
+    tmp_file = path.with_name(path.name + ".tmp")
+    journal = ReviewJournal(profile.journal_file)
+    try:
+        with open(tmp_file, 'wb') as f:
+            writer = Writer(f)
+            for kind, state_file in ((CONFIG, profile.config_file),
+                                     (PROGRESS, profile.progress_file),
+                                     (STATS, profile.stats_file)):
+                value = read_json(state_file)
+                if value is not None:
+                    writer.json_record(kind, value)
+            for word in read_revision(profile.revision_file):
+                writer.revision(word)
+
+            batch = []
+            for event in journal.iter_events():
+                batch.append(event)
+                if len(batch) >= EVENTS_PER_RECORD:
+                    writer.reviews(batch)
+                    batch = []
+            if batch:
+                writer.reviews(batch)
+            writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        raise
+    return {"revision": writer.revision_count, "reviews": writer.review_count}
+
+
+def has_state(profile):
+    """True if any of the profile's state files exist"""
+    return any(p.exists() for p in (profile.config_file, profile.progress_file,
+                                    profile.revision_file, profile.journal_file,
+                                    profile.stats_file))
+
+
+def import_profile(path, profile, force=False):
+    """Replace a profile's state with the contents of an interchange file
+
+    The file is fully read and its checksum verified before anything in the
+    profile is touched; review history is staged in a temp journal.
+    """
+    profile.ensure_directory()
+    if has_state(profile) and not force:
+        raise ValueError(f"Profile '{profile.display_name}' already has saved state (use --force to replace it)")
+
+    staged = {}
+    revision = []
+    words = {}
+    counts = None
+    journal_tmp = profile.journal_file.with_name(profile.journal_file.name + ".import.tmp")
+    try:
+        with open(path, 'rb') as f, open(journal_tmp, 'wb') as out:
+            for item, value in read_items(f):
+                if item == 'reviews':
+                    for event in value:
+                        ReviewJournal.fold_event(words, event)
+                    out.write(ReviewJournal.encode(value))
+                elif item == 'revision':
+                    revision.append(value)
+                elif item == 'end':
+                    counts = value
+                else:
+                    staged[item] = value
+            out.flush()
+            os.fsync(out.fileno())
+
+        if 'config' in staged:
+            write_locked(profile.config_file, json.dumps(staged['config'], indent=2))
+        if 'progress' in staged:
+            write_locked(profile.progress_file, json.dumps(staged['progress'], indent=2))
+        if 'stats' in staged:
+            write_locked(profile.stats_file, json.dumps(staged['stats'], separators=(',', ':')))
+        with file_lock(profile.revision_file):
+            write_atomic(profile.revision_file, ''.join(
+                '|'.join(word[field] for field in REVISION_FIELDS) + '\n' for word in revision))
+        # The index is aggregated while streaming instead of replaying the file
+        ReviewJournal(profile.journal_file).replace(journal_tmp, words)
+    finally:
+        if journal_tmp.exists():
+            journal_tmp.unlink()
+    return counts
+
+
+def verify(path):
+    """Read a whole interchange file and return its counts (raises ValueError if corrupt)"""
+    with open(path, 'rb') as f:
+        for item, value in read_items(f):
+            if item == 'end':
+                return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a learner's flashcard state")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('export', "write a profile's state to FILE"),
+                            ('import', "replace a profile's state with FILE"),
+                            ('verify', "check FILE's checksum and print its counts")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('file')
+        if name != 'verify':
+            command.add_argument('--profile', help="learner profile (default: the shared default profile)")
+        if name == 'import':
+            command.add_argument('--force', action='store_true', help="replace existing state")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.command == 'export':
+            counts = export_profile(Profile(args.profile), args.file)
+        elif args.command == 'import':
+            counts = import_profile(args.file, Profile(args.profile), force=args.force)
+        else:
+            counts = verify(args.file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(args.file)
+    print(f"{args.command}: {counts['revision']} revision words, {counts['reviews']} reviews, "
+          f"{size / 1024:.1f} KiB in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,83 @@
+"""
+Response latency tracking
+Times each prompt with a monotonic clock and summarizes per-word percentiles
+"""
+
+import math
+import time
+from collections import deque
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(len(ordered) * pct / 100))
+    return ordered[rank - 1]
+
+
+class LatencyTracker:
+    """Ring buffer of (word, seconds) samples for the current session
+
+    start() is called when a prompt is shown and stop() when the answer is
+    submitted. Only the most recent `capacity` samples are kept, so endless
+    sessions use constant memory. Persisting the samples is left to the
+    review journal, which already writes in fsync-batched chunks.
+    """
+
+    def __init__(self, capacity=1024):
+        self.samples = deque(maxlen=capacity)
+        self.started = None
+
+    def start(self):
+        """Mark the moment the prompt became visible"""
+        self.started = time.perf_counter()
+
+    def stop(self, word):
+        """Return seconds since start() and keep the sample"""
+        if self.started is None:
+            return None
+        elapsed = time.perf_counter() - self.started
+        self.started = None
+        self.samples.append((word['chinese'], elapsed))
+        return elapsed
+
+    def summary(self):
+        """Return {chinese: {count, p50, p90, max}} for the buffered samples"""
+        per_word = {}
+        for chinese, elapsed in self.samples:
+            per_word.setdefault(chinese, []).append(elapsed)
+
+        return {
+            chinese: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "max": max(values)
+            }
+            for chinese, values in per_word.items()
+        }
+
+    def overall(self):
+        """Return session-wide p50/p90 latency in seconds"""
+        values = [elapsed for _, elapsed in self.samples]
+        return {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90)
+        }
+
+    def summary_lines(self, slowest=5):
+        """Human-readable latency report used by the CLI and GUI"""
+        if not self.samples:
+            return []
+        overall = self.overall()
+        lines = [f"Response time: median {overall['p50']:.1f}s, p90 {overall['p90']:.1f}s"]
+        per_word = sorted(self.summary().items(), key=lambda item: item[1]["p50"], reverse=True)
+        if per_word:
+            lines.append("Slowest words:")
+            for chinese, stats in per_word[:slowest]:
+                lines.append(f"  {chinese}: median {stats['p50']:.1f}s, "
+                             f"p90 {stats['p90']:.1f}s ({stats['count']}x)")
+        return lines
@@ -0,0 +1,201 @@
+"""
+Learning statistics
+Incremental aggregates updated per answer and rendered without rescanning history
+"""
+
+import json
+import time
+from pathlib import Path
+
+from persistence import file_lock, write_atomic
+
+
+TONE_MARKS = {
+    'ā': 1, 'á': 2, 'ǎ': 3, 'à': 4,
+    'ē': 1, 'é': 2, 'ě': 3, 'è': 4,
+    'ī': 1, 'í': 2, 'ǐ': 3, 'ì': 4,
+    'ō': 1, 'ó': 2, 'ǒ': 3, 'ò': 4,
+    'ū': 1, 'ú': 2, 'ǔ': 3, 'ù': 4,
+    'ǖ': 1, 'ǘ': 2, 'ǚ': 3, 'ǜ': 4,
+    'ń': 2, 'ň': 3, 'ǹ': 4
+}
+
+TONE_NAMES = {1: "1st", 2: "2nd", 3: "3rd", 4: "4th"}
+
+
+def word_tones(pinyin):
+    """Return the set of tones (1-4) marked in a pinyin string"""
+    return {TONE_MARKS[ch] for ch in pinyin.lower() if ch in TONE_MARKS}
+
+
+def accuracy(bucket):
+    """Percentage correct for an [answered, correct] pair"""
+    return (bucket[1] / bucket[0]) * 100 if bucket[0] else 0.0
+
+
+class LearningStats:
+    """Counters kept up to date as answers arrive
+
+    Every bucket is an [answered, correct] pair. Daily buckets are pruned
+    to a rolling window and the last `recent_size` results are kept as a
+    compact '0'/'1' string, so the file stays small and rendering is O(1)
+    in the length of the review history.
+    """
+
+    def __init__(self, stats_file, window_days=30, recent_size=100):
+        self.stats_file = Path(stats_file)
+        self.window_days = window_days
+        self.recent_size = recent_size
+        self.data = self.empty()
+        # Answers recorded since the last save, merged into the file on save
+        self.delta = self.empty()
+        self.load()
+
+    @staticmethod
+    def empty():
+        """Return a fresh set of aggregates"""
+        return {
+            "total": [0, 0],
+            "by_mode": {},
+            "by_level": {},
+            "by_patch": {},
+            "by_tone": {},
+            "by_day": {},
+            "recent": ""
+        }
+
+    def read_file(self):
+        """Return the aggregates currently on disk"""
+        data = self.empty()
+        if self.stats_file.exists():
+            try:
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    data.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return data
+
+    def load(self):
+        """Load aggregates from disk"""
+        with file_lock(self.stats_file, shared=True):
+            self.data = self.read_file()
+
+    def merge(self, base, delta):
+        """Add the counters of delta into base (in place)"""
+        for i in range(2):
+            base["total"][i] += delta["total"][i]
+        for key in ("by_mode", "by_level", "by_patch", "by_tone", "by_day"):
+            for name, bucket in delta[key].items():
+                target = base[key].setdefault(name, [0, 0])
+                target[0] += bucket[0]
+                target[1] += bucket[1]
+        if delta["by_day"]:
+            # The file may still hold days that fell out of the window since it was written
+            latest = time.mktime(time.strptime(max(delta["by_day"]), "%Y-%m-%d"))
+            cutoff = time.strftime("%Y-%m-%d", time.localtime(latest - self.window_days * 86400))
+            base["by_day"] = {day: bucket for day, bucket in base["by_day"].items() if day > cutoff}
+        base["recent"] = (base["recent"] + delta["recent"])[-self.recent_size:]
+        return base
+
+    def save(self):
+        """Merge unsaved answers into the file and reload the combined totals
+
+        Other instances may have saved their own answers meanwhile, so the
+        file is re-read under its lock instead of being overwritten.
+        """
+        if not self.delta["total"][0]:
+            return
+        with file_lock(self.stats_file):
+            data = self.merge(self.read_file(), self.delta)
+            write_atomic(self.stats_file, json.dumps(data, separators=(',', ':')))
+        self.data = data
+        self.delta = self.empty()
+
+    @staticmethod
+    def bump(buckets, key, correct):
+        """Increment one [answered, correct] bucket"""
+        bucket = buckets.setdefault(str(key), [0, 0])
+        bucket[0] += 1
+        if correct:
+            bucket[1] += 1
+
+    def record(self, word, mode, correct, level=None, patch=None, now=None):
+        """Fold one answer into every aggregate"""
+        now = time.time() if now is None else now
+        self.apply(self.data, word, mode, correct, level, patch, now)
+        self.apply(self.delta, word, mode, correct, level, patch, now)
+
+    def apply(self, data, word, mode, correct, level, patch, now):
+        """Update one set of aggregates for a single answer"""
+        data["total"][0] += 1
+        if correct:
+            data["total"][1] += 1
+        self.bump(data["by_mode"], mode, correct)
+        if level is not None:
+            self.bump(data["by_level"], level, correct)
+            if patch is not None:
+                self.bump(data["by_patch"], f"{level}:{patch}", correct)
+        for tone in word_tones(word['pinyin']):
+            self.bump(data["by_tone"], tone, correct)
+
+        day = time.strftime("%Y-%m-%d", time.localtime(now))
+        if day not in data["by_day"]:
+            cutoff = time.strftime("%Y-%m-%d", time.localtime(now - self.window_days * 86400))
+            data["by_day"] = {d: b for d, b in data["by_day"].items() if d > cutoff}
+        self.bump(data["by_day"], day, correct)
+
+        data["recent"] = (data["recent"] + ('1' if correct else '0'))[-self.recent_size:]
+
+    def last_days(self, days, now=None):
+        """Return the [answered, correct] total over the last `days` days"""
+        now = time.time() if now is None else now
+        cutoff = time.strftime("%Y-%m-%d", time.localtime(now - days * 86400))
+        total = [0, 0]
+        for day, bucket in self.data["by_day"].items():
+            if day > cutoff:
+                total[0] += bucket[0]
+                total[1] += bucket[1]
+        return total
+
+    def report_lines(self, weakest=5):
+        """Human-readable dashboard used by the CLI and GUI"""
+        data = self.data
+        if not data["total"][0]:
+            return ["No answers recorded yet. Start learning to see statistics!"]
+
+        lines = [f"Overall: {data['total'][0]} answers, {accuracy(data['total']):.1f}% correct"]
+
+        recent = data["recent"]
+        if recent:
+            lines.append(f"Last {len(recent)} answers: {recent.count('1') / len(recent) * 100:.1f}% correct")
+
+        week = self.last_days(7)
+        lines.append(f"Last 7 days: {week[0]} answers, {accuracy(week):.1f}% correct")
+
+        if data["by_mode"]:
+            lines.append("")
+            lines.append("By mode:")
+            for mode, bucket in sorted(data["by_mode"].items()):
+                lines.append(f"  {mode}: {accuracy(bucket):.1f}% ({bucket[0]})")
+
+        if data["by_level"]:
+            lines.append("")
+            lines.append("By HSK level:")
+            for level, bucket in sorted(data["by_level"].items()):
+                lines.append(f"  HSK{level}: {accuracy(bucket):.1f}% ({bucket[0]})")
+
+        if data["by_tone"]:
+            lines.append("")
+            lines.append("By tone (words containing it):")
+            for tone, bucket in sorted(data["by_tone"].items()):
+                lines.append(f"  {TONE_NAMES.get(int(tone), tone)} tone: {accuracy(bucket):.1f}% ({bucket[0]})")
+
+        if data["by_patch"]:
+            lines.append("")
+            lines.append("Weakest patches:")
+            ranked = sorted(data["by_patch"].items(), key=lambda item: (accuracy(item[1]), -item[1][0]))
+            for key, bucket in ranked[:weakest]:
+                level, patch = key.split(':')
+                lines.append(f"  HSK{level} patch {int(patch) + 1}: {accuracy(bucket):.1f}% ({bucket[0]})")
+
+        return lines
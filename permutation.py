@@ -0,0 +1,117 @@
+"""
+Seeded permutations
+Compute the i-th element of a shuffled range(n) on demand from a 32-bit seed
+"""
+
+import random
+
+
+MASK32 = 0xFFFFFFFF
+ROUNDS = 4
+
+
+def mix32(x):
+    """32-bit integer hash (lowbias32); identical in the Dart and Java clients"""
+    x &= MASK32
+    x ^= x >> 16
+    x = (x * 0x7FEB352D) & MASK32
+    x ^= x >> 15
+    x = (x * 0x846CA68B) & MASK32
+    x ^= x >> 16
+    return x
+
+
+def new_seed(rng=random):
+    """Return a fresh random seed"""
+    return rng.getrandbits(32)
+
+
+class Permutation:
+    """A shuffled range(size) that stores only its seed
+
+    Indices are run through a balanced Feistel network over the smallest
+    even number of bits covering `size`; results that fall outside the
+    range are fed back in (cycle walking), which takes under four rounds
+    on average. Both directions are O(1) in time and memory, and the
+    order depends only on (size, seed), so every client can reproduce it.
+    """
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.seed = seed & MASK32
+        self.half_bits = 1
+        while 1 << (2 * self.half_bits) < size:
+            self.half_bits += 1
+        self.half_mask = (1 << self.half_bits) - 1
+        self.keys = [mix32(self.seed + r * 0x9E3779B9) for r in range(ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def encrypt(self, x):
+        """One pass of the Feistel network over the full bit domain"""
+        left, right = x >> self.half_bits, x & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ (mix32(right ^ key) & self.half_mask)
+        return (left << self.half_bits) | right
+
+    def decrypt(self, x):
+        """Inverse of encrypt()"""
+        left, right = x >> self.half_bits, x & self.half_mask
+        for key in reversed(self.keys):
+            left, right = right ^ (mix32(left ^ key) & self.half_mask), left
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("permutation index out of range")
+        x = self.encrypt(i)
+        while x >= self.size:
+            x = self.encrypt(x)
+        return x
+
+    def __iter__(self):
+        return (self[i] for i in range(self.size))
+
+    def index(self, value):
+        """Position of value in the shuffled order"""
+        if not 0 <= value < self.size:
+            raise ValueError(f"{value} is not in permutation")
+        x = self.decrypt(value)
+        while x >= self.size:
+            x = self.decrypt(x)
+        return x
+
+
+def new_progress(count, rng=random):
+    """Fresh progress for a word list of `count` words: a new seed, first patch"""
+    return {"current_index": 0, "seed": new_seed(rng), "word_count": count}
+
+
+def position_lookup(order):
+    """position(row) for an order in O(1): a Permutation inverts itself,
+    an explicit index list gets a reverse map (its own index() is O(n))"""
+    if isinstance(order, Permutation):
+        return order.index
+    return {row: position for position, row in enumerate(order)}.__getitem__
+
+
+def progress_order(progress, count):
+    """Return the patch order recorded in progress, or None if it no longer fits
+
+    Progress saved before seeds existed carries the full 'shuffled_indices'
+    list; it keeps working (lists index and slice the same way) until the
+    next reset.
+    """
+    if progress.get('seed') is not None:
+        if progress.get('word_count') == count:
+            return Permutation(count, progress['seed'])
+        return None
+    indices = progress.get('shuffled_indices')
+    if indices and len(indices) == count:
+        return indices
+    return None
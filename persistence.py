@@ -0,0 +1,203 @@
+"""
+Crash-safe persistence
+Atomic file replacement, advisory file locks, change detection and a
+debounced background writer for frequent saves
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking, single instance assumed
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, shared=False, create=True):
+    """Hold an advisory lock for a state file during the block
+
+    The lock is taken on a sidecar '<name>.lock' file because atomic
+    replacement swaps the inode of the file itself. Locks must not be
+    nested for the same path within one process. With create=False a
+    missing lock file is not created and no lock is taken, for readers
+    that must leave the directory untouched (no writer has used it yet).
+    """
+    if fcntl is None:
+        yield
+        return
+    path = Path(path)
+    lock_path = path.with_name(path.name + ".lock")
+    if not create and not lock_path.exists():
+        yield
+        return
+    with open(lock_path, 'a' if create else 'r') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_signature(path):
+    """Return a cheap fingerprint of a file's current version (None if missing)"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ChangeTracker:
+    """Remember which version of each file this process last read or wrote"""
+
+    def __init__(self):
+        self.seen = {}
+
+    def mark(self, path):
+        """Record the file's current version as known"""
+        self.seen[Path(path)] = file_signature(path)
+
+    def changed(self, path):
+        """True if another process replaced the file since mark()"""
+        path = Path(path)
+        return file_signature(path) != self.seen.get(path)
+
+
+def write_atomic(path, data, fsync=True):
+    """Replace a file's contents without ever leaving it truncated
+
+    The data is written to a temp file in the same directory, fsynced and
+    renamed over the target, so readers see either the old or new file.
+    """
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def write_locked(path, data):
+    """write_atomic() while holding the file's lock"""
+    with file_lock(path):
+        write_atomic(path, data)
+
+
+class DebouncedWriter:
+    """Coalesce rapid saves and write them on a background thread
+
+    schedule(path, data) records the latest contents for a file. The file
+    is written once no new data arrived for `delay` seconds, or at the
+    latest `max_delay` seconds after the first unsaved change. Each write
+    holds the file's lock and, if a ChangeTracker is given, marks the new
+    version as our own so it is not mistaken for an external change. flush()
+    writes everything pending immediately and is registered with atexit,
+    so pending data survives normal exit, sys.exit and Ctrl+C.
+    """
+
+    def __init__(self, delay=0.3, max_delay=2.0, tracker=None):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.tracker = tracker
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()
+        self.thread = None
+        self.stopped = False
+        atexit.register(self.flush)
+
+    def schedule(self, path, data):
+        """Queue new contents for a file, replacing any unsaved contents"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        path = Path(path)
+        now = time.monotonic()
+        with self.cond:
+            if self.stopped:
+                self.write_file(path, data)
+                return
+            first = self.pending[path][1] if path in self.pending else now
+            deadline = min(now + self.delay, first + self.max_delay)
+            self.pending[path] = (deadline, first, data)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="debounced-writer", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def run(self):
+        """Background loop: sleep until the earliest deadline, then write"""
+        while True:
+            with self.cond:
+                while True:
+                    if self.stopped and not self.pending:
+                        return
+                    if self.pending:
+                        wait = min(entry[0] for entry in self.pending.values()) - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+            self.write_pending(everything=False)
+
+    def write_pending(self, everything):
+        """Write due (or all) pending files
+
+        Entries are taken and written while holding io_lock, so an older
+        snapshot can never land on disk after a newer one.
+        """
+        with self.io_lock:
+            now = time.monotonic()
+            with self.cond:
+                due = [path for path, entry in self.pending.items() if everything or entry[0] <= now]
+                batch = [(path, self.pending.pop(path)[2]) for path in due]
+            for path, data in batch:
+                try:
+                    self.write_file(path, data)
+                except OSError as e:
+                    print(f"Error: could not save {path}: {e}", file=sys.stderr)
+
+    def write_file(self, path, data):
+        """Atomically replace one file under its lock"""
+        with file_lock(path):
+            write_atomic(path, data)
+            # Marked before the lock is released, so no other write can slip in
+            if self.tracker is not None:
+                self.tracker.mark(path)
+
+    def has_pending(self, path=None):
+        """True if a save (of `path`, or of any file) is still waiting to be written"""
+        with self.cond:
+            return bool(self.pending) if path is None else Path(path) in self.pending
+
+    def flush(self):
+        """Write everything pending now, in the calling thread"""
+        self.write_pending(everything=True)
+
+    def close(self):
+        """Flush and stop the background thread"""
+        self.flush()
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        atexit.unregister(self.flush)
@@ -0,0 +1,184 @@
+"""
+Incremental pinyin matcher
+Grade pinyin one keystroke at a time, accepting tone numbers, tone marks and v/ü
+"""
+
+from functools import lru_cache
+
+from pinyin_syllables import plain_letter, segment
+
+
+# Per-syllable status
+PENDING = 'pending'     # not reached yet
+TYPING = 'typing'       # being typed
+OK = 'ok'               # letters and tone right
+TONE = 'tone'           # letters right, tone wrong or missing
+WRONG = 'wrong'         # letters wrong
+
+SEPARATORS = frozenset(" '’-,.…·")
+DIGITS = frozenset('0123456789')
+
+
+class PinyinMatcher:
+    """A target answer compiled for letter-by-letter matching
+
+    The target's syllables are flattened into one string of plain letters
+    with, for each position, the syllable it belongs to. A syllable's tone
+    may be typed as a tone mark on any of its letters, as a digit after
+    its last letter (ni3hao3), or as a digit straight after the marked
+    vowel (ha3o, the form shown by convert_tone_marks). The neutral tone
+    is typed as 5, 0 or nothing. Spaces and apostrophes are optional
+    between syllables.
+
+    syllables may be passed when the target is already segmented
+    (vocabulary Words carry theirs).
+    """
+
+    def __init__(self, target, syllables=None):
+        self.target = target
+        self.syllables = segment(target) if syllables is None else syllables
+        self.letters = ''.join(letters for letters, _, _ in self.syllables)
+        self.tones = [tone for _, tone, _ in self.syllables]
+        # Letter positions where each syllable starts and ends
+        self.starts = []
+        self.ends = []
+        # Position just after the marked letter, or -1
+        self.mark_ends = []
+        pos = 0
+        for letters, _, mark in self.syllables:
+            self.starts.append(pos)
+            self.mark_ends.append(pos + mark + 1 if mark >= 0 else -1)
+            pos += len(letters)
+            self.ends.append(pos)
+        # Positions of a 'u' that is really ü (ju, qu, xu, yu), where v is accepted too
+        self.umlauts = frozenset(start + 1 for start, (letters, _, _) in zip(self.starts, self.syllables)
+                                 if letters[:2] in ('ju', 'qu', 'xu', 'yu'))
+
+    def __len__(self):
+        return len(self.syllables)
+
+    def accepts(self, pos, letter):
+        """True if letter may be typed at letter position pos"""
+        return letter == self.letters[pos] or (letter == 'v' and pos in self.umlauts)
+
+    def start(self):
+        """Return a fresh MatchState"""
+        return MatchState(self)
+
+    def feed(self, text):
+        """Return the MatchState after typing text"""
+        state = MatchState(self)
+        for ch in text:
+            state.push(ch)
+        return state
+
+    def matches(self, text):
+        """True if text is a complete, correct answer"""
+        return self.feed(text.strip()).correct()
+
+
+class MatchState:
+    """Progress through a PinyinMatcher, updated in O(1) per character
+
+    push() consumes one character and pop() undoes the last one, so an
+    input box can follow typing and backspacing without re-reading the
+    whole text.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.pos = 0            # letters matched
+        self.syllable = 0       # syllable being typed
+        self.tone = None        # tone typed for it so far
+        self.failed = False     # letters stopped matching
+        self.status = [PENDING] * len(matcher)
+        # (pos, syllable, tone, failed, [(index, old status), ...]) per push
+        self.history = []
+
+    def __len__(self):
+        """Number of characters consumed"""
+        return len(self.history)
+
+    def push(self, ch):
+        """Consume one typed character"""
+        self.history.append((self.pos, self.syllable, self.tone, self.failed, []))
+        if self.failed:
+            return
+        m = self.matcher
+        letter, mark = plain_letter(ch)
+        s = self.syllable
+        at_end = s < len(m) and self.pos == m.ends[s]
+
+        if letter in SEPARATORS or letter.isspace():
+            if at_end:
+                self.close(self.tone)
+            elif s < len(m) and self.pos != m.starts[s]:
+                self.fail()
+        elif letter in DIGITS:
+            tone = int(letter)
+            tone = 0 if tone == 5 else tone
+            if tone > 5 or self.tone is not None or s >= len(m):
+                self.fail()
+            elif at_end:
+                self.close(tone)
+            elif self.pos == m.mark_ends[s]:
+                self.tone = tone
+            else:
+                self.fail()
+        else:
+            if at_end:
+                # A letter after a finished syllable starts the next one
+                self.close(self.tone)
+                s = self.syllable
+            if s >= len(m) or not m.accepts(self.pos, letter):
+                self.fail()
+                return
+            self.pos += 1
+            self.set(s, TYPING)
+            if mark is not None:
+                if self.tone is not None:
+                    self.fail()
+                    return
+                self.tone = mark
+
+    def pop(self):
+        """Undo the last push()"""
+        self.pos, self.syllable, self.tone, self.failed, changes = self.history.pop()
+        for index, old in reversed(changes):
+            self.status[index] = old
+
+    def set(self, index, value):
+        if self.status[index] != value:
+            self.history[-1][4].append((index, self.status[index]))
+            self.status[index] = value
+
+    def close(self, tone):
+        """Finish the current syllable with the tone typed for it"""
+        s = self.syllable
+        self.set(s, OK if (tone or 0) == self.matcher.tones[s] else TONE)
+        self.syllable += 1
+        self.tone = None
+
+    def fail(self):
+        self.failed = True
+        if self.status:
+            # Extra input after the last syllable counts against it
+            self.set(min(self.syllable, len(self.status) - 1), WRONG)
+
+    def statuses(self):
+        """Per-syllable status as if the input ended here"""
+        status = list(self.status)
+        s = self.syllable
+        if not self.failed and s < len(status) and self.pos == self.matcher.ends[s]:
+            status[s] = OK if (self.tone or 0) == self.matcher.tones[s] else TONE
+        return status
+
+    def correct(self):
+        """True if the input so far is a complete, correct answer"""
+        return bool(self.status) and all(status == OK for status in self.statuses())
+
+
+@lru_cache(maxsize=4096)
+def compile_matcher(target, syllables=None):
+    """Return the (shared, immutable) PinyinMatcher for a target answer"""
+    return PinyinMatcher(target, syllables)
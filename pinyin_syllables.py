@@ -0,0 +1,342 @@
+"""
+Pinyin syllable tokenizer
+Split tone-marked pinyin such as 'xīngqīyī' or 'méi guān xì' into syllables
+"""
+
+import sys
+from array import array
+from functools import lru_cache
+
+# Every syllable of standard Mandarin, plus erhua 'r' and the interjections
+# n/ng/m/hm. ü is written v, as learners type it.
+SYLLABLES = frozenset("""
+a o e ai ei ao ou an en ang eng er
+yi ya yo ye yao you yan yin yang ying yong wu wa wo wai wei wan wen wang weng
+yu yue yuan yun
+ba bo bai bei bao ban ben bang beng bi bie biao bian bin bing bu
+pa po pai pei pao pou pan pen pang peng pi pie piao pian pin ping pu
+ma mo me mai mei mao mou man men mang meng mi mie miao miu mian min ming mu
+fa fo fei fou fan fen fang feng fu
+da de dai dei dao dou dan den dang deng dong di dia die diao diu dian ding
+du duo dui duan dun
+ta te tai tao tou tan tang teng tong ti tie tiao tian ting tu tuo tui tuan tun
+na ne nai nei nao nou nan nen nang neng nong ni nie niao niu nian nin niang
+ning nu nuo nuan nv nve
+la le lo lai lei lao lou lan lang leng long li lia lie liao liu lian lin liang
+ling lu luo luan lun lv lve
+ga ge gai gei gao gou gan gen gang geng gong gu gua guo guai gui guan gun guang
+ka ke kai kei kao kou kan ken kang keng kong ku kua kuo kuai kui kuan kun kuang
+ha he hai hei hao hou han hen hang heng hong hu hua huo huai hui huan hun huang
+ji jia jie jiao jiu jian jin jiang jing jiong ju jue juan jun
+qi qia qie qiao qiu qian qin qiang qing qiong qu que quan qun
+xi xia xie xiao xiu xian xin xiang xing xiong xu xue xuan xun
+zha zhe zhi zhai zhei zhao zhou zhan zhen zhang zheng zhong zhu zhua zhuo
+zhuai zhui zhuan zhun zhuang
+cha che chi chai chao chou chan chen chang cheng chong chu chua chuo chuai
+chui chuan chun chuang
+sha she shi shai shei shao shou shan shen shang sheng shu shua shuo shuai
+shui shuan shun shuang
+re ri rao rou ran ren rang reng rong ru rua ruo rui ruan run
+za ze zi zai zei zao zou zan zen zang zeng zong zu zuo zui zuan zun
+ca ce ci cai cao cou can cen cang ceng cong cu cuo cui cuan cun
+sa se si sai sao sou san sen sang seng song su suo sui suan sun
+r n ng m hm
+""".split())
+
+# Stable numbering for compact storage; UNKNOWN marks a run that is not pinyin
+SYLLABLE_LIST = tuple(sorted(SYLLABLES))
+SYLLABLE_IDS = {syllable: i for i, syllable in enumerate(SYLLABLE_LIST)}
+UNKNOWN = 0xFFFF
+
+# Zero initial is ''; y and w are kept as written
+INITIALS = ('', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l', 'g', 'k', 'h', 'j', 'q', 'x',
+            'zh', 'ch', 'sh', 'r', 'z', 'c', 's', 'y', 'w')
+# Syllables that are all final: interjections and erhua
+WHOLE_FINALS = frozenset(('n', 'ng', 'm', 'hm', 'r'))
+
+
+def initial_final(syllable):
+    """Split a plain syllable into (initial, final)"""
+    if syllable not in WHOLE_FINALS:
+        for length in (2, 1):
+            if syllable[:length] in INITIALS and len(syllable) > length:
+                return syllable[:length], syllable[length:]
+    return '', syllable
+
+
+FINALS = tuple(sorted({initial_final(s)[1] for s in SYLLABLE_LIST}))
+INITIAL_IDS = {initial: i for i, initial in enumerate(INITIALS)}
+FINAL_IDS = {final: i for i, final in enumerate(FINALS)}
+# Per syllable id: index into INITIALS / FINALS
+SYLLABLE_INITIALS = array('B', (INITIAL_IDS[initial_final(s)[0]] for s in SYLLABLE_LIST))
+SYLLABLE_FINALS = array('B', (FINAL_IDS[initial_final(s)[1]] for s in SYLLABLE_LIST))
+
+
+def build_trie(words):
+    """Nested dicts keyed by letter; the key '' marks the end of a word"""
+    root = {}
+    for word in words:
+        node = root
+        for letter in word:
+            node = node.setdefault(letter, {})
+        node[''] = True
+    return root
+
+
+TRIE = build_trie(SYLLABLES)
+
+# Inside a word these need an apostrophe before them ('xī'ān', 'fāng'àn');
+# 'er' is left out because the word lists write 'fǎnér', 'yīngér'
+WORD_INITIAL_ONLY = (frozenset(s for s in SYLLABLES if s[0] in 'aoe')
+                     | {'n', 'ng', 'm', 'hm'}) - {'er'}
+
+# Tone-marked letter -> (plain letter, tone)
+TONE_MARKS = {
+    'ā': ('a', 1), 'á': ('a', 2), 'ǎ': ('a', 3), 'à': ('a', 4),
+    'ē': ('e', 1), 'é': ('e', 2), 'ě': ('e', 3), 'è': ('e', 4),
+    'ī': ('i', 1), 'í': ('i', 2), 'ǐ': ('i', 3), 'ì': ('i', 4),
+    'ō': ('o', 1), 'ó': ('o', 2), 'ǒ': ('o', 3), 'ò': ('o', 4),
+    'ū': ('u', 1), 'ú': ('u', 2), 'ǔ': ('u', 3), 'ù': ('u', 4),
+    'ǖ': ('v', 1), 'ǘ': ('v', 2), 'ǚ': ('v', 3), 'ǜ': ('v', 4),
+    'ń': ('n', 2), 'ň': ('n', 3), 'ǹ': ('n', 4), 'ḿ': ('m', 2)
+}
+
+
+def plain_letter(ch):
+    """Return (letter, tone) for one input character; tone is None when unmarked"""
+    ch = ch.lower()
+    if ch in TONE_MARKS:
+        return TONE_MARKS[ch]
+    if ch == 'ü':
+        return 'v', None
+    return ch, None
+
+
+def syllable_ends(letters, start):
+    """Ends of the syllables starting at letters[start], longest first"""
+    ends = []
+    node = TRIE
+    for i in range(start, len(letters)):
+        node = node.get(letters[i])
+        if node is None:
+            break
+        if '' in node:
+            ends.append(i + 1)
+    ends.reverse()
+    return ends
+
+
+def split_chunk(letters, tones, strict=True):
+    """Split one run of letters into syllables, or return None
+
+    The trie gives the syllables that can start at each position; the
+    longest is taken first, backtracking when the rest cannot be split.
+    A syllable may carry at most one tone mark, which settles cases like
+    'xīān' (xī ān, not xiān). When strict, a vowel-initial syllable can
+    only start the run, so 'bàngōng' is bàn gōng, and erhua 'r' can only
+    end it.
+    """
+    n = len(letters)
+
+    def allowed(start, end):
+        if sum(1 for t in tones[start:end] if t) > 1:
+            return False
+        if strict:
+            syllable = letters[start:end]
+            if start and syllable in WORD_INITIAL_ONLY:
+                return False
+            if syllable == 'r' and end != n:
+                return False
+        return True
+
+    # One entry per syllable taken so far: (start, remaining candidate ends)
+    stack = []
+    start = 0
+    while start < n:
+        candidates = [end for end in syllable_ends(letters, start) if allowed(start, end)]
+        while not candidates:
+            if not stack:
+                return None
+            # Backtrack: take the next shorter syllable at an earlier position
+            start, candidates = stack.pop()
+        end = candidates.pop(0)
+        stack.append((start, candidates))
+        start = end
+
+    result = []
+    for i, (start, _) in enumerate(stack):
+        end = stack[i + 1][0] if i + 1 < len(stack) else n
+        tone, mark = 0, -1
+        for j in range(start, end):
+            if tones[j]:
+                tone, mark = tones[j], j - start
+        result.append((start, end, tone, mark))
+    return result
+
+
+def split_syllables(pinyin):
+    """Split tone-marked pinyin into (letters, tone, mark) tuples
+
+    letters is the syllable without tone marks (ü written v), tone is 1-4
+    or 0 for the neutral tone, and mark is the index of the marked letter
+    in the syllable (-1 if unmarked). Anything that is not a letter
+    separates syllables. A run that is not valid pinyin becomes a single
+    syllable so callers can still compare it letter by letter.
+    """
+    syllables = []
+    letters, tones = [], []
+
+    def flush():
+        if not letters:
+            return
+        text = ''.join(letters)
+        parts = split_chunk(text, tones) or split_chunk(text, tones, strict=False)
+        if parts is None:
+            marked = [(i, t) for i, t in enumerate(tones) if t]
+            mark, tone = marked[0] if marked else (-1, 0)
+            syllables.append((text, tone, mark))
+        else:
+            syllables.extend((text[start:end], tone, mark) for start, end, tone, mark in parts)
+        letters.clear()
+        tones.clear()
+
+    for ch in pinyin:
+        letter, tone = plain_letter(ch)
+        if letter.isalpha() and letter.isascii():
+            letters.append(letter)
+            tones.append(tone)
+        else:
+            flush()
+    flush()
+    return syllables
+
+
+@lru_cache(maxsize=4096)
+def segment(pinyin):
+    """Cached split_syllables(), as a tuple"""
+    return tuple(split_syllables(pinyin))
+
+
+def word_syllables(word):
+    """Syllables of a word: precomputed for vocabulary Words, cached otherwise"""
+    syllables = getattr(word, 'syllables', None)
+    if syllables is not None:
+        return syllables
+    return segment(word['pinyin'])
+
+
+class Segmentation:
+    """Syllables of a whole word list, stored column-wise
+
+    Word i owns syllables offsets[i]:offsets[i + 1] of the flat ids
+    (SYLLABLE_LIST index, or UNKNOWN), tones (0-4) and marks (index of the
+    marked letter, -1 if none) arrays. initial_ids and final_ids index
+    INITIALS and FINALS, for statistics and search over the whole list.
+    """
+
+    def __init__(self, offsets, ids, tones, marks, pinyin=None):
+        self.offsets = offsets
+        self.ids = ids
+        self.tones = tones
+        self.marks = marks
+        # Fallback for words with syllables outside the inventory
+        self.pinyin = pinyin
+        self._initial_ids = None
+        self._final_ids = None
+
+    @classmethod
+    def build(cls, pinyins):
+        """Segment every pinyin string once"""
+        offsets, ids, tones, marks = array('I', [0]), array('H'), array('B'), array('b')
+        for pinyin in pinyins:
+            for letters, tone, mark in segment(pinyin):
+                ids.append(SYLLABLE_IDS.get(letters, UNKNOWN))
+                tones.append(tone)
+                marks.append(mark)
+            offsets.append(len(ids))
+        return cls(offsets, ids, tones, marks)
+
+    def to_bytes(self):
+        """Serialized arrays: count, offsets, ids, tones, marks (little-endian)"""
+        offsets, ids = array('I', self.offsets), array('H', self.ids)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+            ids.byteswap()
+        return b''.join((offsets.tobytes(), ids.tobytes(), self.tones.tobytes(), self.marks.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data, count, pinyin=None):
+        """Inverse of to_bytes() for a list of count words"""
+        offsets = array('I')
+        offsets.frombytes(data[:4 * (count + 1)])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        total = offsets[-1]
+        pos = 4 * (count + 1)
+        ids = array('H')
+        ids.frombytes(data[pos:pos + 2 * total])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        pos += 2 * total
+        tones = array('B', data[pos:pos + total])
+        marks = array('b')
+        marks.frombytes(data[pos + total:pos + 2 * total])
+        return cls(offsets, ids, tones, marks, pinyin)
+
+    @staticmethod
+    def size(count, total):
+        """Serialized size for count words with total syllables"""
+        return 4 * (count + 1) + 4 * total
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def syllables(self, i):
+        """(letters, tone, mark) tuples of word i, like split_syllables()"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        ids = self.ids[start:end]
+        if UNKNOWN in ids:
+            return segment(self.pinyin(i))
+        return tuple((SYLLABLE_LIST[s], t, m)
+                     for s, t, m in zip(ids, self.tones[start:end], self.marks[start:end]))
+
+    @property
+    def initial_ids(self):
+        if self._initial_ids is None:
+            self._initial_ids = array('B', (0 if s == UNKNOWN else SYLLABLE_INITIALS[s] for s in self.ids))
+        return self._initial_ids
+
+    @property
+    def final_ids(self):
+        if self._final_ids is None:
+            self._final_ids = array('B', (0 if s == UNKNOWN else SYLLABLE_FINALS[s] for s in self.ids))
+        return self._final_ids
+
+    def initials(self, i):
+        """Initials of word i's syllables ('' for none)"""
+        return [INITIALS[x] for x in self.initial_ids[self.offsets[i]:self.offsets[i + 1]]]
+
+    def finals(self, i):
+        """Finals of word i's syllables"""
+        return [FINALS[x] for x in self.final_ids[self.offsets[i]:self.offsets[i + 1]]]
+
+    def word_tones(self, i):
+        """Tones of word i's syllables (0 for neutral)"""
+        return list(self.tones[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, initial=None, final=None, tone=None):
+        """Indices of words having a syllable with the given initial/final/tone"""
+        initial_id = None if initial is None else INITIAL_IDS.get(initial, -1)
+        final_id = None if final is None else FINAL_IDS.get(final, -1)
+        initial_ids, final_ids, offsets = self.initial_ids, self.final_ids, self.offsets
+        found = []
+        word = 0
+        for j in range(len(self.ids)):
+            while offsets[word + 1] <= j:
+                word += 1
+            if ((initial_id is None or initial_ids[j] == initial_id)
+                    and (final_id is None or final_ids[j] == final_id)
+                    and (tone is None or self.tones[j] == tone)
+                    and (not found or found[-1] != word)):
+                found.append(word)
+        return found
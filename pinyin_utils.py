@@ -0,0 +1,34 @@
+"""
+Pinyin helpers shared by the CLI, GUI and server
+"""
+
+from pinyin_matcher import compile_matcher
+
+
+TONE_MAP = {
+    'ā': 'a1', 'á': 'a2', 'ǎ': 'a3', 'à': 'a4',
+    'ē': 'e1', 'é': 'e2', 'ě': 'e3', 'è': 'e4',
+    'ī': 'i1', 'í': 'i2', 'ǐ': 'i3', 'ì': 'i4',
+    'ō': 'o1', 'ó': 'o2', 'ǒ': 'o3', 'ò': 'o4',
+    'ū': 'u1', 'ú': 'u2', 'ǔ': 'u3', 'ù': 'u4',
+    'ǖ': 'ü1', 'ǘ': 'ü2', 'ǚ': 'ü3', 'ǜ': 'ü4',
+    'ü': 'v', 'ń': 'n2', 'ň': 'n3', 'ǹ': 'n4'
+}
+
+
+def convert_tone_marks(pinyin):
+    """Convert tone marks to numbers for display"""
+    result = pinyin
+    for mark, num in TONE_MAP.items():
+        result = result.replace(mark, num)
+    return result
+
+
+def normalize_pinyin(pinyin):
+    """Normalize pinyin for comparison (remove spaces, lowercase)"""
+    return pinyin.lower().replace(' ', '').replace(',', '')
+
+
+def check_pinyin(user_input, correct_pinyin):
+    """Check if user's pinyin (tone numbers or tone marks) matches the tone-marked answer"""
+    return compile_matcher(correct_pinyin).matches(user_input)
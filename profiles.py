@@ -0,0 +1,51 @@
+"""
+Learner profiles
+Each profile is a directory holding one learner's config, progress and history
+"""
+
+import re
+from pathlib import Path
+
+
+PROFILES_DIR = Path(__file__).parent / "profiles"
+PROFILE_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+class Profile:
+    """Paths of one learner's state files
+
+    The unnamed default profile keeps using the files beside the scripts,
+    so existing installs carry on unchanged. Named profiles live in
+    profiles/<name>/.
+    """
+
+    def __init__(self, name=None, profiles_dir=PROFILES_DIR):
+        if name is not None and (not PROFILE_NAME.match(name) or name in ('.', '..')):
+            raise ValueError(f"Invalid profile name: {name!r}")
+        self.name = name
+        self.directory = Path(__file__).parent if name is None else Path(profiles_dir) / name
+
+        self.config_file = self.directory / "config.json"
+        self.progress_file = self.directory / "progress.json"
+        self.word_ids_file = self.directory / "progress.ids"
+        self.revision_file = self.directory / "revision.txt"
+        self.revision_archive_file = self.directory / "revision_archive.txt"
+        self.journal_file = self.directory / "reviews.jsonl"
+        self.stats_file = self.directory / "stats.json"
+
+    @property
+    def display_name(self):
+        return self.name or "default"
+
+    def ensure_directory(self):
+        """Create the profile directory if needed"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+
+def list_profiles(profiles_dir=PROFILES_DIR):
+    """Return the names of all named profiles, sorted"""
+    profiles_dir = Path(profiles_dir)
+    if not profiles_dir.is_dir():
+        return []
+    return sorted(p.name for p in profiles_dir.iterdir()
+                  if p.is_dir() and PROFILE_NAME.match(p.name))
@@ -0,0 +1,278 @@
+"""
+Append-only review journal
+Records every answered card and keeps an aggregated per-word index
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from persistence import file_lock, write_atomic
+
+
+# Reused for every line: json.dumps() with options builds a new encoder per call
+LINE_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+class ReviewJournal:
+    """JSON-lines log of reviews with a compact aggregated index
+
+    Each event is one line: {"ts", "word", "mode", "correct", "latency"}.
+    Events are buffered in memory and written (and fsynced) in batches.
+    The index stores per-word totals plus the byte offset of the log it
+    already covers, so loading it only replays the unseen tail.
+
+    Several instances may share one journal: every write happens under the
+    journal's file lock after re-reading the index, so events appended by
+    another process are folded in rather than miscounted.
+    """
+
+    def __init__(self, journal_file, index_file=None, batch_size=20,
+                 max_bytes=1024 * 1024, keep_archives=3):
+        self.journal_file = Path(journal_file)
+        self.index_file = Path(index_file or self.index_path(self.journal_file))
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.keep_archives = keep_archives
+
+        self.buffer = []
+        self.index = {"offset": 0, "words": {}}
+        with file_lock(self.journal_file):
+            self.load_index()
+
+    @staticmethod
+    def empty_entry():
+        """Return a fresh per-word aggregate"""
+        return {
+            "reviews": 0,
+            "correct": 0,
+            "streak": 0,
+            "last_review": 0.0,
+            "latency_total": 0.0,
+            "latency_count": 0
+        }
+
+    def apply_event(self, event):
+        """Fold a single event into the in-memory index"""
+        self.fold_event(self.index["words"], event)
+
+    @classmethod
+    def fold_event(cls, words, event):
+        """Fold a single event into a per-word aggregate mapping"""
+        entry = words.get(event["word"])
+        if entry is None:
+            entry = words[event["word"]] = cls.empty_entry()
+        entry["reviews"] += 1
+        if event["correct"]:
+            entry["correct"] += 1
+            entry["streak"] += 1
+        else:
+            entry["streak"] = 0
+        entry["last_review"] = max(entry["last_review"], event["ts"])
+        if event.get("latency") is not None:
+            entry["latency_total"] += event["latency"]
+            entry["latency_count"] += 1
+
+    @staticmethod
+    def encode(events):
+        """Serialize events as journal lines"""
+        encode = LINE_ENCODER.encode
+        return ''.join([encode(event) + '\n' for event in events]).encode('utf-8')
+
+    def load_index(self):
+        """Load the index and replay any journal lines written after it
+
+        Must be called with the journal lock held.
+        """
+        self.index, replayed = self.read_index(self.journal_file, self.index_file)
+        if replayed:
+            self.save_index()
+
+    @classmethod
+    def read_index(cls, journal_file, index_file):
+        """Return the saved index with the complete journal lines past its offset
+        folded in, and whether there were any; reads only, never writes"""
+        index = {"offset": 0, "words": {}}
+        if index_file.exists():
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    index.update(json.load(f))
+            except (OSError, ValueError):
+                index = {"offset": 0, "words": {}}
+
+        if not journal_file.exists():
+            index["offset"] = 0
+            return index, False
+
+        size = journal_file.stat().st_size
+        if index["offset"] > size:
+            # Journal was replaced behind our back; rebuild from scratch
+            index = {"offset": 0, "words": {}}
+
+        if index["offset"] >= size:
+            return index, False
+        with open(journal_file, 'rb') as f:
+            f.seek(index["offset"])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partial trailing write
+                index["offset"] += len(line)
+                try:
+                    cls.fold_event(index["words"], json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+        return index, True
+
+    @classmethod
+    def read_stats(cls, journal_file, index_file=None):
+        """Per-word aggregates of a journal, for readers that must not touch it
+
+        No lock is taken and nothing is saved: the index is replaced
+        atomically and the journal only grows between rotations, so the
+        index plus the complete lines past its offset is a consistent view.
+        """
+        journal_file = Path(journal_file)
+        index, _ = cls.read_index(journal_file, Path(index_file or cls.index_path(journal_file)))
+        return index["words"]
+
+    @staticmethod
+    def index_path(journal_file):
+        """Default index file of a journal"""
+        return journal_file.with_name(journal_file.stem + "_index.json")
+
+    def save_index(self):
+        """Atomically write the index next to the journal"""
+        write_atomic(self.index_file, json.dumps(self.index, ensure_ascii=False, separators=(',', ':')))
+
+    def record(self, word, mode, correct, latency=None, now=None):
+        """Queue a review event; writes happen once a batch is full"""
+        event = {
+            "ts": round(time.time() if now is None else now, 3),
+            "word": word['chinese'],
+            "mode": mode,
+            "correct": bool(correct),
+            "latency": None if latency is None else round(latency, 4)
+        }
+        self.buffer.append(event)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered events, fsync once and update the index"""
+        if not self.buffer:
+            return
+
+        data = self.encode(self.buffer)
+        with file_lock(self.journal_file):
+            # Pick up whatever other instances appended since we last looked
+            self.load_index()
+            with open(self.journal_file, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            for event in self.buffer:
+                self.apply_event(event)
+            self.index["offset"] += len(data)
+            self.buffer = []
+            self.save_index()
+
+            if self.index["offset"] >= self.max_bytes:
+                self.rotate_locked()
+
+    def rotate(self):
+        """Archive the current journal; the index keeps the aggregates"""
+        self.flush()
+        with file_lock(self.journal_file):
+            self.load_index()
+            self.rotate_locked()
+
+    def rotate_locked(self):
+        """Rotate with the journal lock already held"""
+        if not self.journal_file.exists():
+            return
+
+        for n in range(self.keep_archives - 1, 0, -1):
+            older = self.journal_file.with_name(f"{self.journal_file.name}.{n}")
+            if older.exists():
+                os.replace(older, self.journal_file.with_name(f"{self.journal_file.name}.{n + 1}"))
+        if self.keep_archives > 0:
+            os.replace(self.journal_file, self.journal_file.with_name(f"{self.journal_file.name}.1"))
+        else:
+            self.journal_file.unlink()
+
+        self.index["offset"] = 0
+        self.save_index()
+
+    def compact(self):
+        """Fold everything into the index and drop all raw history"""
+        self.flush()
+        with file_lock(self.journal_file):
+            self.load_index()
+            for n in range(1, self.keep_archives + 2):
+                archive = self.journal_file.with_name(f"{self.journal_file.name}.{n}")
+                if archive.exists():
+                    archive.unlink()
+            if self.journal_file.exists():
+                self.journal_file.unlink()
+            self.index["offset"] = 0
+            self.save_index()
+
+    def replace(self, source, words=None):
+        """Swap in another journal file wholesale, dropping archives
+
+        `words` may hold the per-word aggregates of the new file (see
+        fold_event) when the caller already has them; otherwise the index
+        is rebuilt by replaying the file.
+        """
+        self.buffer = []
+        with file_lock(self.journal_file):
+            for n in range(1, self.keep_archives + 2):
+                archive = self.journal_file.with_name(f"{self.journal_file.name}.{n}")
+                if archive.exists():
+                    archive.unlink()
+            os.replace(source, self.journal_file)
+            if words is None:
+                if self.index_file.exists():
+                    self.index_file.unlink()
+                self.load_index()
+            else:
+                self.index = {"offset": self.journal_file.stat().st_size, "words": words}
+                self.save_index()
+
+    def iter_events(self):
+        """Yield raw events from archives (oldest first) and the live journal"""
+        self.flush()
+        files = [self.journal_file.with_name(f"{self.journal_file.name}.{n}")
+                 for n in range(self.keep_archives, 0, -1)]
+        files.append(self.journal_file)
+        for path in files:
+            if not path.exists():
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def word_stats(self, chinese):
+        """Return the aggregate for one word (zeros if never reviewed)
+
+        Answers still waiting in the buffer are included.
+        """
+        entry = self.index["words"].get(chinese)
+        words = {chinese: dict(entry) if entry else self.empty_entry()}
+        for event in self.buffer:
+            if event["word"] == chinese:
+                self.fold_event(words, event)
+        return words[chinese]
+
+    def all_stats(self):
+        """Return the aggregate for every reviewed word"""
+        return self.index["words"]
+
+    def close(self):
+        """Flush pending events"""
+        self.flush()
@@ -0,0 +1,225 @@
+"""
+Bounded revision list
+Keep a learner's revision words under a capacity, evicting by a pluggable mastery policy into an archive
+"""
+
+import heapq
+import itertools
+import time
+
+from persistence import ChangeTracker, file_lock, write_atomic
+from review_journal import ReviewJournal
+
+
+DEFAULT_CAPACITY = 200
+DEFAULT_POLICY = 'streak'
+
+
+def revision_line(word):
+    """Format a word in the revision.txt layout: Chinese|Pinyin|Meaning|Han_Viet|Nghia_Tieng_Viet|Cach_dung"""
+    return (f"{word['chinese']}|{word['pinyin']}|{word['meaning']}|"
+            f"{word.get('han_viet', '')}|{word.get('nghia_tieng_viet', '')}|"
+            f"{word.get('cach_dung', '')}\n")
+
+
+def parse_revision_line(line):
+    """Word dict of one revision.txt line, or None for a malformed line"""
+    parts = line.strip().split('|')
+    if len(parts) < 3:
+        return None
+    return {
+        'chinese': parts[0],
+        'pinyin': parts[1],
+        'meaning': parts[2],
+        'han_viet': parts[3] if len(parts) > 3 else '',
+        'nghia_tieng_viet': parts[4] if len(parts) > 4 else '',
+        'cach_dung': parts[5] if len(parts) > 5 else ''
+    }
+
+
+def archive_words(path, words):
+    """Append evicted words to the archive file (revision.txt layout)"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(''.join(revision_line(word) for word in words))
+
+
+def error_weight(stats):
+    """Laplace-smoothed error rate damped by the current streak (as in AdaptiveSampler)"""
+    reviews = stats.get('reviews', 0)
+    error_rate = (reviews - stats.get('correct', 0) + 1) / (reviews + 2)
+    return error_rate / (1 + stats.get('streak', 0))
+
+
+# Eviction order: the word with the smallest key goes first. Keys are built
+# from per-word aggregates in the review journal's layout.
+POLICIES = {
+    # Longest run of correct answers, i.e. the most mastered word
+    'streak': lambda stats: (-stats.get('streak', 0), stats.get('last_review', 0.0)),
+    # Least recently reviewed
+    'lru': lambda stats: (stats.get('last_review', 0.0),),
+    # Lowest error weight
+    'weight': lambda stats: (error_weight(stats), stats.get('last_review', 0.0))
+}
+
+
+class RevisionSet:
+    """Revision words with a capacity and an eviction heap
+
+    Each word's aggregates are seeded from `stats(chinese)` (normally
+    ReviewJournal.word_stats) when it joins and then kept current by
+    record(). A word's heap entry is replaced rather than updated when its
+    stats change: the old entry stays behind and is skipped when popped,
+    so add, record and evict are all O(log n). The heap is rebuilt once
+    stale entries outnumber live ones. A capacity of 0 means unbounded.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, policy=DEFAULT_POLICY, stats=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown revision policy: {policy!r}")
+        self.capacity = capacity
+        self.priority = POLICIES[policy]
+        self.source = stats or (lambda chinese: ReviewJournal.empty_entry())
+        self.stats = {}
+        self.words = {}
+        self.heap = []
+        self.entries = {}
+        self.serial = itertools.count()
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, chinese):
+        return chinese in self.words
+
+    def key(self, chinese):
+        return self.priority(self.stats[chinese])
+
+    def reset(self, words):
+        """Replace the contents (in file order) and rebuild the heap in O(n)"""
+        self.words = {word['chinese']: word for word in words}
+        self.stats = {chinese: self.source(chinese) for chinese in self.words}
+        self.rebuild()
+
+    def rebuild(self):
+        self.entries = {chinese: next(self.serial) for chinese in self.words}
+        self.heap = [(self.key(chinese), serial, chinese) for chinese, serial in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def push(self, chinese):
+        serial = next(self.serial)
+        self.entries[chinese] = serial
+        heapq.heappush(self.heap, (self.key(chinese), serial, chinese))
+        if len(self.heap) > 2 * len(self.words) + 16:
+            self.rebuild()
+
+    def add(self, word):
+        """Add a word; returns the words evicted to stay within capacity"""
+        chinese = word['chinese']
+        if chinese in self.words:
+            return []
+        self.words[chinese] = word
+        self.stats[chinese] = self.source(chinese)
+        self.push(chinese)
+        return self.shrink()
+
+    def remove(self, chinese):
+        """Drop a word (its heap entry goes stale); returns it, or None"""
+        self.entries.pop(chinese, None)
+        self.stats.pop(chinese, None)
+        return self.words.pop(chinese, None)
+
+    def record(self, chinese, correct, latency=None, now=None):
+        """Fold an answer into a revision word's stats and re-rank it"""
+        if chinese not in self.words:
+            return
+        ReviewJournal.fold_event(self.stats, {
+            "word": chinese,
+            "correct": bool(correct),
+            "ts": time.time() if now is None else now,
+            "latency": latency
+        })
+        self.push(chinese)
+
+    def shrink(self):
+        """Evict words in policy order until the capacity is respected"""
+        evicted = []
+        if not self.capacity:
+            return evicted
+        while len(self.words) > self.capacity and self.heap:
+            _, serial, chinese = heapq.heappop(self.heap)
+            if self.entries.get(chinese) == serial:
+                del self.entries[chinese]
+                del self.stats[chinese]
+                evicted.append(self.words.pop(chinese))
+        return evicted
+
+
+class RevisionStore:
+    """A profile's revision.txt kept in a RevisionSet
+
+    The file stays the source of truth shared with other instances: it is
+    re-read only when another process changed it. Additions are appended;
+    evicted words are moved to the archive file and the list rewritten.
+    """
+
+    def __init__(self, path, archive_path, capacity=DEFAULT_CAPACITY, policy=DEFAULT_POLICY, stats=None):
+        self.path = path
+        self.archive_path = archive_path
+        self.set = RevisionSet(capacity, policy, stats)
+        self.tracker = ChangeTracker()
+        self.loaded = False
+
+    def read(self):
+        """Load the file into the set (caller holds the lock)"""
+        words = []
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    word = parse_revision_line(line)
+                    if word is not None:
+                        words.append(word)
+        self.set.reset(words)
+        self.tracker.mark(self.path)
+        self.loaded = True
+
+    def refresh(self):
+        """Re-read the file if it changed since we last read or wrote it (caller holds the lock)"""
+        if not self.loaded or self.tracker.changed(self.path):
+            self.read()
+
+    def rewrite(self):
+        write_atomic(self.path, ''.join(revision_line(word) for word in self.set.words.values()))
+        self.tracker.mark(self.path)
+
+    def words(self):
+        """The revision words, oldest first"""
+        with file_lock(self.path, shared=True):
+            self.refresh()
+            return list(self.set.words.values())
+
+    def add(self, word):
+        """Add a word, archiving whatever it pushes out; returns the evicted words"""
+        with file_lock(self.path):
+            self.refresh()
+            if word['chinese'] in self.set:
+                return []
+            evicted = self.set.add(word)
+            if evicted:
+                archive_words(self.archive_path, evicted)
+                self.rewrite()
+            else:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(revision_line(word))
+                self.tracker.mark(self.path)
+            return evicted
+
+    def remove(self, word):
+        """Remove a word the learner has mastered"""
+        with file_lock(self.path):
+            self.refresh()
+            if self.set.remove(word['chinese']) is not None:
+                self.rewrite()
+
+    def record(self, word, correct, latency=None, now=None):
+        """Re-rank a word after an answer (no file I/O)"""
+        self.set.record(word['chinese'], correct, latency, now)
@@ -0,0 +1,143 @@
+"""
+Adaptive card sampler for endless flashcard mode
+Draws words with probability proportional to how much they need practice
+"""
+
+import random
+import time
+
+
+class FenwickTree:
+    """Binary indexed tree over non-negative weights
+
+    Supports point updates, prefix sums and weighted search in O(log n).
+    """
+
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.tree = [0.0] * (self.size + 1)
+        self.weights = [0.0] * self.size
+        for i, weight in enumerate(weights):
+            self.weights[i] = weight
+            j = i + 1
+            self.tree[j] += weight
+            parent = j + (j & -j)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[j]
+
+    def update(self, i, weight):
+        """Set the weight at position i"""
+        delta = weight - self.weights[i]
+        self.weights[i] = weight
+        j = i + 1
+        while j <= self.size:
+            self.tree[j] += delta
+            j += j & -j
+
+    def total(self):
+        """Sum of all weights"""
+        result = 0.0
+        j = self.size
+        while j > 0:
+            result += self.tree[j]
+            j -= j & -j
+        return result
+
+    def find(self, value):
+        """Return the first position whose prefix sum exceeds value"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= value:
+                pos = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return min(pos, self.size - 1)
+
+
+class AdaptiveSampler:
+    """Weighted sampler seeded from review-journal aggregates
+
+    A word's weight grows with its error rate, its average response time and
+    the time since it was last reviewed. Each answer re-weights only that
+    word, so drawing and updating both stay O(log n) for large revision lists.
+    """
+
+    MIN_WEIGHT = 0.05
+
+    def __init__(self, words, stats=None, rng=None, now=None):
+        self.words = words
+        self.rng = rng or random.Random()
+        self.positions = {word['chinese']: i for i, word in enumerate(words)}
+        self.stats = []
+        now = time.time() if now is None else now
+        for word in words:
+            entry = (stats or {}).get(word['chinese'], {})
+            self.stats.append({
+                "reviews": entry.get("reviews", 0),
+                "correct": entry.get("correct", 0),
+                "streak": entry.get("streak", 0),
+                "last_review": entry.get("last_review", 0.0),
+                "latency_total": entry.get("latency_total", 0.0),
+                "latency_count": entry.get("latency_count", 0)
+            })
+        self.tree = FenwickTree([self.weight(s, now) for s in self.stats])
+        self.last = None
+
+    def weight(self, stats, now):
+        """Compute the sampling weight for one word's aggregates"""
+        # Laplace-smoothed error rate: unseen words start at 0.5
+        error_rate = (stats["reviews"] - stats["correct"] + 1) / (stats["reviews"] + 2)
+
+        if stats["latency_count"]:
+            avg_latency = stats["latency_total"] / stats["latency_count"]
+            latency_factor = 1.0 + min(avg_latency, 20.0) / 10.0
+        else:
+            latency_factor = 1.5
+
+        if stats["last_review"]:
+            days = max(0.0, now - stats["last_review"]) / 86400
+            recency_factor = 1.0 + min(days, 7.0) / 7.0
+        else:
+            recency_factor = 2.0
+
+        streak_factor = 1.0 / (1 + stats["streak"])
+        return max(self.MIN_WEIGHT, error_rate * latency_factor * recency_factor * streak_factor)
+
+    def next(self):
+        """Draw the next word, never repeating the previous one back to back"""
+        if not self.words:
+            return None
+
+        held = None
+        if self.last is not None and len(self.words) > 1:
+            held = self.tree.weights[self.last]
+            self.tree.update(self.last, 0.0)
+
+        index = self.tree.find(self.rng.random() * self.tree.total())
+
+        if held is not None:
+            self.tree.update(self.last, held)
+        self.last = index
+        return self.words[index]
+
+    def update(self, word, correct, latency=None, now=None):
+        """Fold one answer into the word's stats and re-weight it"""
+        index = self.positions.get(word['chinese'])
+        if index is None:
+            return
+
+        stats = self.stats[index]
+        stats["reviews"] += 1
+        if correct:
+            stats["correct"] += 1
+            stats["streak"] += 1
+        else:
+            stats["streak"] = 0
+        now = time.time() if now is None else now
+        stats["last_review"] = now
+        if latency is not None:
+            stats["latency_total"] += latency
+            stats["latency_count"] += 1
+        self.tree.update(index, self.weight(stats, now))
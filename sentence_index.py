@@ -0,0 +1,166 @@
+"""
+Example sentences
+Split the usage column into sentence, romanization and translation once, indexed per deck
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+
+from persistence import write_atomic
+from vocabulary import RESOURCE_DIR, hsk_file, load_vocabulary
+
+
+FORMAT_VERSION = 1
+SENTENCE_ENDS = '。！？!?…'
+DASH = re.compile(r"\s+[–—-]\s+")
+BLANK = '＿'
+SPEAKER_MARKS = ('：', ':')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def sentence_file(csv_path):
+    """Return the path of the cached sentence index for a CSV file"""
+    return Path(csv_path).with_suffix(".sentences")
+
+
+def is_cjk(ch):
+    """True for CJK characters and punctuation"""
+    return ord(ch) >= 0x2E80
+
+
+def translation_start(text):
+    """Index of the first Latin letter that is not a dialogue speaker ('A：')"""
+    for i, ch in enumerate(text):
+        if ch.isalpha() and not is_cjk(ch) and text[i + 1:i + 2] not in SPEAKER_MARKS:
+            return i
+    return len(text)
+
+
+def parse_example(text, target):
+    """Split '我爱你。Wǒ ài nǐ. – Tôi yêu bạn.' into its parts
+
+    Returns (sentence, romanization, translation, start, end) where
+    sentence[start:end] is the target word, or start = end = -1 when the
+    sentence does not contain it. The Chinese sentence runs up to the
+    last sentence-ending mark before the first Latin letter (speaker labels
+    of dialogues aside); the rest is 'romanization – translation' or just
+    the translation.
+    """
+    text = ' '.join(text.split())
+    first_latin = translation_start(text)
+    cut = first_latin
+    for i in range(first_latin - 1, -1, -1):
+        if text[i] in SENTENCE_ENDS:
+            cut = i + 1
+            break
+    sentence, rest = text[:cut].strip(), text[cut:].strip()
+    if not any(is_cjk(ch) for ch in sentence):
+        sentence, rest = '', text
+    parts = DASH.split(rest, maxsplit=1)
+    if len(parts) == 2:
+        romanization, translation = parts
+    else:
+        romanization, translation = '', rest
+    start = sentence.find(target) if target else -1
+    end = start + len(target) if start >= 0 else -1
+    return sentence, romanization, translation, start, end
+
+
+class SentenceIndex:
+    """Parsed example sentence of every word in a deck
+
+    Rows are (sentence, romanization, translation, start, end) by vocabulary
+    index, so a cloze prompt is a slice, never a search.
+    """
+
+    def __init__(self, vocab, rows):
+        self.vocab = vocab
+        self.rows = rows
+        self.positions = None
+
+    def position(self, word):
+        """Index of a word in the deck, or None if it is not part of it"""
+        if getattr(word, 'vocab', None) is self.vocab:
+            return word.index
+        if self.positions is None:
+            self.positions = {self.vocab[i].chinese: i for i in range(len(self.vocab))}
+        return self.positions.get(word['chinese'])
+
+    def example(self, word):
+        """The parsed row of a word, or None"""
+        i = self.position(word)
+        return None if i is None else self.rows[i]
+
+    def cloze(self, word):
+        """(sentence with the word blanked out, translation), or None"""
+        row = self.example(word)
+        if row is None or row[3] < 0:
+            return None
+        sentence, _, translation, start, end = row
+        return sentence[:start] + BLANK * (end - start) + sentence[end:], translation
+
+    def cloze_words(self, words):
+        """The words of a deck that have a sentence to blank out"""
+        return [word for word in words if self.cloze(word) is not None]
+
+
+def build_rows(vocab):
+    """Parse the example sentence of every word"""
+    return [parse_example(vocab[i]['cach_dung'], vocab[i].chinese) for i in range(len(vocab))]
+
+
+def signature(csv_path):
+    """Header line tying a cached index to the CSV as it is now"""
+    st = os.stat(csv_path)
+    return f"# {FORMAT_VERSION} {st.st_size} {st.st_mtime_ns}"
+
+
+def read_rows(path, csv_path, count):
+    """Rows from a cached index file, or None if it is missing or stale"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.readline().rstrip('\n') != signature(csv_path):
+                return None
+            rows = []
+            for line in f:
+                sentence, romanization, translation, start, end = line.rstrip('\n').split('\t')
+                rows.append((sentence, romanization, translation, int(start), int(end)))
+    except (OSError, ValueError):
+        return None
+    return rows if len(rows) == count else None
+
+
+def open_index(csv_path, vocab):
+    """Read the cached sentence index for a deck, (re)building it when missing or stale"""
+    path = sentence_file(csv_path)
+    rows = read_rows(path, csv_path, len(vocab))
+    if rows is None:
+        rows = build_rows(vocab)
+        lines = [signature(csv_path) + '\n']
+        lines.extend('\t'.join(str(field).replace('\t', ' ') for field in row) + '\n' for row in rows)
+        try:
+            write_atomic(path, ''.join(lines), fsync=False)
+        except OSError:
+            # Read-only install: the index just lives for this process
+            pass
+    return SentenceIndex(vocab, rows)
+
+
+def load_sentences(level, resource_dir=RESOURCE_DIR):
+    """Return the shared SentenceIndex of an HSK level"""
+    path = hsk_file(level, resource_dir)
+    key = str(path)
+    index = _cache.get(key)
+    if index is not None:
+        return index
+
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is None:
+            index = open_index(path, load_vocabulary(level, resource_dir))
+            _cache[key] = index
+    return index
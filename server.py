@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+"""
+Chinese Flashcard Learning System - Server Mode
+Serve decks, sessions, grading and revision lists to many learners over HTTP/JSON
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pinyin_utils
+from learning_stats import LearningStats
+from permutation import new_progress, progress_order
+from persistence import ChangeTracker, file_lock, write_locked
+from profiles import PROFILE_NAME, PROFILES_DIR, Profile
+from review_journal import ReviewJournal
+from revision_set import (DEFAULT_CAPACITY, DEFAULT_POLICY, POLICIES, RevisionSet,
+                          archive_words, parse_revision_line, revision_line)
+from session_engine import SessionEngine
+from vocabulary import HSK_LEVELS, hsk_file, load_vocabulary
+from word_ids import record_ids, sync_progress
+from word_index import load_word_index
+
+
+MAX_BODY = 64 * 1024
+MAX_SESSIONS_PER_USER = 4
+# Most words one GET /decks/<level> returns
+MAX_DECK_PAGE = 500
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def query_int(query, name, default, minimum, maximum):
+    """An integer query parameter within [minimum, maximum]; HTTP 400 otherwise"""
+    value = query.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer") from None
+    if not minimum <= value <= maximum:
+        raise HTTPError(400, f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def available_levels():
+    """The HSK levels whose CSV exists (blocking: call through run_io on the event loop)"""
+    return [level for level in HSK_LEVELS if hsk_file(level).exists()]
+
+
+class UserState:
+    """One learner's config, progress, revision list and open sessions
+
+    State is held in memory. load(), refresh(), write() and flush_reviews()
+    do blocking file I/O and are only ever called through the server's
+    executor.
+    """
+
+    def __init__(self, profile):
+        self.name = profile.name
+        self.profile = profile
+        self.directory = profile.directory
+        self.config_file = profile.config_file
+        self.progress_file = profile.progress_file
+        self.word_ids_file = profile.word_ids_file
+        self.revision_file = profile.revision_file
+        self.revision_archive_file = profile.revision_archive_file
+
+        self.config = self.default_config()
+        self.progress = self.default_progress()
+        self.order = []
+        self.revision = None
+        self.journal = None
+        self.stats = None
+        self.sessions = {}
+        self.lock = asyncio.Lock()
+        self.tracker = ChangeTracker()
+
+    def load(self):
+        """Read all state files (blocking)"""
+        self.profile.ensure_directory()
+        self.read_config()
+        self.read_progress()
+        # Journal flushes are driven by the server, never by record()
+        self.journal = ReviewJournal(self.profile.journal_file, batch_size=float('inf'))
+        self.read_revision()
+        self.stats = LearningStats(self.profile.stats_file)
+        if self.ensure_order() != 'kept' or not self.progress_file.exists():
+            self.write(self.progress_file, self.progress_bytes())
+
+    def refresh(self):
+        """Pick up config, progress and revision files another process saved (blocking)
+
+        The CLI and GUI share the profiles directory; without this their
+        changes would be overwritten by the server's next save. Journal
+        and statistics saves already merge with the file.
+        """
+        config_changed = self.tracker.changed(self.config_file)
+        progress_changed = self.tracker.changed(self.progress_file)
+        if config_changed:
+            self.read_config()
+        if progress_changed:
+            self.read_progress()
+        if config_changed or self.tracker.changed(self.revision_file):
+            self.read_revision()
+        if (config_changed or progress_changed) and self.ensure_order() != 'kept':
+            self.write(self.progress_file, self.progress_bytes())
+
+    @staticmethod
+    def default_config():
+        return {"hsk_level": 1, "words_per_patch": 10,
+                "revision_capacity": DEFAULT_CAPACITY, "revision_policy": DEFAULT_POLICY}
+
+    @staticmethod
+    def default_progress():
+        return {"current_index": 0, "seed": None, "word_count": 0}
+
+    def read_json(self, path, defaults):
+        """Defaults updated from a JSON state file, if present, remembering its version"""
+        with file_lock(path, shared=True):
+            if path.exists():
+                with open(path, 'r', encoding='utf-8') as f:
+                    defaults.update(json.load(f))
+            self.tracker.mark(path)
+        return defaults
+
+    def read_config(self):
+        self.config = self.read_json(self.config_file, self.default_config())
+
+    def read_progress(self):
+        self.progress = self.read_json(self.progress_file, self.default_progress())
+
+    def read_revision(self):
+        """(Re)build the revision set from revision.txt with the configured capacity and policy"""
+        policy = self.config['revision_policy']
+        self.revision = RevisionSet(self.config['revision_capacity'],
+                                    policy if policy in POLICIES else DEFAULT_POLICY,
+                                    stats=self.journal.word_stats)
+        words = []
+        with file_lock(self.revision_file, shared=True):
+            if self.revision_file.exists():
+                with open(self.revision_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        word = parse_revision_line(line)
+                        if word is not None:
+                            words.append(word)
+            self.tracker.mark(self.revision_file)
+        self.revision.reset(words)
+
+    def write(self, path, data):
+        """write_locked() a state file and remember the version as our own (blocking)"""
+        write_locked(path, data)
+        self.tracker.mark(path)
+
+    def words(self):
+        """Return the shared vocabulary for the user's level"""
+        return load_vocabulary(self.config['hsk_level'])
+
+    def ensure_order(self):
+        """Fit the stored order to the deck (blocking); returns 'kept', 'remapped' or 'reset'
+
+        An order made for an earlier version of the CSV is remapped by word
+        ID; only one that cannot be carried over is reshuffled.
+        """
+        words = self.words()
+        self.order, changed = sync_progress(self.progress, self.config['hsk_level'],
+                                            words.word_ids, self.word_ids_file)
+        if self.order is None:
+            self.reset_progress()
+            return 'reset'
+        return 'remapped' if changed else 'kept'
+
+    def reset_progress(self):
+        """Pick a new seed and start from the first patch (blocking)"""
+        words = self.words()
+        self.progress = new_progress(len(words))
+        record_ids(self.progress, self.config['hsk_level'], words.word_ids, self.word_ids_file)
+        self.order = progress_order(self.progress, len(words))
+
+    def total_patches(self):
+        words_per_patch = self.config['words_per_patch']
+        return (len(self.words()) + words_per_patch - 1) // words_per_patch
+
+    def patch_words(self, first_patch, last_patch):
+        """Return the words of patches [first_patch, last_patch)"""
+        words_per_patch = self.config['words_per_patch']
+        words = self.words()
+        indices = self.order[first_patch * words_per_patch:last_patch * words_per_patch]
+        return [words[i] for i in indices]
+
+    def summary(self):
+        return {
+            "user": self.name,
+            "config": self.config,
+            "current_patch": self.progress['current_index'] + 1,
+            "total_patches": self.total_patches(),
+            "total_words": len(self.words()),
+            "revision_words": len(self.revision)
+        }
+
+    def record_answer(self, word, mode, correct, latency=None):
+        """on_answer callback for the session engine (memory only)"""
+        self.journal.record(word, mode, correct, latency)
+        self.stats.record(word, mode, correct, self.config['hsk_level'])
+        self.revision.record(word['chinese'], correct, latency)
+
+    # Serialization happens on the event loop so writers see a consistent
+    # snapshot; only the resulting bytes are handed to the executor.
+    def config_bytes(self):
+        return json.dumps(self.config, indent=2).encode('utf-8')
+
+    def progress_bytes(self):
+        return json.dumps(self.progress, indent=2).encode('utf-8')
+
+    def revision_bytes(self):
+        return ''.join(revision_line(word) for word in self.revision.words.values()).encode('utf-8')
+
+    def save_revision(self, data, evicted=()):
+        """Write revision_bytes(), archiving evicted words first (blocking)"""
+        if evicted:
+            archive_words(self.revision_archive_file, evicted)
+        self.write(self.revision_file, data)
+
+    def flush_reviews(self):
+        """Persist buffered journal events and statistics (blocking)"""
+        self.journal.flush()
+        self.stats.save()
+
+
+class FlashcardServer:
+    def __init__(self, data_dir, flush_every=20):
+        self.data_dir = Path(data_dir)
+        self.flush_every = flush_every
+        self.users = {}
+        self.loading = {}
+        self.routes = [
+            ('GET', r'/health', self.health),
+            ('GET', r'/decks', self.list_decks),
+            ('GET', r'/decks/(\d+)', self.get_deck),
+            ('POST', r'/grade', self.grade),
+            ('GET', r'/users/([^/]+)', self.get_user),
+            ('PUT', r'/users/([^/]+)/config', self.put_config),
+            ('POST', r'/users/([^/]+)/progress', self.post_progress),
+            ('GET', r'/users/([^/]+)/patch', self.get_patch),
+            ('GET', r'/users/([^/]+)/revision', self.get_revision),
+            ('POST', r'/users/([^/]+)/revision', self.add_revision),
+            ('DELETE', r'/users/([^/]+)/revision/([^/]+)', self.delete_revision),
+            ('POST', r'/users/([^/]+)/sessions', self.start_session),
+            ('GET', r'/users/([^/]+)/sessions/([^/]+)', self.get_session),
+            ('POST', r'/users/([^/]+)/sessions/([^/]+)/answer', self.answer_session),
+            ('DELETE', r'/users/([^/]+)/sessions/([^/]+)', self.end_session),
+        ]
+        self.routes = [(method, re.compile(f'^{pattern}$'), handler)
+                       for method, pattern, handler in self.routes]
+
+    async def run_io(self, func, *args):
+        """Run blocking file I/O off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def preload(self):
+        """Parse every available HSK level and index them across levels once, before serving"""
+        for level in available_levels():
+            load_vocabulary(level)
+        load_word_index()
+
+    async def level_exists(self, level):
+        """Whether an HSK level's CSV is present, checked off the event loop"""
+        return level in HSK_LEVELS and await self.run_io(hsk_file(level).exists)
+
+    async def load_user(self, name):
+        user = UserState(Profile(name, self.data_dir))
+        await self.run_io(user.load)
+        self.users[name] = user
+        return user
+
+    async def get_user_state(self, name):
+        """Return the in-memory state for a user, loading it on first use"""
+        user = self.users.get(name)
+        if user is not None:
+            async with user.lock:
+                await self.run_io(user.refresh)
+            return user
+        if not PROFILE_NAME.match(name) or name in ('.', '..'):
+            raise HTTPError(400, "Invalid user name")
+
+        # Concurrent first requests for the same user share one load
+        task = self.loading.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self.load_user(name))
+            self.loading[name] = task
+            task.add_done_callback(lambda _: self.loading.pop(name, None))
+        return await task
+
+    # --- Handlers -------------------------------------------------------
+
+    async def health(self, query, body):
+        return {"status": "ok", "users": len(self.users)}
+
+    async def list_decks(self, query, body):
+        levels = await self.run_io(available_levels)
+        return {"decks": [{"level": level, "words": len(load_vocabulary(level))} for level in levels]}
+
+    async def get_deck(self, query, body, level):
+        level = int(level)
+        if not await self.level_exists(level):
+            raise HTTPError(404, f"HSK level {level} not found")
+        words = load_vocabulary(level)
+        offset = query_int(query, 'offset', 0, 0, len(words))
+        limit = query_int(query, 'limit', 100, 1, MAX_DECK_PAGE)
+        return {"level": level, "total": len(words), "offset": offset,
+                "words": list(words[offset:offset + limit])}
+
+    async def grade(self, query, body):
+        answer = body.get('answer', '')
+        correct_pinyin = body.get('pinyin', '')
+        return {"correct": pinyin_utils.check_pinyin(answer, correct_pinyin),
+                "expected": pinyin_utils.convert_tone_marks(correct_pinyin)}
+
+    async def get_user(self, query, body, name):
+        user = await self.get_user_state(name)
+        return user.summary()
+
+    async def put_config(self, query, body, name):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            level = int(body.get('hsk_level', user.config['hsk_level']))
+            words_per_patch = int(body.get('words_per_patch', user.config['words_per_patch']))
+            if not await self.level_exists(level):
+                raise HTTPError(400, "Invalid HSK level")
+            if words_per_patch <= 0:
+                raise HTTPError(400, "words_per_patch must be positive")
+            user.config['hsk_level'] = level
+            user.config['words_per_patch'] = words_per_patch
+            outcome = await self.run_io(user.ensure_order)
+            await self.run_io(user.write, user.config_file, user.config_bytes())
+            if outcome != 'kept':
+                await self.run_io(user.write, user.progress_file, user.progress_bytes())
+            return dict(user.summary(), progress_reset=outcome == 'reset')
+
+    async def post_progress(self, query, body, name):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            action = body.get('action')
+            if action == 'next':
+                if user.progress['current_index'] >= user.total_patches() - 1:
+                    raise HTTPError(409, "Already at the last patch")
+                user.progress['current_index'] += 1
+            elif action == 'previous':
+                if user.progress['current_index'] == 0:
+                    raise HTTPError(409, "Already at the first patch")
+                user.progress['current_index'] -= 1
+            elif action == 'reset':
+                await self.run_io(user.reset_progress)
+            else:
+                raise HTTPError(400, "action must be next, previous or reset")
+            await self.run_io(user.write, user.progress_file, user.progress_bytes())
+            return user.summary()
+
+    async def get_patch(self, query, body, name):
+        user = await self.get_user_state(name)
+        index = user.progress['current_index']
+        return {"patch": index + 1, "words": user.patch_words(index, index + 1)}
+
+    async def get_revision(self, query, body, name):
+        user = await self.get_user_state(name)
+        return {"words": list(user.revision.words.values())}
+
+    async def add_revision(self, query, body, name):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            chinese = body.get('chinese', '')
+            level = user.config['hsk_level']
+            # pinyin or meaning in the body pick one sense of a form like 还
+            index = load_word_index()
+            entry = index.resolve(body, level) if isinstance(chinese, str) else None
+            if entry is None:
+                raise HTTPError(404, f"Word {chinese!r} not in HSK{level}")
+            word = index.word(entry, level)
+            chinese = word.chinese
+            if chinese not in user.revision:
+                evicted = user.revision.add(word)
+                await self.run_io(user.save_revision, user.revision_bytes(), evicted)
+            return {"revision_words": len(user.revision)}
+
+    async def delete_revision(self, query, body, name, chinese):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            chinese = unquote(chinese)
+            if user.revision.remove(chinese) is None:
+                raise HTTPError(404, f"Word {chinese!r} not in revision")
+            await self.run_io(user.save_revision, user.revision_bytes())
+            return {"revision_words": len(user.revision)}
+
+    async def start_session(self, query, body, name):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            kind = body.get('kind', 'learn')
+            index = user.progress['current_index']
+            if kind == 'learn':
+                words = user.patch_words(index, index + 1)
+            elif kind == 'test':
+                patches = min(int(body.get('patches', 1)), index)
+                words = user.patch_words(index - patches, index)
+            elif kind in ('revision', 'revision_test'):
+                words = list(user.revision.words.values())
+            else:
+                raise HTTPError(400, "kind must be learn, test, revision or revision_test")
+            if not words:
+                raise HTTPError(409, "No words available for this session")
+
+            is_test = kind in ('test', 'revision_test')
+            engine = SessionEngine(words, pinyin_utils.check_pinyin, mode=kind, endless=not is_test,
+                                   question_types=['chinese_to_pinyin'] if is_test else
+                                   ('chinese_to_pinyin', 'meaning_to_pinyin'),
+                                   stats=user.journal.all_stats(), on_answer=user.record_answer)
+
+            while len(user.sessions) >= MAX_SESSIONS_PER_USER:
+                user.sessions.pop(next(iter(user.sessions)))
+            session_id = uuid.uuid4().hex[:12]
+            user.sessions[session_id] = engine
+            return {"session": session_id, "kind": kind, "prompt": self.public_prompt(engine.next_prompt())}
+
+    def session_for(self, user, session_id):
+        engine = user.sessions.get(session_id)
+        if engine is None:
+            raise HTTPError(404, "Session not found")
+        return engine
+
+    @staticmethod
+    def public_prompt(prompt):
+        """Prompt without the answer fields"""
+        if prompt is None:
+            return None
+        return {"number": prompt['number'], "total": prompt['total'],
+                "question_type": prompt['question_type'], "question": prompt['question']}
+
+    async def get_session(self, query, body, name, session_id):
+        user = await self.get_user_state(name)
+        engine = self.session_for(user, session_id)
+        return {"prompt": self.public_prompt(engine.next_prompt()),
+                "summary": self.public_summary(engine.summary())}
+
+    @staticmethod
+    def public_summary(summary):
+        return {"answered": summary['answered'], "correct": summary['correct'],
+                "score": summary['score'], "latency": summary['latency']}
+
+    async def answer_session(self, query, body, name, session_id):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            engine = self.session_for(user, session_id)
+            if engine.next_prompt() is None:
+                raise HTTPError(409, "Session is finished")
+            latency = body.get('latency')
+            if latency is not None and (isinstance(latency, bool) or not isinstance(latency, (int, float))
+                                        or not latency >= 0):
+                raise HTTPError(400, "latency must be a non-negative number of seconds")
+            result = engine.answer(str(body.get('answer', '')), latency)
+            word = result['word']
+
+            revision_changed = False
+            evicted = []
+            if engine.mode == 'test' and not result['correct'] and word['chinese'] not in user.revision:
+                evicted = user.revision.add(word)
+                revision_changed = True
+            elif engine.mode == 'revision_test' and result['correct']:
+                revision_changed = user.revision.remove(word['chinese']) is not None
+            if revision_changed:
+                await self.run_io(user.save_revision, user.revision_bytes(), evicted)
+
+            finished = engine.finished()
+            if finished or len(user.journal.buffer) >= self.flush_every:
+                await self.run_io(user.flush_reviews)
+            if finished:
+                user.sessions.pop(session_id, None)
+
+            return {
+                "correct": result['correct'],
+                "expected": pinyin_utils.convert_tone_marks(word['pinyin']),
+                "word": word,
+                "prompt": self.public_prompt(engine.next_prompt()),
+                "summary": self.public_summary(engine.summary()) if finished else None
+            }
+
+    async def end_session(self, query, body, name, session_id):
+        user = await self.get_user_state(name)
+        async with user.lock:
+            engine = self.session_for(user, session_id)
+            user.sessions.pop(session_id, None)
+            await self.run_io(user.flush_reviews)
+            return {"summary": self.public_summary(engine.summary())}
+
+    # --- HTTP plumbing --------------------------------------------------
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return await handler(query, body, *match.groups())
+        if path_matched:
+            raise HTTPError(405, "Method not allowed")
+        raise HTTPError(404, "Not found")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                status, payload = 200, None
+                if length > MAX_BODY:
+                    status, payload = 413, {"error": "Request body too large"}
+                    raw = b''
+                else:
+                    raw = await reader.readexactly(length) if length else b''
+
+                if payload is None:
+                    try:
+                        body = json.loads(raw) if raw else {}
+                        if not isinstance(body, dict):
+                            raise HTTPError(400, "JSON body must be an object")
+                        payload = await self.dispatch(method, target, body)
+                    except HTTPError as e:
+                        status, payload = e.status, {"error": e.message}
+                    except (ValueError, KeyError) as e:
+                        status, payload = 400, {"error": str(e)}
+                    except Exception as e:
+                        status, payload = 500, {"error": f"Internal error: {e}"}
+
+                # Vocabulary Words are read-only Mappings, serialized as plain objects
+                data = json.dumps(payload, ensure_ascii=False, default=dict).encode('utf-8')
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                              and status != 413)
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def flush_all(self):
+        """Persist every user's pending reviews (used at shutdown)"""
+        for user in list(self.users.values()):
+            async with user.lock:
+                await self.run_io(user.flush_reviews)
+
+    async def serve(self, host, port, ready=None):
+        await self.run_io(self.preload)
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_BODY)
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.flush_all()
+
+
+class Client:
+    """Minimal keep-alive JSON client for local testing"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode('latin-1') + data
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            if key.strip().lower() == 'content-length':
+                length = int(value)
+        payload = json.loads(await self.reader.readexactly(length)) if length else None
+        return status, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+
+async def simulated_learner(host, port, name, answers, accuracy, words_by_question):
+    """Run a test session for one fake learner and return per-request latencies"""
+    client = Client(host, port)
+    latencies = []
+
+    async def timed(method, path, body=None):
+        start = time.perf_counter()
+        status, payload = await client.request(method, path, body)
+        latencies.append(time.perf_counter() - start)
+        return status, payload
+
+    try:
+        await timed('GET', f'/users/{name}')
+        status, payload = await timed('POST', f'/users/{name}/sessions', {"kind": "learn"})
+        session, prompt = payload['session'], payload['prompt']
+        for _ in range(answers):
+            word = words_by_question.get(prompt['question'])
+            if word and random.random() < accuracy:
+                answer = pinyin_utils.convert_tone_marks(word['pinyin'])
+            else:
+                answer = 'x'
+            status, payload = await timed('POST', f'/users/{name}/sessions/{session}/answer',
+                                          {"answer": answer})
+            prompt = payload['prompt']
+        await timed('DELETE', f'/users/{name}/sessions/{session}')
+    finally:
+        await client.close()
+    return latencies
+
+
+async def self_test(data_dir, learners, answers):
+    """Start a server on a free port and hammer it with concurrent learners"""
+    app = FlashcardServer(data_dir)
+    ready = asyncio.get_running_loop().create_future()
+    server_task = asyncio.ensure_future(app.serve('127.0.0.1', 0, ready))
+    port = await ready
+
+    words_by_question = {}
+    for word in load_vocabulary(1):
+        words_by_question[word['chinese']] = word
+        words_by_question[word['meaning']] = word
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        simulated_learner('127.0.0.1', port, f"learner{i:04d}", answers, 0.7, words_by_question)
+        for i in range(learners)
+    ))
+    elapsed = time.perf_counter() - start
+
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+    latencies = sorted(latency for result in results for latency in result)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{learners} learners, {len(latencies)} requests in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} req/s)")
+    print(f"Request latency: p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the flashcard HTTP/JSON server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data-dir',
+                        help="directory holding one sub-directory of state per user "
+                             "(default: the profiles directory, or a temporary one with --self-test)")
+    parser.add_argument('--self-test', type=int, metavar='LEARNERS',
+                        help="start a temporary server and simulate this many concurrent learners")
+    parser.add_argument('--answers', type=int, default=20,
+                        help="answers per simulated learner (with --self-test)")
+    args = parser.parse_args()
+
+    if args.self_test:
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(self_test(args.data_dir or tmp, args.self_test, args.answers))
+        return
+
+    args.data_dir = args.data_dir or str(PROFILES_DIR)
+
+    print(f"Serving flashcards on http://{args.host}:{args.port} (data in {args.data_dir})")
+    try:
+        asyncio.run(FlashcardServer(args.data_dir).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Headless flashcard session engine
+Holds the question/answer logic so the CLI, GUI, scripts and servers can share it
+"""
+
+import random
+import time
+from collections import deque
+
+from latency import LatencyTracker
+from sampler import AdaptiveSampler
+
+
+QUESTION_TYPES = ('chinese_to_pinyin', 'meaning_to_pinyin')
+# Chinese shown, pick its pinyin among options; needs a distractors source
+MULTIPLE_CHOICE = 'multiple_choice'
+# Chinese shown, answer with its meaning; graded by a grader per type
+MEANING_TYPES = ('chinese_to_english', 'chinese_to_vietnamese')
+# Example sentence shown with the word blanked out, answer with its pinyin;
+# needs a cloze source
+CLOZE = 'cloze'
+# The front-ends' 'question_style' setting
+QUESTION_STYLES = {
+    'typed': "typed pinyin",
+    'choice': "multiple choice",
+    'english': "English meaning",
+    'vietnamese': "Vietnamese meaning",
+    'cloze': "fill the gap"
+}
+
+
+class SessionEngine:
+    """State machine that issues prompts and grades answers
+
+    A front-end calls next_prompt() to get a question, shows it however it
+    likes, then passes the learner's input to answer(). No I/O happens
+    here: results come back as plain dicts and side effects (journal,
+    statistics) go through the optional on_answer(word, mode, correct,
+    latency) callback.
+
+    Finite sessions (tests) walk a shuffled copy of the words once. Endless
+    sessions draw from an AdaptiveSampler until the front-end stops.
+
+    Multiple-choice prompts carry an 'options' list of words (the answer
+    plus distractors(word, count, rng) from e.g. a DistractorIndex); the
+    learner answers with the option's number or by typing its pinyin.
+    Question types listed in `graders` are graded by grader(input, word)
+    instead of the pinyin checker (e.g. meanings, see GlossIndex).
+    Cloze prompts show cloze(word) -> (sentence with a gap, translation),
+    e.g. from a SentenceIndex, with the translation as 'hint'; a word
+    without a usable sentence is asked as chinese_to_pinyin instead.
+    Sampling weights read the time from clock() (e.g. a simulated one).
+    """
+
+    def __init__(self, words, checker, mode='learn', endless=False,
+                 question_types=QUESTION_TYPES, stats=None, on_answer=None,
+                 rng=None, latency_capacity=1024, distractors=None, choices=4, graders=None,
+                 cloze=None, clock=time.time):
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.words = list(words)
+        self.checker = checker
+        self.mode = mode
+        self.endless = endless
+        self.question_types = tuple(question_types)
+        self.on_answer = on_answer
+        self.distractors = distractors
+        self.choices = choices
+        self.graders = graders or {}
+        self.cloze = cloze
+        if MULTIPLE_CHOICE in self.question_types and distractors is None:
+            raise ValueError("multiple_choice questions need a distractors source")
+        if CLOZE in self.question_types and cloze is None:
+            raise ValueError("cloze questions need a cloze source")
+        for question_type in self.question_types:
+            if question_type in MEANING_TYPES and question_type not in self.graders:
+                raise ValueError(f"{question_type} questions need a grader")
+        self.tracker = LatencyTracker(latency_capacity)
+
+        # Endless draws taken ahead of time by upcoming(), asked in order
+        self.drawn = deque()
+        if endless:
+            self.sampler = AdaptiveSampler(self.words, stats, rng=self.rng, now=clock())
+        else:
+            self.sampler = None
+            self.rng.shuffle(self.words)
+
+        self.issued = 0
+        self.answered = 0
+        self.correct_count = 0
+        self.correct_words = []
+        self.wrong_words = []
+        self.current = None
+
+    @property
+    def total(self):
+        """Number of questions in a finite session (None when endless)"""
+        return None if self.endless else len(self.words)
+
+    def finished(self):
+        """True once a finite session has no questions left"""
+        return not self.endless and self.answered >= len(self.words)
+
+    def is_last(self):
+        """True while the pending question is the last one of the session"""
+        return not self.endless and self.issued >= len(self.words)
+
+    def upcoming(self, count):
+        """Words that may be asked after the pending prompt, for prefetching
+
+        A finite session knows its order; an endless one draws its next
+        `count` words from the sampler now and asks them in that order, so
+        answers given meanwhile re-weight only the draws after them.
+        """
+        if self.endless:
+            while self.words and len(self.drawn) < count:
+                self.drawn.append(self.sampler.next())
+            return list(self.drawn)[:count]
+        return self.words[self.issued:self.issued + count]
+
+    def next_prompt(self):
+        """Return the pending prompt, issuing a new one if needed
+
+        Returns None when the session is over.
+        """
+        if self.current is not None:
+            return self.current
+        if not self.words or self.finished():
+            return None
+
+        if self.endless:
+            word = self.drawn.popleft() if self.drawn else self.sampler.next()
+        else:
+            word = self.words[self.issued]
+
+        question_type = (self.question_types[0] if len(self.question_types) == 1
+                         else self.rng.choice(self.question_types))
+        gap = self.cloze(word) if question_type == CLOZE else None
+        if question_type == CLOZE and gap is None:
+            question_type = 'chinese_to_pinyin'
+        self.issued += 1
+        self.current = {
+            "number": self.issued,
+            "total": self.total,
+            "word": word,
+            "question_type": question_type,
+            "question": word['meaning'] if question_type == 'meaning_to_pinyin' else word['chinese']
+        }
+        if question_type == MULTIPLE_CHOICE:
+            options = [word] + list(self.distractors(word, self.choices - 1, self.rng))
+            self.rng.shuffle(options)
+            self.current["options"] = options
+        elif gap is not None:
+            self.current["question"], self.current["hint"] = gap
+        self.tracker.start()
+        return self.current
+
+    def mark_shown(self):
+        """Restart the latency timer when the prompt actually appears on screen"""
+        if self.current is not None:
+            self.tracker.start()
+
+    def answer(self, user_input, latency=None):
+        """Grade the pending prompt and return the result"""
+        if self.current is None:
+            raise RuntimeError("No question is waiting for an answer")
+
+        prompt = self.current
+        word = prompt["word"]
+        measured = self.tracker.stop(word)
+        if latency is None:
+            latency = measured
+
+        options = prompt.get("options")
+        if options and user_input.strip().isdigit():
+            choice = int(user_input)
+            picked = options[choice - 1] if 1 <= choice <= len(options) else None
+            correct = picked is not None and picked['chinese'] == word['chinese']
+        elif prompt["question_type"] in self.graders:
+            correct = self.graders[prompt["question_type"]](user_input, word)
+        else:
+            correct = self.checker(user_input, word['pinyin'])
+
+        self.current = None
+        self.answered += 1
+        if correct:
+            self.correct_count += 1
+        if not self.endless:
+            (self.correct_words if correct else self.wrong_words).append(word)
+        if self.sampler:
+            self.sampler.update(word, correct, latency, self.clock())
+        if self.on_answer:
+            self.on_answer(word, self.mode, correct, latency)
+
+        return {
+            "number": prompt["number"],
+            "word": word,
+            "question_type": prompt["question_type"],
+            "answer": user_input,
+            "correct": correct,
+            "latency": latency
+        }
+
+    def summary(self):
+        """Return the totals for the session so far"""
+        score = (self.correct_count / self.answered) * 100 if self.answered else 0.0
+        return {
+            "answered": self.answered,
+            "correct": self.correct_count,
+            "score": score,
+            "correct_words": list(self.correct_words),
+            "wrong_words": list(self.wrong_words),
+            "latency": self.tracker.overall()
+        }
+
+    def play(self):
+        """Generator interface over the same state machine
+
+        Yields a prompt, receives the answer through send(), then yields
+        the result; the generator returns the summary when finished:
+
+            session = engine.play()
+            for prompt in session:
+                result = session.send(read_answer(prompt))
+        """
+        while True:
+            prompt = self.next_prompt()
+            if prompt is None:
+                return self.summary()
+            user_input = yield prompt
+            yield self.answer(user_input)
+
+    def simulate(self, answer_fn, limit=None):
+        """Run the session headlessly with answer_fn(prompt) -> input string"""
+        while limit is None or self.answered < limit:
+            prompt = self.next_prompt()
+            if prompt is None:
+                break
+            self.answer(answer_fn(prompt))
+        return self.summary()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Simulated-learner load generator
+Drive the session logic with synthetic learners for many days and time every persistence operation
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from array import array
+from pathlib import Path
+
+from flashcard import ChineseFlashcard
+from latency import percentile
+from pinyin_syllables import split_syllables
+from profiles import Profile
+from session_engine import SessionEngine
+
+
+# Tones a learner gives by mistake for each correct tone; None means any
+# other tone is equally likely
+TONE_PROFILES = {
+    'uniform': None,
+    'rising-dipping': {2: (3,), 3: (2,)},
+    'level-falling': {1: (4,), 4: (1,)},
+    'neutral-blind': {0: (1, 2, 3, 4)}
+}
+
+# Persistence operations timed in each learner process: (label, object, method)
+OPERATIONS = (
+    ('answer.record', 'app', 'record_answer'),
+    ('journal.record', 'journal', 'record'),
+    ('journal.flush', 'journal', 'flush'),
+    ('journal.all_stats', 'journal', 'all_stats'),
+    ('stats.record', 'stats', 'record'),
+    ('stats.save', 'stats', 'save'),
+    ('progress.save', 'app', 'save_progress'),
+    ('writer.flush', 'writer', 'flush'),
+    ('revision.save', 'app', 'save_word_to_revision'),
+    ('revision.remove', 'app', 'remove_word_from_revision'),
+    ('revision.load', 'app', 'load_revision_words'),
+    ('state.flush', 'app', 'flush_state')
+)
+
+
+def instrument(obj, method, label, samples):
+    """Replace obj.method with a wrapper that records its duration"""
+    original = getattr(obj, method)
+    durations = samples.setdefault(label, array('d'))
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    setattr(obj, method, timed)
+
+
+class Learner:
+    """Answers prompts the way a learner with a given accuracy and tone habit would
+
+    Recall of a word starts at `accuracy` and improves with every correct
+    answer; a `tone_confusion` share of the mistakes only get a tone wrong,
+    following the tone profile, the rest are wild guesses.
+    """
+
+    def __init__(self, rng, accuracy, tone_confusion, tone_profile, learning_rate):
+        self.rng = rng
+        self.accuracy = accuracy
+        self.tone_confusion = tone_confusion
+        self.confusions = TONE_PROFILES[tone_profile]
+        self.learning_rate = learning_rate
+        self.known = {}
+
+    def recall(self, word):
+        """Probability of answering a word right"""
+        return 1 - (1 - self.accuracy) * (1 - self.learning_rate) ** self.known.get(word['chinese'], 0)
+
+    def wrong_tone(self, tone):
+        choices = self.confusions.get(tone) if self.confusions else None
+        if not choices:
+            choices = [t for t in range(5) if t != tone]
+        return self.rng.choice(choices)
+
+    def answer(self, prompt):
+        """The typed answer for a prompt (tone numbers)"""
+        word = prompt['word']
+        syllables = [(letters, tone) for letters, tone, _ in split_syllables(word['pinyin'])]
+        if self.rng.random() < self.recall(word):
+            self.known[word['chinese']] = self.known.get(word['chinese'], 0) + 1
+        elif syllables and self.rng.random() < self.tone_confusion:
+            slot = self.rng.randrange(len(syllables))
+            letters, tone = syllables[slot]
+            syllables[slot] = (letters, self.wrong_tone(tone))
+        else:
+            return self.rng.choice(('x', 'wo3', 'bu4zhi1dao4'))
+        return ''.join(f"{letters}{tone or ''}" for letters, tone in syllables)
+
+
+class SimulatedClock:
+    """Time for a simulated history: starts `days` days ago and ticks a few seconds per reading
+
+    next_day() jumps to the start of the following day, so journal events,
+    statistics buckets, sampler recency and revision LRU order all see the
+    days pass even though the run takes seconds.
+    """
+
+    def __init__(self, days, step=5.0):
+        self.start = time.time() - days * 86400
+        self.step = step
+        self.day = -1
+        self.now = self.start
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+    def next_day(self):
+        self.day += 1
+        self.now = self.start + self.day * 86400
+
+
+def profile_sizes(directory):
+    """Size in bytes of each state file of a profile (lock files left out)"""
+    return {path.name: path.stat().st_size for path in Path(directory).iterdir()
+            if path.is_file() and not path.name.endswith('.lock')}
+
+
+def run_learner(task):
+    """One learner's whole history, run in a worker process"""
+    data_dir, name, options, seed = task
+    rng = random.Random(seed)
+    app = ChineseFlashcard(Profile(name, data_dir))
+    app.config['hsk_level'] = options['level']
+    app.config['words_per_patch'] = options['words_per_patch']
+    app.save_config()
+    app.load_words()
+
+    samples = {}
+    targets = {'app': app, 'journal': app.journal, 'stats': app.stats, 'writer': app.writer}
+    for label, target, method in OPERATIONS:
+        instrument(targets[target], method, label, samples)
+
+    learner = Learner(rng, options['accuracy'], options['tone_confusion'],
+                      options['tone_profile'], options['learning_rate'])
+    check = app.check_pinyin_answer
+    clock = SimulatedClock(options['days'])
+
+    def record(word, mode, correct, latency):
+        app.record_answer(word, mode, correct, latency, now=clock())
+
+    answers = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(options['days']):
+            clock.next_day()
+            for _ in range(options['sessions']):
+                patch = app.get_current_patch()
+                if patch:
+                    engine = SessionEngine(patch, check, mode='learn', endless=True,
+                                           stats=app.journal.all_stats(), on_answer=record,
+                                           rng=rng, clock=clock)
+                    answers += engine.simulate(learner.answer, limit=options['answers'])['answered']
+
+                    # End-of-patch test: misses go to revision, a pass moves on
+                    engine = SessionEngine(patch, check, mode='test', on_answer=record, rng=rng, clock=clock)
+                    summary = engine.simulate(learner.answer)
+                    answers += summary['answered']
+                    for word in summary['wrong_words']:
+                        app.save_word_to_revision(word)
+                    if summary['score'] >= options['pass_score']:
+                        app.progress['current_index'] += 1
+                        app.save_progress()
+                    app.flush_state()
+
+                revision = app.load_revision_words()
+                if revision:
+                    engine = SessionEngine(revision, check, mode='revision_test',
+                                           on_answer=record, rng=rng, clock=clock)
+                    summary = engine.simulate(learner.answer)
+                    answers += summary['answered']
+                    app.flush_state()
+                    for word in summary['correct_words']:
+                        app.remove_word_from_revision(word)
+    finally:
+        app.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "answers": answers,
+        "elapsed": elapsed,
+        "patch": app.progress['current_index'],
+        "revision": len(app.load_revision_words()),
+        "sizes": profile_sizes(app.profile.directory),
+        "samples": samples
+    }
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def report(results, learners, processes, days, elapsed):
+    """Print throughput, file sizes and per-operation latency percentiles"""
+    answers = sum(result['answers'] for result in results)
+    busy = sum(result['elapsed'] for result in results)
+    print(f"{learners} learners x {days} days on {processes} processes in {elapsed:.2f}s")
+    print(f"{answers} answers: {answers / elapsed:.0f} answers/s overall, "
+          f"{answers / busy:.0f} answers/s per learner")
+    patches = sorted(result['patch'] for result in results)
+    revisions = sorted(result['revision'] for result in results)
+    print(f"Patch reached: median {patches[len(patches) // 2]}, max {patches[-1]}; "
+          f"revision words: median {revisions[len(revisions) // 2]}, max {revisions[-1]}")
+
+    print(f"\n{'File':<22}{'median':>10}{'max':>10}")
+    names = sorted({name for result in results for name in result['sizes']})
+    for name in names:
+        sizes = sorted(result['sizes'].get(name, 0) for result in results)
+        print(f"{name:<22}{format_size(sizes[len(sizes) // 2]):>10}{format_size(sizes[-1]):>10}")
+
+    print(f"\n{'Operation':<20}{'calls':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, _, _ in OPERATIONS:
+        values = [value for result in results for value in result['samples'].get(label, ())]
+        if not values:
+            continue
+        values.sort()
+        row = [percentile(values, pct) * 1000 for pct in (50, 90, 99)] + [values[-1] * 1000]
+        print(f"{label:<20}{len(values):>9}" + ''.join(f"{value:>10.3f}" for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many learners using the app for days and time its storage")
+    parser.add_argument('--learners', type=int, default=8, help="number of simulated profiles")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--days', type=int, default=30, help="days of use per learner")
+    parser.add_argument('--sessions', type=int, default=1, help="study sessions per day")
+    parser.add_argument('--answers', type=int, default=30, help="answers per learning session")
+    parser.add_argument('--level', type=int, default=3, help="HSK level studied")
+    parser.add_argument('--words-per-patch', type=int, default=10)
+    parser.add_argument('--accuracy', type=float, default=0.7,
+                        help="chance of knowing a word on first sight")
+    parser.add_argument('--learning-rate', type=float, default=0.3,
+                        help="share of the remaining error removed by each correct answer")
+    parser.add_argument('--tone-confusion', type=float, default=0.6,
+                        help="share of mistakes that only get a tone wrong")
+    parser.add_argument('--tone-profile', choices=('mixed',) + tuple(TONE_PROFILES), default='mixed',
+                        help="which tones get mixed up ('mixed' cycles through the profiles)")
+    parser.add_argument('--pass-score', type=float, default=80.0,
+                        help="test score (%%) needed to move to the next patch")
+    parser.add_argument('--data-dir', help="keep the profiles here instead of a temporary directory")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.learners < 1 or args.processes < 1 or args.days < 1:
+        print("Error: --learners, --processes and --days must be positive")
+        return 1
+
+    profiles = list(TONE_PROFILES)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        tasks = []
+        for i in range(args.learners):
+            options = {
+                "level": args.level,
+                "words_per_patch": args.words_per_patch,
+                "days": args.days,
+                "sessions": args.sessions,
+                "answers": args.answers,
+                "accuracy": args.accuracy,
+                "learning_rate": args.learning_rate,
+                "tone_confusion": args.tone_confusion,
+                "tone_profile": profiles[i % len(profiles)] if args.tone_profile == 'mixed' else args.tone_profile,
+                "pass_score": args.pass_score
+            }
+            tasks.append((data_dir, f"sim{i:04d}", options, args.seed * 100003 + i))
+
+        processes = min(args.processes, args.learners)
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(run_learner, tasks)
+        elapsed = time.perf_counter() - start
+
+    report(results, args.learners, processes, args.days, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
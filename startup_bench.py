@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Time how long `python flashcard.py` takes to show its first prompt, break it down by import and check it against a budget
+"""
+
+import argparse
+import json
+import os
+import selectors
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from latency import percentile
+from profiles import PROFILES_DIR
+
+
+SCRIPT_DIR = Path(__file__).parent
+PROMPT = b"Select option (1-10): "
+EXIT_CHOICE = b"10\n"
+DEFAULT_BUDGET_MS = 150
+
+
+def time_to_prompt(profile, extra_args=(), timeout=30.0):
+    """Run the CLI until its main menu prompt; return (seconds to the prompt, stderr text)"""
+    command = [sys.executable, *extra_args, str(SCRIPT_DIR / "flashcard.py"), '--profile', profile, '--timing']
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, cwd=SCRIPT_DIR)
+    output = bytearray()
+    elapsed = None
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            while PROMPT not in output:
+                if time.perf_counter() - start > timeout or not selector.select(timeout):
+                    raise RuntimeError("timed out waiting for the first prompt")
+                chunk = os.read(proc.stdout.fileno(), 65536)
+                if not chunk:
+                    raise RuntimeError("flashcard.py exited before its first prompt")
+                output += chunk
+            elapsed = time.perf_counter() - start
+        _, stderr = proc.communicate(EXIT_CHOICE, timeout=timeout)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    return elapsed, stderr.decode('utf-8', 'replace')
+
+
+def parse_importtime(text):
+    """{module: (self µs, cumulative µs, imported at top level)} from -X importtime output"""
+    modules = {}
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative), not name[1:].startswith(' '))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the CLI's time to first prompt against a budget")
+    parser.add_argument('--runs', type=int, default=10, help="timed runs after one warm-up run")
+    parser.add_argument('--level', type=int, default=6, choices=range(1, 7),
+                        help="HSK level of the benchmark profile (6 is the largest deck)")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"fail if the median time to first prompt exceeds this (default {DEFAULT_BUDGET_MS})")
+    parser.add_argument('--baseline-ms', type=float,
+                        help="subtract this interpreter start-up time instead of measuring `python -c pass`")
+    parser.add_argument('--top', type=int, default=12, metavar='N', help="list the N slowest imports")
+    args = parser.parse_args()
+
+    if args.runs < 1:
+        print("Error: --runs must be positive")
+        return 1
+
+    name = f"startup-bench-{os.getpid()}"
+    profile_dir = PROFILES_DIR / name
+    profile_dir.mkdir(parents=True)
+    try:
+        (profile_dir / "config.json").write_text(json.dumps({"hsk_level": args.level}), encoding='utf-8')
+        # The warm-up run compiles stale caches and writes the first progress,
+        # as a new learner's first start would; it is reported on its own
+        first, _ = time_to_prompt(name)
+        times = []
+        for _ in range(args.runs):
+            elapsed, timing = time_to_prompt(name)
+            times.append(elapsed)
+        times.sort()
+        _, report = time_to_prompt(name, ('-X', 'importtime'))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    if args.baseline_ms is None:
+        interpreter = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            interpreter.append(time.perf_counter() - start)
+        baseline = sorted(interpreter)[len(interpreter) // 2]
+    else:
+        baseline = args.baseline_ms / 1000
+    median = percentile(times, 50)
+
+    print(f"Time to first prompt (HSK {args.level}, {args.runs} runs): "
+          f"median {median * 1000:.1f}ms, p90 {percentile(times, 90) * 1000:.1f}ms, "
+          f"min {times[0] * 1000:.1f}ms, max {times[-1] * 1000:.1f}ms; first run {first * 1000:.1f}ms")
+    print(f"Interpreter start-up {baseline * 1000:.1f}ms, so the app's own share is "
+          f"{(median - baseline) * 1000:.1f}ms")
+    print(f"Last run's own report: {timing.strip().splitlines()[-1] if timing.strip() else 'none'}")
+
+    modules = parse_importtime(report)
+    top_level = {module: cumulative for module, (_, cumulative, top) in modules.items() if top}
+    print(f"\nImports: {len(modules)} modules, {sum(top_level.values()) / 1000:.1f}ms (under -X importtime)")
+    print(f"{'module':<28}{'self ms':>10}{'total ms':>10}")
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for module, (own, cumulative, _) in slowest:
+        print(f"{module:<28}{own / 1000:>10.1f}{cumulative / 1000:>10.1f}")
+
+    if median * 1000 > args.budget_ms:
+        print(f"\nOVER BUDGET: median {median * 1000:.1f}ms > {args.budget_ms:.0f}ms")
+        return 1
+    print(f"\nWithin budget ({args.budget_ms:.0f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Shared-state stress test
+Run several flashcard instances on one profile at once and check that no update is lost
+"""
+
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+
+from flashcard import ChineseFlashcard
+from profiles import Profile
+
+
+def worker(profiles_dir, name, worker_id, ops):
+    """Hammer one profile the way a front-end does: revision edits, answers, saves"""
+    app = ChineseFlashcard(Profile(name, profiles_dir))
+    words = app.words
+    try:
+        for i in range(ops):
+            word = words[(worker_id * ops + i) % len(words)]
+            app.save_word_to_revision(word)
+            if i % 2:
+                app.remove_word_from_revision(word)
+            app.record_answer(word, 'learn', i % 3 != 0, 0.5)
+            app.progress['current_index'] = progress_value(worker_id, ops, i)
+            app.save_progress()
+            app.refresh_state()
+    finally:
+        app.close()
+
+
+def progress_value(worker_id, ops, i):
+    """current_index a worker saves on its i-th step: distinct across workers, rising within one"""
+    return worker_id * ops + i
+
+
+def expected_revision(words, workers, ops):
+    """Words each worker added and did not remove again"""
+    return {words[(w * ops + i) % len(words)]['chinese']
+            for w in range(workers) for i in range(0, ops, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent access to a profile's state files")
+    parser.add_argument('--workers', type=int, default=8, help="number of processes")
+    parser.add_argument('--ops', type=int, default=200, help="answers per process")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        name = "stress"
+        start = time.perf_counter()
+        processes = [
+            multiprocessing.Process(target=worker, args=(tmp, name, w, args.ops))
+            for w in range(args.workers)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        app = ChineseFlashcard(Profile(name, tmp))
+        answers = args.workers * args.ops
+        problems = []
+
+        if any(p.exitcode != 0 for p in processes):
+            problems.append("a worker process failed")
+
+        revision = {w['chinese'] for w in app.load_revision_words()}
+        wanted = expected_revision(app.words, args.workers, args.ops)
+        if revision != wanted:
+            problems.append(f"revision: {len(wanted - revision)} missing, {len(revision - wanted)} unexpected")
+
+        reviews = sum(entry['reviews'] for entry in app.journal.all_stats().values())
+        if reviews != answers:
+            problems.append(f"journal: {reviews} reviews, expected {answers}")
+
+        if app.stats.data['total'][0] != answers:
+            problems.append(f"stats: {app.stats.data['total'][0]} answers, expected {answers}")
+
+        # Progress is last-writer-wins: the file must hold some worker's
+        # final value, never an older one that a stale write put back
+        try:
+            with open(app.progress_file, 'r', encoding='utf-8') as f:
+                current = json.load(f).get('current_index')
+        except (OSError, ValueError):
+            current = None
+        finals = {progress_value(w, args.ops, args.ops - 1) for w in range(args.workers)}
+        if app.progress['current_index'] != current or current not in finals:
+            problems.append(f"progress: current_index {current} is not any worker's last write")
+        app.close()
+
+        print(f"{args.workers} processes x {args.ops} answers in {elapsed:.2f}s")
+        if problems:
+            for problem in problems:
+                print(f"FAIL {problem}")
+            return 1
+        print("OK no lost updates")
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,288 @@
+"""
+Shared HSK vocabulary cache
+Each level's CSV is compiled once into a memory-mapped file shared by every caller
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+from persistence import write_atomic
+from word_ids import ID_BYTES, ID_FORMAT, deck_ids, pack_ids
+
+
+RESOURCE_DIR = Path(__file__).parent / "resource"
+HSK_LEVELS = range(1, 7)
+
+# Compiled file layout (little-endian):
+#   header      magic, version, reserved, word count, CSV size, CSV mtime_ns,
+#               hot block size, cold block size, syllable count
+#   hot index   (count + 1) uint32 offsets into the hot block
+#   hot block   'chinese<TAB>pinyin' per word, UTF-8
+#   cold index  (count + 1) uint32 offsets into the cold block
+#   cold block  the COLD_FIELDS of each word joined by U+001F, UTF-8
+#   syllables   the pinyin segmented by pinyin_syllables (Segmentation.to_bytes)
+#   word ids    count uint64 stable word IDs (word_ids.deck_ids), at the very end
+#
+# Loading only touches the header, the hot index and block and (on first
+# use) the IDs; the cold block and the syllables are read when asked for, so
+# neither csv nor pinyin_syllables is imported until then.
+MAGIC = b'HSKV'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('<4sHHIqqIII')
+HOT_SEP = '\t'
+COLD_SEP = '\x1f'
+COLD_FIELDS = ('meaning', 'han_viet', 'nghia_tieng_viet', 'cach_dung')
+WORD_KEYS = ('chinese', 'pinyin') + COLD_FIELDS
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def parse_row(row):
+    """Convert a CSV row into the word dict used throughout the app"""
+    return {
+        'chinese': row.get('Chinese') or row.get('chinese', ''),
+        'pinyin': row.get('Pinyin') or row.get('pinyin', ''),
+        'meaning': row.get('Meaning_English') or row.get('meaning', ''),
+        'han_viet': row.get('Han_Viet') or row.get('han_viet', ''),
+        'nghia_tieng_viet': row.get('Nghia_Tieng_Viet') or row.get('nghia_tieng_viet', ''),
+        'cach_dung': row.get('Cach_dung_trong_cau') or row.get('cach_dung_trong_cau', '')
+    }
+
+
+def hsk_file(level, resource_dir=RESOURCE_DIR):
+    """Return the CSV path for an HSK level"""
+    return Path(resource_dir) / f"hsk{level}.csv"
+
+
+def compiled_file(csv_path):
+    """Return the path of the compiled vocabulary for a CSV file"""
+    return Path(csv_path).with_suffix(".vocab")
+
+
+class Word(Mapping):
+    """One vocabulary entry, read-only and usable like the old word dicts
+
+    chinese and pinyin are held in memory; the bulky fields are decoded
+    from the mapped file each time they are read. The pinyin's syllables
+    are available as word.syllables.
+    """
+
+    __slots__ = ('vocab', 'index', 'chinese', 'pinyin')
+
+    def __init__(self, vocab, index, chinese, pinyin):
+        self.vocab = vocab
+        self.index = index
+        self.chinese = chinese
+        self.pinyin = pinyin
+
+    def __getitem__(self, key):
+        if key == 'chinese':
+            return self.chinese
+        if key == 'pinyin':
+            return self.pinyin
+        try:
+            position = COLD_FIELDS.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        return self.vocab.cold_fields(self.index)[position]
+
+    @property
+    def syllables(self):
+        """(letters, tone, mark) per syllable, segmented when the CSV was compiled"""
+        return self.vocab.segmentation.syllables(self.index)
+
+    def __iter__(self):
+        return iter(WORD_KEYS)
+
+    def __len__(self):
+        return len(WORD_KEYS)
+
+    def __eq__(self, other):
+        if isinstance(other, Word) and other.vocab is self.vocab:
+            return other.index == self.index
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Word({self.chinese!r}, {self.pinyin!r})"
+
+
+class Vocabulary(Sequence):
+    """Read-only sequence of Words backed by a compiled vocabulary buffer
+
+    The hot block and its index are copied into memory when loaded; the
+    cold block stays in the buffer (normally an mmap, so the OS pages it in
+    on demand and can drop it again).
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, version, _, count, _, _, hot_size, cold_size, syllable_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a compiled vocabulary file")
+        self.count = count
+
+        pos = HEADER.size
+        self.hot_index = array('I')
+        self.hot_index.frombytes(buffer[pos:pos + 4 * (count + 1)])
+        if sys.byteorder == 'big':
+            self.hot_index.byteswap()
+        pos += 4 * (count + 1)
+        self.hot = bytes(buffer[pos:pos + hot_size])
+        pos += hot_size
+        self.cold_index_pos = pos
+        self.cold_pos = pos + 4 * (count + 1)
+        self.syllables_pos = self.cold_pos + cold_size
+        self.syllable_count = syllable_count
+        self.ids_pos = len(buffer) - ID_BYTES * count
+        if self.ids_pos < self.syllables_pos:
+            raise ValueError("Truncated compiled vocabulary file")
+        self._segmentation = None
+        self._word_ids = None
+        self._rows = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("vocabulary index out of range")
+        chinese, pinyin = self.hot[self.hot_index[i]:self.hot_index[i + 1]].decode('utf-8').split(HOT_SEP)
+        return Word(self, i, chinese, pinyin)
+
+    @property
+    def segmentation(self):
+        """Per-syllable arrays of every word, read from the file on first use"""
+        if self._segmentation is None:
+            from pinyin_syllables import Segmentation
+            if self.syllables_pos + Segmentation.size(self.count, self.syllable_count) != self.ids_pos:
+                raise ValueError("Truncated compiled vocabulary file")
+            self._segmentation = Segmentation.from_bytes(self.buffer[self.syllables_pos:self.ids_pos], self.count,
+                                                         pinyin=lambda i: self[i].pinyin)
+        return self._segmentation
+
+    @property
+    def word_ids(self):
+        """Stable IDs of the words in row order (see word_ids.deck_ids), hashed when the CSV was compiled"""
+        if self._word_ids is None:
+            ids = array(ID_FORMAT)
+            ids.frombytes(self.buffer[self.ids_pos:self.ids_pos + ID_BYTES * self.count])
+            if sys.byteorder == 'big':
+                ids.byteswap()
+            self._word_ids = ids
+        return self._word_ids
+
+    def find(self, chinese):
+        """Row of the first word written this way, or None; the lookup table is built on first use"""
+        if self._rows is None:
+            rows = {}
+            for i in range(self.count):
+                rows.setdefault(self[i].chinese, i)
+            self._rows = rows
+        return self._rows.get(chinese)
+
+    def cold_fields(self, i):
+        """Decode the bulky fields of word i"""
+        start, end = struct.unpack_from('<II', self.buffer, self.cold_index_pos + 4 * i)
+        return self.buffer[self.cold_pos + start:self.cold_pos + end].decode('utf-8').split(COLD_SEP)
+
+
+def compile_vocabulary(csv_path):
+    """Parse a CSV file and return its compiled vocabulary bytes"""
+    # Only needed when a CSV changed, so kept off the startup path
+    import csv
+    from pinyin_syllables import Segmentation
+
+    st = os.stat(csv_path)
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        words = [parse_row(row) for row in csv.DictReader(f)]
+
+    def clean(text, sep):
+        return text.replace(sep, ' ')
+
+    hot_index = array('I', [0])
+    cold_index = array('I', [0])
+    hot = bytearray()
+    cold = bytearray()
+    for word in words:
+        hot += (clean(word['chinese'], HOT_SEP) + HOT_SEP + clean(word['pinyin'], HOT_SEP)).encode('utf-8')
+        hot_index.append(len(hot))
+        cold += COLD_SEP.join(clean(word[field], COLD_SEP) for field in COLD_FIELDS).encode('utf-8')
+        cold_index.append(len(cold))
+    if sys.byteorder == 'big':
+        hot_index.byteswap()
+        cold_index.byteswap()
+
+    segmentation = Segmentation.build(word['pinyin'] for word in words)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(words), st.st_size, st.st_mtime_ns,
+                         len(hot), len(cold), len(segmentation.ids))
+    return b''.join((header, hot_index.tobytes(), hot, cold_index.tobytes(), cold,
+                     segmentation.to_bytes(), pack_ids(deck_ids(word['chinese'] for word in words))))
+
+
+def is_current(path, csv_path):
+    """True if a compiled file exists and was built from the CSV as it is now"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        st = os.stat(csv_path)
+    except OSError:
+        return False
+    if len(header) != HEADER.size:
+        return False
+    magic, version, _, _, size, mtime_ns, _, _, _ = HEADER.unpack(header)
+    return (magic == MAGIC and version == FORMAT_VERSION
+            and size == st.st_size and mtime_ns == st.st_mtime_ns)
+
+
+def open_vocabulary(csv_path):
+    """Map the compiled form of a CSV, (re)building it when missing or stale"""
+    path = compiled_file(csv_path)
+    if not is_current(path, csv_path):
+        data = compile_vocabulary(csv_path)
+        try:
+            write_atomic(path, data, fsync=False)
+        except OSError:
+            # Read-only install: keep the compiled bytes in memory instead
+            return Vocabulary(data)
+    with open(path, 'rb') as f:
+        return Vocabulary(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def load_vocabulary(level, resource_dir=RESOURCE_DIR):
+    """Return the words of an HSK level as a shared, read-only sequence
+
+    Raises FileNotFoundError if the level's CSV does not exist. The Words
+    behave like read-only dicts; copy them with dict(word) if needed.
+    """
+    path = hsk_file(level, resource_dir)
+    key = str(path)
+    words = _cache.get(key)
+    if words is not None:
+        return words
+
+    with _cache_lock:
+        words = _cache.get(key)
+        if words is None:
+            words = open_vocabulary(path)
+            _cache[key] = words
+    return words
+
+
+def clear_cache():
+    """Forget all loaded levels (e.g. after editing the CSV files)"""
+    with _cache_lock:
+        _cache.clear()
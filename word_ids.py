@@ -0,0 +1,155 @@
+"""
+Stable word identity
+Key the patch order by a hash of each word's characters, so an edited CSV remaps progress instead of resetting it
+"""
+
+import hashlib
+import os
+import sys
+from array import array
+from pathlib import Path
+
+from permutation import progress_order
+from persistence import write_atomic
+
+
+ID_FORMAT = 'Q'
+ID_BYTES = 8
+
+
+def word_id(chinese, occurrence=0):
+    """64-bit ID of a word; repeats of the same characters (长 cháng / zhǎng) are numbered"""
+    key = chinese if occurrence == 0 else f"{chinese}#{occurrence}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=ID_BYTES).digest(), 'little')
+
+
+def deck_ids(chineses):
+    """IDs of a deck's words, in row order
+
+    A word's ID depends only on its characters and on how many earlier rows
+    share them, so fixing a pinyin or a meaning, or adding and removing
+    other words, leaves it unchanged.
+    """
+    seen = {}
+    ids = []
+    for chinese in chineses:
+        occurrence = seen.get(chinese, 0)
+        seen[chinese] = occurrence + 1
+        ids.append(word_id(chinese, occurrence))
+    return ids
+
+
+def pack_ids(ids):
+    """IDs as little-endian bytes"""
+    packed = array(ID_FORMAT, ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def ids_digest(ids):
+    """Short fingerprint of a deck's word IDs and their row order"""
+    return hashlib.blake2b(pack_ids(ids), digest_size=8).hexdigest()
+
+
+def read_ids(path):
+    """IDs saved by record_ids, or None if the file is missing or damaged"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) % ID_BYTES:
+        return None
+    ids = array(ID_FORMAT)
+    ids.frombytes(data)
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids.tolist()
+
+
+def previous_ids_path(path):
+    """Where record_ids keeps the IDs it replaced"""
+    return Path(path).with_name(Path(path).name + ".prev")
+
+
+def record_ids(progress, level, ids, path):
+    """Tie progress to the deck it was made for
+
+    The IDs (in row order) are saved beside the progress file; only the
+    level and their digest go into the progress itself. The progress is
+    saved later, so the IDs it was tied to until now are kept as the
+    '.prev' file: if the new progress never reaches the disk, the old one
+    still finds its IDs instead of being reset.
+    """
+    digest = ids_digest(ids)
+    current = read_ids(path)
+    if current is None or ids_digest(current) != digest:
+        if current is not None:
+            os.replace(path, previous_ids_path(path))
+        write_atomic(path, pack_ids(ids))
+    progress['level'] = level
+    progress['words_digest'] = digest
+
+
+def remap_order(old_ids, old_order, new_ids):
+    """Carry a patch order over to an edited deck in O(n)
+
+    A hash join on the word IDs: words still in the deck keep their
+    relative order, removed words drop out and new words are appended in
+    row order, so patches already studied stay where they were.
+    """
+    rows = {word: row for row, word in enumerate(new_ids)}
+    placed = bytearray(len(new_ids))
+    order = []
+    for old_row in old_order:
+        row = rows.get(old_ids[old_row])
+        if row is not None and not placed[row]:
+            placed[row] = 1
+            order.append(row)
+    order.extend(row for row in range(len(new_ids)) if not placed[row])
+    return order
+
+
+def sync_progress(progress, level, ids, path):
+    """Fit progress to the current words of an HSK level's deck
+
+    Returns (order, changed). order is None when the progress cannot be
+    carried over and has to be reset (as when the learner switched level);
+    changed means progress (and the saved IDs) were updated and progress
+    should be saved. Progress from before word IDs is adopted as is when
+    its word count still fits.
+    """
+    count = len(ids)
+    digest = ids_digest(ids)
+    recorded = progress.get('words_digest')
+    if recorded is None:
+        order = progress_order(progress, count)
+        if order is None:
+            return None, False
+        record_ids(progress, level, ids, path)
+        return order, True
+
+    if progress.get('level') != level:
+        return None, False
+    if recorded == digest:
+        return progress_order(progress, count), False
+
+    for candidate in (path, previous_ids_path(path)):
+        old_ids = read_ids(candidate)
+        if old_ids is not None and ids_digest(old_ids) == recorded:
+            break
+    else:
+        return None, False
+    old_order = progress_order(progress, len(old_ids))
+    if old_order is None:
+        return None, False
+
+    # The remapped order is no longer a seeded permutation, so it is stored
+    # as an explicit index list (which every client already reads)
+    order = remap_order(old_ids, old_order, ids)
+    progress['seed'] = None
+    progress['shuffled_indices'] = order
+    progress['word_count'] = count
+    record_ids(progress, level, ids, path)
+    return order, True
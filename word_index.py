@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Cross-level word index
+Map each written form to its entries in every HSK level and report the entries the levels disagree on
+"""
+
+import argparse
+import threading
+import time
+
+from vocabulary import HSK_LEVELS, RESOURCE_DIR, load_vocabulary
+from word_ids import word_id
+
+
+# Kinds of conflict, in report order
+CONFLICTS = {
+    'pinyin': "same entry, different pinyin between levels",
+    'meaning': "same entry, different English gloss between levels",
+    'vietnamese': "same entry, different Vietnamese gloss between levels",
+    'homograph': "different senses of one form given the same pinyin",
+    'duplicate': "one form listed twice with the same pinyin and gloss"
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def text_field(word, key):
+    """A word dict's field if it is a string (request bodies may hold anything)"""
+    value = word.get(key)
+    return value if isinstance(value, str) else None
+
+
+class WordIndex:
+    """Every sense of every word of all HSK levels
+
+    An entry is one sense of a written form, numbered from 0, with its
+    (level, row) locations in level order. Rows of different levels are
+    the same entry when their English gloss matches; failing that, a row
+    joins an entry with the same pinyin that its level does not list yet.
+    Two rows of one level are always different entries. Lookups by form,
+    by (form, gloss) and by (form, pinyin), per level, are dict hits, so a
+    word from revision.txt or a combined deck resolves to its entry in O(1).
+    """
+
+    def __init__(self, decks):
+        self.decks = decks
+        self.locations = []
+        self.forms = {}
+        self.senses = {}
+        self.readings = {}
+        self.by_sense = {}
+        self.by_reading = {}
+        self.row_entries = {}
+        for level, vocab in decks.items():
+            words = [vocab[row] for row in range(len(vocab))]
+            rows = [None] * len(words)
+            placed = set()
+
+            # Same gloss as a lower level first, then the same pinyin, then new
+            for row, word in enumerate(words):
+                for entry in self.senses.get((word.chinese, word['meaning']), ()):
+                    if entry not in placed:
+                        rows[row] = entry
+                        placed.add(entry)
+                        break
+            for row, word in enumerate(words):
+                if rows[row] is not None:
+                    continue
+                for entry in self.readings.get((word.chinese, word.pinyin), ()):
+                    if entry not in placed:
+                        rows[row] = entry
+                        placed.add(entry)
+                        break
+                else:
+                    rows[row] = len(self.locations)
+                    self.locations.append([])
+                    self.forms.setdefault(word.chinese, []).append(rows[row])
+
+            by_sense = self.by_sense[level] = {}
+            by_reading = self.by_reading[level] = {}
+            for row, (word, entry) in enumerate(zip(words, rows)):
+                self.locations[entry].append((level, row))
+                sense, reading = (word.chinese, word['meaning']), (word.chinese, word.pinyin)
+                by_sense.setdefault(sense, entry)
+                by_reading.setdefault(reading, entry)
+                if entry not in self.senses.get(sense, ()):
+                    self.senses.setdefault(sense, []).append(entry)
+                if entry not in self.readings.get(reading, ()):
+                    self.readings.setdefault(reading, []).append(entry)
+            self.row_entries[level] = rows
+
+    def __len__(self):
+        return len(self.locations)
+
+    def entries(self, chinese):
+        """The entries written this way, in order of first appearance"""
+        return self.forms.get(chinese, [])
+
+    def levels(self, entry):
+        """The levels listing an entry, lowest first"""
+        return [level for level, _ in self.locations[entry]]
+
+    def word(self, entry, level=None):
+        """The Word of an entry in a level (default: its lowest), or None"""
+        for place, row in self.locations[entry]:
+            if level is None or place == level:
+                return self.decks[place][row]
+        return None
+
+    def word_id(self, entry):
+        """Word ID of an entry, its form's senses numbered in level order like a deck's repeats"""
+        chinese = self.word(entry).chinese
+        return word_id(chinese, self.forms[chinese].index(entry))
+
+    def resolve(self, word, level=None):
+        """The entry a word dict stands for, or None
+
+        The gloss decides first (it survives pinyin fixes): in the given
+        level (or the lowest level listing it), then in any level, for a
+        gloss edited between levels. Then the pinyin, then the form alone.
+        With a level, only entries of that level count.
+        """
+        chinese = word['chinese']
+        levels = list(self.decks) if level is None else [level]
+        sense, reading = (chinese, text_field(word, 'meaning')), (chinese, text_field(word, 'pinyin'))
+        in_level = lambda entry: level is None or level in self.levels(entry)
+        for place in levels:
+            if sense in self.by_sense.get(place, {}):
+                return self.by_sense[place][sense]
+        for entry in filter(in_level, self.senses.get(sense, ())):
+            return entry
+        for place in levels:
+            if reading in self.by_reading.get(place, {}):
+                return self.by_reading[place][reading]
+        for entry in filter(in_level, self.entries(chinese)):
+            return entry
+        return None
+
+    def combined(self, levels=HSK_LEVELS):
+        """(level, Word, word ID) of each entry of the given levels once, at its lowest level"""
+        wanted = set(levels)
+        for level in sorted(wanted & set(self.decks)):
+            vocab = self.decks[level]
+            for row, entry in enumerate(self.row_entries[level]):
+                first = next(place for place in self.locations[entry] if place[0] in wanted)
+                if first == (level, row):
+                    yield level, vocab[row], self.word_id(entry)
+
+    def conflicts(self):
+        """(kind, chinese, details) of every disagreement, details being (level, value) pairs"""
+        found = []
+        for chinese, entries in self.forms.items():
+            for entry in entries:
+                words = [(level, self.decks[level][row]) for level, row in self.locations[entry]]
+                for kind, field in (('pinyin', 'pinyin'), ('meaning', 'meaning'),
+                                    ('vietnamese', 'nghia_tieng_viet')):
+                    values = [(level, word[field]) for level, word in words]
+                    if len({value for _, value in values}) > 1:
+                        found.append((kind, chinese, values))
+            if len(entries) > 1:
+                readings = {}
+                for entry in entries:
+                    word = self.word(entry)
+                    readings.setdefault(word.pinyin, []).append((self.levels(entry)[0], word))
+                for pinyin, shared in readings.items():
+                    if len(shared) < 2:
+                        continue
+                    glosses = {word['meaning'] for _, word in shared}
+                    kind = 'duplicate' if len(glosses) == 1 else 'homograph'
+                    found.append((kind, chinese, [(level, f"{word.pinyin}: {word['meaning']}")
+                                                  for level, word in shared]))
+        order = list(CONFLICTS)
+        found.sort(key=lambda conflict: order.index(conflict[0]))
+        return found
+
+
+def build_index(resource_dir=RESOURCE_DIR):
+    """Index the levels whose CSV exists"""
+    decks = {}
+    for level in HSK_LEVELS:
+        try:
+            decks[level] = load_vocabulary(level, resource_dir)
+        except FileNotFoundError:
+            continue
+    return WordIndex(decks)
+
+
+def load_word_index(resource_dir=RESOURCE_DIR):
+    """Return the shared WordIndex of all levels"""
+    key = str(resource_dir)
+    index = _cache.get(key)
+    if index is not None:
+        return index
+
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is None:
+            index = build_index(resource_dir)
+            _cache[key] = index
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report words whose entries disagree across HSK levels")
+    parser.add_argument('--kind', action='append', choices=list(CONFLICTS),
+                        help="only report this kind of conflict (repeatable)")
+    parser.add_argument('--show', type=int, default=20, metavar='N',
+                        help="print N conflicts of each kind (0 for all)")
+    parser.add_argument('--strict', action='store_true',
+                        help="exit with status 1 if any pinyin differs between levels")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index()
+    built = time.perf_counter()
+    conflicts = index.conflicts()
+    checked = time.perf_counter()
+    forms = sum(1 for entries in index.forms.values() if len(entries) > 1)
+    shared = sum(1 for places in index.locations if len(places) > 1)
+    print(f"{len(index)} entries, {len(index.forms)} forms ({forms} with several senses), "
+          f"{shared} listed in more than one level "
+          f"(index {built - start:.3f}s, checks {checked - built:.3f}s)")
+
+    by_kind = {}
+    for kind, chinese, details in conflicts:
+        by_kind.setdefault(kind, []).append((chinese, details))
+    for kind, description in CONFLICTS.items():
+        if args.kind and kind not in args.kind:
+            continue
+        found = by_kind.get(kind, [])
+        print(f"\n{kind}: {len(found)} ({description})")
+        for chinese, details in found[:args.show or None]:
+            print(f"  {chinese}")
+            for level, value in details:
+                print(f"    HSK{level}  {value}")
+
+    return 1 if args.strict and by_kind.get('pinyin') else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())